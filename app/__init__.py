@@ -58,6 +58,13 @@ def create_app():
     # Configuração de alertas
     app.config['ALERT_RECIPIENT'] = os.getenv('ALERT_RECIPIENT')
     app.config['ALERT_DAYS_BEFORE'] = int(os.getenv('ALERT_DAYS_BEFORE', 1))
+    
+    # Fila de emails (email_outbox): threads de envio, emails por conexão SMTP,
+    # tentativas antes de desistir e espera inicial entre elas (segundos, dobra a cada falha)
+    app.config['OUTBOX_WORKERS'] = int(os.getenv('OUTBOX_WORKERS', 2))
+    app.config['OUTBOX_LOTE'] = int(os.getenv('OUTBOX_LOTE', 20))
+    app.config['OUTBOX_MAX_TENTATIVAS'] = int(os.getenv('OUTBOX_MAX_TENTATIVAS', 5))
+    app.config['OUTBOX_BACKOFF'] = int(os.getenv('OUTBOX_BACKOFF', 60))
 
     # --- INICIALIZAÇÃO DAS EXTENSÕES ---
     db.init_app(app)
@@ -85,6 +92,12 @@ def create_app():
         from .routes.investimentos_routes import investimentos_bp
         from .routes.categorias_visao_routes import categorias_visao_bp
         
+        # Tratadores que mantêm as tabelas derivadas dos lançamentos
+        from .services import resumo_service
+        from .services import fatura_service
+        from .services import cubo_service
+        from .services import metas_service
+        
         app.register_blueprint(main_bp)
         app.register_blueprint(contas_bp)
         app.register_blueprint(categorias_bp, url_prefix='/categorias')
@@ -95,4 +108,8 @@ def create_app():
         app.register_blueprint(investimentos_bp)
         app.register_blueprint(categorias_visao_bp)
 
+    # --- COMANDOS DE LINHA DE COMANDO ---
+    from .commands import registrar_comandos
+    registrar_comandos(app)
+
     return app
\ No newline at end of file
@@ -0,0 +1,98 @@
+# app/commands.py
+# Comandos de linha de comando (flask <grupo> <comando>) para manutenção do banco
+
+import click
+from flask.cli import AppGroup
+
+resumo_cli = AppGroup('resumo', help='Manutenção da tabela resumo_mensal')
+faturas_cli = AppGroup('faturas', help='Manutenção da tabela de faturas de cartão')
+cubo_cli = AppGroup('cubo', help='Manutenção do cubo de relatórios')
+metas_cli = AppGroup('metas', help='Fechamento mensal das metas')
+investimentos_cli = AppGroup('investimentos', help='Saldos das contas de investimento')
+
+
+@resumo_cli.command('reconstruir')
+def reconstruir_resumo_cmd():
+    """Recalcula todo o resumo mensal a partir dos lançamentos"""
+    from app.services.resumo_service import reconstruir_resumo
+
+    total = reconstruir_resumo()
+    click.echo(f'Resumo mensal reconstruído: {total} linhas.')
+
+
+@resumo_cli.command('verificar')
+def verificar_resumo_cmd():
+    """Compara o resumo mensal com os lançamentos e lista as diferenças"""
+    from app.services.resumo_service import verificar_resumo
+
+    divergencias = verificar_resumo()
+    if not divergencias:
+        click.echo('Resumo mensal consistente com os lançamentos.')
+        return
+
+    for d in divergencias:
+        click.echo(f"{d['chave']}: esperado {d['esperado']}, gravado {d['gravado']}")
+    click.echo(f'{len(divergencias)} divergência(s). Execute "flask resumo reconstruir" para corrigir.')
+
+
+@faturas_cli.command('reconstruir')
+def reconstruir_faturas_cmd():
+    """Recalcula total e quantidade das faturas a partir das despesas de cartão"""
+    from app.services.fatura_service import reconstruir_faturas
+
+    total = reconstruir_faturas()
+    click.echo(f'Faturas reconstruídas: {total}.')
+
+
+@cubo_cli.command('reconstruir')
+def reconstruir_cubo_cmd():
+    """Recalcula todos os níveis do cubo de relatórios a partir dos lançamentos"""
+    from app.services.cubo_service import reconstruir_cubo
+
+    total = reconstruir_cubo()
+    click.echo(f'Cubo de relatórios reconstruído: {total} linhas.')
+
+
+
+@metas_cli.command('fechar')
+@click.option('--desde', default=None, help='Primeiro mês a fechar (AAAA-MM); padrão: meses ainda não fechados')
+def fechar_metas_cmd(desde):
+    """Grava em metas_historico as fotos dos meses fechados (até o mês anterior)"""
+    from datetime import datetime
+    from app.services.metas_service import fechar_meses, fechar_meses_pendentes
+
+    if desde:
+        fechados = fechar_meses(datetime.strptime(desde, '%Y-%m').date())
+    else:
+        fechados = fechar_meses_pendentes()
+
+    for mes, total in fechados:
+        click.echo(f"{mes.strftime('%m/%Y')}: {total} meta(s)")
+    click.echo(f'{len(fechados)} mês(es) fechado(s).')
+
+
+@investimentos_cli.command('importar')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--encoding', default='utf-8-sig', help='Codificação do arquivo (ex.: latin-1)')
+def importar_saldos_cmd(arquivo, encoding):
+    """Importa saldos históricos de um CSV com as colunas conta, data, saldo, observações"""
+    from app.services.investimentos_service import importar_saldos_csv
+
+    with open(arquivo, encoding=encoding, newline='') as entrada:
+        resultado = importar_saldos_csv(entrada)
+
+    if resultado['erros']:
+        for erro in resultado['erros']:
+            click.echo(erro)
+        click.echo(f"{len(resultado['erros'])} erro(s). Nada foi importado.")
+        return
+
+    click.echo(f"{resultado['importados']} saldo(s) importado(s) em {resultado['contas']} conta(s).")
+
+def registrar_comandos(app):
+    """Registra os grupos de comandos na aplicação"""
+    app.cli.add_command(resumo_cli)
+    app.cli.add_command(faturas_cli)
+    app.cli.add_command(cubo_cli)
+    app.cli.add_command(metas_cli)
+    app.cli.add_command(investimentos_cli)
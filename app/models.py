@@ -2,11 +2,39 @@
 # Este arquivo define a estrutura das tabelas do banco de dados.
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
 
 # Criamos uma instância de SQLAlchemy sem associá-la a um app ainda.
 # A associação será feita no arquivo principal app.py.
 db = SQLAlchemy()
 
+
+class inicio_do_mes(FunctionElement):
+    """Primeiro dia do mês de uma data, escrito de forma imutável (pode ser usado em coluna gerada)"""
+    type = db.Date()
+    inherit_cache = True
+
+
+@compiles(inicio_do_mes, 'postgresql')
+def _inicio_do_mes_postgresql(elemento, compilador, **kw):
+    return "CAST(date_trunc('month', CAST(%s AS TIMESTAMP)) AS DATE)" % compilador.process(elemento.clauses, **kw)
+
+
+@compiles(inicio_do_mes, 'sqlite')
+def _inicio_do_mes_sqlite(elemento, compilador, **kw):
+    return "date(%s, 'start of month')" % compilador.process(elemento.clauses, **kw)
+
+
+def sem_nulo(coluna):
+    """
+    Coluna com NULL trocado por um valor neutro (0 ou ''), para índices únicos em chaves
+    com colunas opcionais: NULL não conflita com NULL em um UNIQUE comum
+    """
+    vazio = "''" if isinstance(coluna.type, db.String) else '0'
+    return db.func.coalesce(coluna, db.literal_column(vazio))
+
+
 # Mapeamento da tabela de Contas Bancárias
 class Conta(db.Model):
     # Define o nome da tabela no banco de dados. Boa prática para evitar conflitos.
@@ -96,6 +124,7 @@ class Lancamento(db.Model):
     data_criacao = db.Column(db.DateTime, nullable=False, default=db.func.now())
     cartao_id = db.Column(db.Integer, db.ForeignKey('cartoes.id'), nullable=True)
     conta_destino_id = db.Column(db.Integer, db.ForeignKey('contas.id'), nullable=True)
+    sentido = db.Column(db.String(10), nullable=True)  # Transferências: saida (conta_id é a origem) ou entrada
     data_vencimento = db.Column(db.Date, nullable=False)
     data_pagamento = db.Column(db.Date, nullable=True)
     numero_parcela = db.Column(db.Integer, nullable=True)
@@ -103,6 +132,13 @@ class Lancamento(db.Model):
     lancamento_pai_id = db.Column(db.Integer, db.ForeignKey('lancamentos.id'), nullable=True)
     tag = db.Column(db.String(50), nullable=True)  # Campo para tags/etiquetas
     mes_inicial_cartao = db.Column(db.Date, nullable=True)  # Mês inicial para despesas do cartão
+    regra_id = db.Column(db.Integer, db.ForeignKey('regras_recorrencia.id', ondelete='SET NULL'), nullable=True)  # Série que gerou o lançamento
+    # Mês de competência (dia 01): mês da fatura para despesas de cartão, mês do vencimento para os demais.
+    # Coluna gerada pelo banco, nunca gravada pela aplicação
+    mes_competencia = db.Column(db.Date, db.Computed(inicio_do_mes(db.case(
+        (tipo == 'cartao_credito', db.func.coalesce(mes_inicial_cartao, data_vencimento)),
+        else_=data_vencimento
+    )), persisted=True))
     
     # Relacionamentos
     conta = db.relationship('Conta', foreign_keys=[conta_id], backref='lancamentos')
@@ -111,6 +147,36 @@ class Lancamento(db.Model):
     subcategoria = db.relationship('Subcategoria', backref='lancamentos')
     cartao = db.relationship('Cartao', backref='lancamentos')
     lancamento_pai = db.relationship('Lancamento', remote_side=[id], backref='parcelas')
+    regra = db.relationship('RegraRecorrencia')
+
+    # Índices das consultas mais frequentes (ver benchmarks/explain_indices.py)
+    __table_args__ = (
+        # Dashboard: receitas/despesas do mês por conta
+        db.Index('ix_lancamentos_tipo_conta_vencimento', 'tipo', 'conta_id', 'data_vencimento'),
+        # Listagem paginada por (data_vencimento, id)
+        db.Index('ix_lancamentos_vencimento_id', 'data_vencimento', 'id'),
+        # Faturas e extrato do cartão
+        db.Index('ix_lancamentos_cartao_mes_inicial', 'cartao_id', 'mes_inicial_cartao',
+                 postgresql_where=(tipo == 'cartao_credito'), sqlite_where=(tipo == 'cartao_credito')),
+        # Visão por tag (mês de competência)
+        db.Index('ix_lancamentos_tag_competencia', 'tag', 'mes_competencia',
+                 postgresql_where=tag.isnot(None), sqlite_where=tag.isnot(None)),
+        # Editar/excluir "todos os futuros" de uma série
+        db.Index('ix_lancamentos_pai_vencimento', 'lancamento_pai_id', 'data_vencimento',
+                 postgresql_where=lancamento_pai_id.isnot(None), sqlite_where=lancamento_pai_id.isnot(None)),
+        # Uma ocorrência por data em cada série (duas requisições não geram a mesma ocorrência)
+        db.Index('ux_lancamentos_regra_vencimento', 'regra_id', 'data_vencimento', unique=True,
+                 postgresql_where=regra_id.isnot(None), sqlite_where=regra_id.isnot(None)),
+        # Metas (períodos passados): despesas pagas pela data de pagamento
+        db.Index('ix_lancamentos_pagos_tipo_pagamento', 'tipo', 'data_pagamento',
+                 postgresql_where=(status == 'pago'), sqlite_where=(status == 'pago')),
+        # Dashboard: aportes em contas de investimento (transferências não canceladas)
+        db.Index('ix_lancamentos_transferencia_destino', 'conta_destino_id', 'data_vencimento',
+                 postgresql_where=db.and_(tipo == 'transferencia', status != 'cancelado'),
+                 sqlite_where=db.and_(tipo == 'transferencia', status != 'cancelado')),
+        # Gastos do mês (despesas e cartão juntos) por categoria
+        db.Index('ix_lancamentos_competencia_tipo_categoria', 'mes_competencia', 'tipo', 'categoria_id'),
+    )
 
     def __repr__(self):
         return f'<Lancamento {self.descricao} - R$ {self.valor}>'
@@ -132,6 +198,7 @@ class Meta(db.Model):
     alertar_percentual = db.Column(db.Integer, default=80)  # Alertar quando atingir X%
     renovar_automaticamente = db.Column(db.Boolean, default=True)
     incluir_cartao = db.Column(db.Boolean, default=True)  # Incluir despesas do cartão
+    contadores_ok = db.Column(db.Boolean, nullable=False, default=False)  # metas_contadores montados
     data_criacao = db.Column(db.DateTime, nullable=False, default=db.func.now())
     
     # Relacionamentos
@@ -156,9 +223,36 @@ class MetaHistorico(db.Model):
     # Relacionamentos
     meta = db.relationship('Meta', backref='historicos')
     
+    # Uma foto por meta e mês fechado
+    __table_args__ = (
+        db.UniqueConstraint('meta_id', 'mes_referencia', name='_meta_mes_uc'),
+    )
+    
     def __repr__(self):
         return f'<MetaHistorico {self.meta_id} - {self.mes_referencia}>'
 
+# Contadores das metas por período, atualizados a cada lançamento gravado
+class MetaContador(db.Model):
+    __tablename__ = 'metas_contadores'
+
+    id = db.Column(db.Integer, primary_key=True)
+    meta_id = db.Column(db.Integer, db.ForeignKey('metas.id'), nullable=False)
+    inicio = db.Column(db.Date, nullable=False)  # Primeiro dia do período da meta
+    valor_pago = db.Column(db.Numeric(12, 2), nullable=False, default=0)  # Pagas (pagamento / mês da fatura)
+    valor_previsto = db.Column(db.Numeric(12, 2), nullable=False, default=0)  # Pagas e pendentes (competência)
+    nivel_alerta = db.Column(db.Integer, nullable=False, default=0)  # Maior nível já atingido: 0 ok, 1 alerta, 2 excedido
+    alerta_pendente = db.Column(db.Boolean, nullable=False, default=False)  # Nível subiu e o aviso ainda não foi enviado
+    
+    # Relacionamentos
+    meta = db.relationship('Meta', backref='contadores')
+    
+    __table_args__ = (
+        db.UniqueConstraint('meta_id', 'inicio', name='_meta_inicio_uc'),
+    )
+    
+    def __repr__(self):
+        return f'<MetaContador {self.meta_id} - {self.inicio}>'
+
 # Mapeamento da tabela de Histórico de Saldos de Investimentos
 class SaldoInvestimento(db.Model):
     __tablename__ = 'saldos_investimentos'
@@ -181,4 +275,177 @@ class SaldoInvestimento(db.Model):
     )
     
     def __repr__(self):
-        return f'<SaldoInvestimento {self.conta.nome} - {self.data_registro} - R$ {self.saldo}>'
\ No newline at end of file
+        return f'<SaldoInvestimento {self.conta.nome} - {self.data_registro} - R$ {self.saldo}>'
+
+# Mapeamento da tabela de Resumo Mensal (somas pré-agregadas dos lançamentos)
+class ResumoMensal(db.Model):
+    __tablename__ = 'resumo_mensal'
+
+    id = db.Column(db.Integer, primary_key=True)
+    ano = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Integer, nullable=False)  # Mês da data de vencimento
+    conta_id = db.Column(db.Integer, db.ForeignKey('contas.id'), nullable=False)
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categorias.id'), nullable=True)
+    subcategoria_id = db.Column(db.Integer, db.ForeignKey('subcategorias.id'), nullable=True)
+    tipo = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    valor_total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+    # Chave completa do resumo, única (período primeiro, para as consultas por mês/ano)
+    __table_args__ = (
+        db.Index('ux_resumo_mensal_chave', ano, mes, conta_id, sem_nulo(categoria_id),
+                 sem_nulo(subcategoria_id), tipo, status, unique=True),
+    )
+
+    def __repr__(self):
+        return f'<ResumoMensal {self.mes:02d}/{self.ano} - {self.tipo} - R$ {self.valor_total}>'
+
+
+# Mapeamento da tabela de Faturas de Cartão (uma por cartão e mês de competência)
+class Fatura(db.Model):
+    __tablename__ = 'faturas'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cartao_id = db.Column(db.Integer, db.ForeignKey('cartoes.id', ondelete='CASCADE'), nullable=False)
+    competencia = db.Column(db.Date, nullable=False)  # Sempre dia 01 do mês
+    valor_total = db.Column(db.Numeric(10, 2), nullable=False, default=0)  # Soma das despesas do cartão no mês
+    quantidade = db.Column(db.Integer, nullable=False, default=0)  # Número de despesas na fatura
+    data_vencimento = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, pago
+    lancamento_pagamento_id = db.Column(db.Integer, db.ForeignKey('lancamentos.id', ondelete='SET NULL'), nullable=True, index=True)
+
+    # Relacionamentos
+    cartao = db.relationship('Cartao', backref=db.backref('faturas', passive_deletes=True))
+    pagamento = db.relationship('Lancamento', foreign_keys=[lancamento_pagamento_id])
+
+    __table_args__ = (
+        db.UniqueConstraint('cartao_id', 'competencia', name='_cartao_competencia_uc'),
+    )
+
+    # Atributos usados para exibir a fatura junto com os lançamentos (dashboard)
+    tipo = 'fatura_cartao'
+    recorrencia = 'unica'
+    tag = 'Fatura'
+    subcategoria = None
+
+    @property
+    def descricao(self):
+        return f'Fatura {self.cartao.nome}'
+
+    @property
+    def valor(self):
+        return self.valor_total
+
+    @property
+    def conta(self):
+        return self.cartao.conta
+
+    @property
+    def data_pagamento(self):
+        return self.pagamento.data_pagamento if self.pagamento else None
+
+    def __repr__(self):
+        return f'<Fatura {self.cartao_id} - {self.competencia} - R$ {self.valor_total}>'
+
+
+# Mapeamento da tabela de Regras de Recorrência (séries mensal, anual, semanal e quinzenal)
+class RegraRecorrencia(db.Model):
+    __tablename__ = 'regras_recorrencia'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)  # despesa, receita, cartao_credito
+    frequencia = db.Column(db.String(20), nullable=False)  # mensal, anual, semanal, quinzenal
+    data_inicio = db.Column(db.Date, nullable=False)  # Vencimento da primeira ocorrência
+    data_fim = db.Column(db.Date, nullable=False)  # Última data possível de vencimento
+    mes_inicial_cartao = db.Column(db.Date, nullable=True)  # Mês da fatura da primeira ocorrência
+
+    # Modelo copiado para cada ocorrência gerada
+    descricao = db.Column(db.String(255), nullable=False)
+    valor = db.Column(db.Numeric(10, 2), nullable=False)
+    conta_id = db.Column(db.Integer, db.ForeignKey('contas.id'), nullable=False)
+    cartao_id = db.Column(db.Integer, db.ForeignKey('cartoes.id'), nullable=True)
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categorias.id'), nullable=True)
+    subcategoria_id = db.Column(db.Integer, db.ForeignKey('subcategorias.id'), nullable=True)
+    tag = db.Column(db.String(50), nullable=True)
+
+    # Controle da geração sob demanda
+    ocorrencias_geradas = db.Column(db.Integer, nullable=False, default=0)  # Próximo índice a gerar
+    materializado_ate = db.Column(db.Date, nullable=True)  # Ocorrências até esta data já existem
+    ativa = db.Column(db.Boolean, nullable=False, default=True)  # False quando a série terminou
+    data_criacao = db.Column(db.DateTime, nullable=False, default=db.func.now())
+
+    # Relacionamentos
+    conta = db.relationship('Conta')
+    cartao = db.relationship('Cartao')
+
+    def __repr__(self):
+        return f'<RegraRecorrencia {self.descricao} - {self.frequencia} - R$ {self.valor}>'
+
+
+# Mapeamento do cubo de relatórios: somas por período, categoria, subcategoria, tag, tipo, conta e cartão
+# em vários níveis de agrupamento (GROUPING SETS). Reconstruído a partir dos lançamentos;
+# sem chaves estrangeiras para não impedir exclusões enquanto aguarda a próxima reconstrução.
+class CuboLancamentos(db.Model):
+    __tablename__ = 'cubo_lancamentos'
+
+    id = db.Column(db.Integer, primary_key=True)
+    nivel = db.Column(db.Integer, nullable=False)  # Máscara das dimensões agregadas (como GROUPING())
+    ano = db.Column(db.Integer, nullable=True)  # Ano do mês de competência
+    mes = db.Column(db.Integer, nullable=True)
+    categoria_id = db.Column(db.Integer, nullable=True)
+    subcategoria_id = db.Column(db.Integer, nullable=True)
+    tag = db.Column(db.String(50), nullable=True)
+    tipo = db.Column(db.String(20), nullable=True)
+    conta_id = db.Column(db.Integer, nullable=True)
+    cartao_id = db.Column(db.Integer, nullable=True)
+    valor_total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+    # As consultas sempre informam o nível e, quase sempre, o período
+    __table_args__ = (
+        db.Index('ix_cubo_lancamentos_nivel_periodo', 'nivel', 'ano', 'mes'),
+        # Uma linha por nível e combinação de dimensões (alvo do ON CONFLICT dos tratadores)
+        db.Index('ux_cubo_lancamentos_chave', nivel, *[sem_nulo(coluna) for coluna in (
+            ano, mes, categoria_id, subcategoria_id, tag, tipo, conta_id, cartao_id
+        )], unique=True),
+    )
+
+    def __repr__(self):
+        return f'<CuboLancamentos nivel {self.nivel} - {self.mes}/{self.ano} - R$ {self.valor_total}>'
+
+
+# Estado do cubo (linha única): marcado como desatualizado a cada alteração de lançamento
+class CuboEstado(db.Model):
+    __tablename__ = 'cubo_estado'
+
+    id = db.Column(db.Integer, primary_key=True)
+    desatualizado = db.Column(db.Boolean, nullable=False, default=True)
+    atualizado_em = db.Column(db.DateTime, nullable=True)  # Última reconstrução
+
+    def __repr__(self):
+        return f'<CuboEstado desatualizado={self.desatualizado} - {self.atualizado_em}>'
+
+
+# Fila de emails (outbox): gravados pelas rotas e tarefas, enviados em segundo plano
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    destinatario = db.Column(db.String(255), nullable=False)
+    assunto = db.Column(db.String(255), nullable=False)
+    corpo = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, enviando, enviado, falhou
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_tentativa = db.Column(db.DateTime, nullable=False, default=db.func.now())  # Enviando: fim da reserva
+    ultimo_erro = db.Column(db.Text, nullable=True)
+    data_criacao = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    data_envio = db.Column(db.DateTime, nullable=True)
+
+    # Os workers buscam os emails vencidos de cada status
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_proxima', 'status', 'proxima_tentativa'),
+    )
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} - {self.destinatario} - {self.status}>'
@@ -2,6 +2,7 @@
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from app.models import db, Cartao, Conta
+from app.services.fatura_service import atualizar_vencimentos
 from decimal import Decimal
 import os
 from werkzeug.utils import secure_filename
@@ -110,6 +111,9 @@ def editar_cartao(id):
     limite = request.form.get('limite')
     cartao.limite = Decimal(limite) if limite else None
     
+    # Faturas em aberto passam a vencer no novo dia
+    atualizar_vencimentos(cartao)
+    
     try:
         db.session.commit()
         flash('Cartão atualizado com sucesso!', 'success')
@@ -1,10 +1,12 @@
 # app/routes/categorias_visao_routes.py
 
 from flask import Blueprint, render_template, request
-from app.models import db, Lancamento, Categoria, Subcategoria
+from app.models import db, Lancamento, Categoria, Subcategoria, CuboLancamentos
+from app.services.recorrencia_service import garantir_periodo, fim_da_janela
+from app.services.periodo_service import intervalo_selecao, filtro_intervalo
+from app.services.cubo_service import filtro_selecao
 from datetime import datetime, date
-from calendar import monthrange
-from sqlalchemy import func, extract, and_, or_
+from sqlalchemy import func, or_
 
 # Criar o Blueprint
 categorias_visao_bp = Blueprint('categorias_visao', __name__, url_prefix='/categorias-visao')
@@ -20,6 +22,9 @@ def visao_geral_categorias():
     ano = request.args.get('ano', type=int, default=date.today().year)
     tipo_filtro = request.args.get('tipo', default='todos')  # todos, receitas, despesas
     
+    # Séries recorrentes: gravar as ocorrências do período consultado
+    garantir_periodo(fim_da_janela(ano, mes))
+    
     # Buscar todas as categorias do sistema
     categorias = Categoria.query.order_by(Categoria.nome).all()
     
@@ -36,14 +41,20 @@ def visao_geral_categorias():
     categoria_selecionada = None
     subcategoria_selecionada = None
     
+    # Somas e contagens lidas do cubo de relatórios (mês de competência, como a lista;
+    # cancelados ficam de fora dos dois)
+    
     # Se uma categoria foi selecionada
     if categoria_id:
         categoria_selecionada = Categoria.query.get(categoria_id)
         
         # Construir query base
         query_base = Lancamento.query.filter(
-            Lancamento.categoria_id == categoria_id
+            Lancamento.categoria_id == categoria_id,
+            Lancamento.status != 'cancelado'
         )
+        dimensoes = ('categoria_id', 'subcategoria_id', 'tipo')
+        valores = {'categoria_id': categoria_id}
         
         # Se uma subcategoria foi selecionada
         if subcategoria_id:
@@ -51,23 +62,12 @@ def visao_geral_categorias():
             query_base = query_base.filter(
                 Lancamento.subcategoria_id == subcategoria_id
             )
+            valores['subcategoria_id'] = subcategoria_id
         
-        # Aplicar filtros de data
-        if mes > 0:  # Mês específico
-            primeiro_dia = date(ano, mes, 1)
-            ultimo_dia = date(ano, mes, monthrange(ano, mes)[1])
-            query_base = query_base.filter(
-                Lancamento.data_vencimento >= primeiro_dia,
-                Lancamento.data_vencimento <= ultimo_dia
-            )
-        elif mes == -1:  # Ano inteiro
-            primeiro_dia = date(ano, 1, 1)
-            ultimo_dia = date(ano, 12, 31)
-            query_base = query_base.filter(
-                Lancamento.data_vencimento >= primeiro_dia,
-                Lancamento.data_vencimento <= ultimo_dia
-            )
-        # Se mes == 0, não aplica filtro de data (todo período)
+        # Aplicar filtro de data (mês, ano inteiro ou, com mes == 0, todo o período)
+        query_base = query_base.filter(
+            filtro_intervalo(Lancamento.mes_competencia, *intervalo_selecao(ano, mes))
+        )
         
         # Aplicar filtro de tipo
         if tipo_filtro == 'receitas':
@@ -80,93 +80,58 @@ def visao_geral_categorias():
                 )
             )
         
-        # Buscar lançamentos
+        # Buscar lançamentos (lista detalhada)
         lancamentos = query_base.order_by(Lancamento.data_vencimento.desc()).all()
         
-        # Calcular totais separados
-        receitas = [l for l in lancamentos if l.tipo == 'receita']
-        despesas = [l for l in lancamentos if l.tipo in ['despesa', 'cartao_credito']]
-        
-        total_receitas = sum(l.valor for l in receitas)
-        total_despesas = sum(l.valor for l in despesas)
+        # Totais por subcategoria e tipo em uma única consulta agregada
+        linhas = _agrupar_cubo(
+            CuboLancamentos.subcategoria_id,
+            filtro_selecao(ano, mes, *dimensoes, **valores),
+            tipo_filtro
+        )
+        total_receitas, total_despesas = _totais_por_tipo(linhas)
         
-        # Criar resumo por tipo (receita/despesa) e por subcategoria se aplicável
+        # Criar resumo por subcategoria se aplicável
         if not subcategoria_id and subcategorias:
-            # Resumo por subcategorias
             for subcategoria in subcategorias:
-                sub_lancamentos = [l for l in lancamentos if l.subcategoria_id == subcategoria.id]
-                if sub_lancamentos:
+                sub_linhas = [l for l in linhas if l[0] == subcategoria.id]
+                if sub_linhas:
                     resumo_por_tipo[subcategoria.nome] = {
                         'id': subcategoria.id,
                         'nome': subcategoria.nome,
-                        'total': sum(l.valor for l in sub_lancamentos),
-                        'quantidade': len(sub_lancamentos),
-                        'receitas': sum(l.valor for l in sub_lancamentos if l.tipo == 'receita'),
-                        'despesas': sum(l.valor for l in sub_lancamentos if l.tipo in ['despesa', 'cartao_credito'])
+                        **_somar_linhas(sub_linhas)
                     }
             
             # Adicionar lançamentos sem subcategoria
-            sem_subcategoria = [l for l in lancamentos if l.subcategoria_id is None]
+            sem_subcategoria = [l for l in linhas if l[0] is None]
             if sem_subcategoria:
                 resumo_por_tipo['Sem Subcategoria'] = {
                     'id': None,
                     'nome': 'Sem Subcategoria',
-                    'total': sum(l.valor for l in sem_subcategoria),
-                    'quantidade': len(sem_subcategoria),
-                    'receitas': sum(l.valor for l in sem_subcategoria if l.tipo == 'receita'),
-                    'despesas': sum(l.valor for l in sem_subcategoria if l.tipo in ['despesa', 'cartao_credito'])
+                    **_somar_linhas(sem_subcategoria)
                 }
     
     # Se não há categoria selecionada, mostrar resumo geral de categorias
     elif not categoria_id:
-        # Construir query base para resumo geral
-        query_base = Lancamento.query
-        
-        # Aplicar filtros de data
-        if mes > 0:  # Mês específico
-            primeiro_dia = date(ano, mes, 1)
-            ultimo_dia = date(ano, mes, monthrange(ano, mes)[1])
-            query_base = query_base.filter(
-                Lancamento.data_vencimento >= primeiro_dia,
-                Lancamento.data_vencimento <= ultimo_dia
-            )
-        elif mes == -1:  # Ano inteiro
-            primeiro_dia = date(ano, 1, 1)
-            ultimo_dia = date(ano, 12, 31)
-            query_base = query_base.filter(
-                Lancamento.data_vencimento >= primeiro_dia,
-                Lancamento.data_vencimento <= ultimo_dia
-            )
-        
-        # Aplicar filtro de tipo
-        if tipo_filtro == 'receitas':
-            query_base = query_base.filter(Lancamento.tipo == 'receita')
-        elif tipo_filtro == 'despesas':
-            query_base = query_base.filter(
-                or_(
-                    Lancamento.tipo == 'despesa',
-                    Lancamento.tipo == 'cartao_credito'
-                )
-            )
+        linhas = _agrupar_cubo(
+            CuboLancamentos.categoria_id,
+            filtro_selecao(ano, mes, 'categoria_id', 'tipo'),
+            tipo_filtro
+        )
         
-        # Buscar resumo agrupado por categoria
+        # Montar resumo por categoria (na ordem alfabética das categorias)
         for categoria in categorias:
-            cat_lancamentos = query_base.filter(Lancamento.categoria_id == categoria.id).all()
-            if cat_lancamentos:
+            cat_linhas = [l for l in linhas if l[0] == categoria.id]
+            if cat_linhas:
                 resumo_por_tipo[categoria.nome] = {
                     'id': categoria.id,
                     'nome': categoria.nome,
                     'cor': categoria.cor,
-                    'total': sum(l.valor for l in cat_lancamentos),
-                    'quantidade': len(cat_lancamentos),
-                    'receitas': sum(l.valor for l in cat_lancamentos if l.tipo == 'receita'),
-                    'despesas': sum(l.valor for l in cat_lancamentos if l.tipo in ['despesa', 'cartao_credito'])
+                    **_somar_linhas(cat_linhas)
                 }
         
         # Calcular totais gerais
-        todos_lancamentos = query_base.all()
-        total_receitas = sum(l.valor for l in todos_lancamentos if l.tipo == 'receita')
-        total_despesas = sum(l.valor for l in todos_lancamentos if l.tipo in ['despesa', 'cartao_credito'])
+        total_receitas, total_despesas = _totais_por_tipo(linhas)
     
     # Criar lista de meses para o seletor
     meses = [
@@ -222,4 +187,40 @@ def listar_subcategorias(categoria_id):
             {'id': s.id, 'nome': s.nome} 
             for s in subcategorias
         ]
-    }
\ No newline at end of file
+    }
+
+
+def _agrupar_cubo(coluna_chave, filtro, tipo_filtro):
+    """Linhas (chave, tipo, soma, quantidade) do nível do cubo selecionado pelo filtro"""
+    query_cubo = db.session.query(
+        coluna_chave,
+        CuboLancamentos.tipo,
+        func.sum(CuboLancamentos.valor_total),
+        func.sum(CuboLancamentos.quantidade)
+    ).filter(filtro)
+    
+    # Aplicar filtro de tipo
+    if tipo_filtro == 'receitas':
+        query_cubo = query_cubo.filter(CuboLancamentos.tipo == 'receita')
+    elif tipo_filtro == 'despesas':
+        query_cubo = query_cubo.filter(CuboLancamentos.tipo.in_(['despesa', 'cartao_credito']))
+    
+    return query_cubo.group_by(coluna_chave, CuboLancamentos.tipo).all()
+
+
+def _totais_por_tipo(linhas):
+    """(total de receitas, total de despesas) das linhas agrupadas"""
+    total_receitas = sum((l[2] for l in linhas if l[1] == 'receita'), 0)
+    total_despesas = sum((l[2] for l in linhas if l[1] in ['despesa', 'cartao_credito']), 0)
+    return total_receitas, total_despesas
+
+
+def _somar_linhas(linhas):
+    """Total, quantidade, receitas e despesas de um grupo de linhas agrupadas"""
+    total_receitas, total_despesas = _totais_por_tipo(linhas)
+    return {
+        'total': sum(l[2] for l in linhas),
+        'quantidade': sum(l[3] for l in linhas),
+        'receitas': total_receitas,
+        'despesas': total_despesas
+    }
@@ -2,11 +2,16 @@
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app.models import db, Conta, SaldoInvestimento, Lancamento
+from app.services.investimentos_service import (
+    series_investimentos, recalcular_rendimentos, registrar_saldos, importar_saldos_csv,
+    dados_grafico, pontos_conta, dados_consolidado as dados_consolidado_investimentos, PONTOS_GRAFICO
+)
+from app.services.rentabilidade_service import retornos_investimentos
 from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
 from sqlalchemy import func, extract, and_
-import json
+import io
 
 # Criar o Blueprint
 investimentos_bp = Blueprint('investimentos', __name__, url_prefix='/investimentos')
@@ -20,105 +25,28 @@ def dashboard():
     # Calcular total atual
     total_investido = sum(conta.saldo_atual for conta in contas_investimento)
     
-    # Preparar dados para os gráficos individuais
-    dados_contas = {}
+    # Histórico de todas as contas (uma consulta, em cache)
+    historicos = series_investimentos()['historicos']
+    
+    # Rentabilidade descontando aportes e resgates (TWR e XIRR)
+    retornos = retornos_investimentos()
+    
+    # Os gráficos são carregados depois pela API de séries (já reduzidas)
     ultimo_registro_geral = None
     
     for conta in contas_investimento:
-        historico = SaldoInvestimento.query.filter_by(conta_id=conta.id).order_by(SaldoInvestimento.data_registro).all()
-        
-        # Preparar dados no formato esperado pelo JavaScript
-        labels = []
-        valores = []
-        
-        # Incluir saldo inicial como primeiro ponto
-        data_inicial = conta.data_criacao if hasattr(conta, 'data_criacao') else date.today()
-        labels.append(data_inicial.strftime('%d/%m/%Y'))
-        valores.append(float(conta.saldo_inicial))
-        
-        # Adicionar histórico
-        for registro in historico:
-            labels.append(registro.data_registro.strftime('%d/%m/%Y'))
-            valores.append(float(registro.saldo))
-            
-            # Atualizar último registro geral
-            if not ultimo_registro_geral or registro.data_registro > ultimo_registro_geral:
-                ultimo_registro_geral = registro.data_registro
-        
-        # Adicionar saldo atual como último ponto se diferente do último registro
-        if not historico or (historico and historico[-1].saldo != conta.saldo_atual):
-            labels.append(date.today().strftime('%d/%m/%Y'))
-            valores.append(float(conta.saldo_atual))
-        
-        dados_contas[conta.id] = {
-            'labels': labels,
-            'valores': valores
-        }
+        historico = historicos.get(conta.id, [])
         
         # Adicionar informações extras à conta
         conta.rendimento = conta.saldo_atual - conta.saldo_inicial
         conta.percentual_rendimento = ((conta.saldo_atual / conta.saldo_inicial - 1) * 100) if conta.saldo_inicial > 0 else 0
         
-        # Último registro da conta
-        ultimo_reg = historico[-1] if historico else None
-        conta.ultimo_registro = ultimo_reg.data_registro if ultimo_reg else None
-    
-    # Preparar dados consolidados para o gráfico geral
-    labels_consolidado = []
-    valores_consolidado = []
-    
-    # Coletar todas as datas únicas
-    datas_set = set()
-    
-    # Adicionar datas iniciais das contas
-    for conta in contas_investimento:
-        if hasattr(conta, 'data_criacao') and conta.data_criacao:
-            datas_set.add(conta.data_criacao.date() if hasattr(conta.data_criacao, 'date') else conta.data_criacao)
-    
-    # Adicionar datas dos registros
-    for conta in contas_investimento:
-        historico = SaldoInvestimento.query.filter_by(conta_id=conta.id).all()
-        for registro in historico:
-            datas_set.add(registro.data_registro)
-    
-    if datas_set:
-        datas_ordenadas = sorted(list(datas_set))
+        conta.retornos = retornos['contas'].get(conta.id)
         
-        for data in datas_ordenadas:
-            total = Decimal('0')
-            
-            for conta in contas_investimento:
-                # Buscar o saldo mais recente até esta data
-                registro = SaldoInvestimento.query.filter(
-                    and_(
-                        SaldoInvestimento.conta_id == conta.id,
-                        SaldoInvestimento.data_registro <= data
-                    )
-                ).order_by(SaldoInvestimento.data_registro.desc()).first()
-                
-                if registro:
-                    total += registro.saldo
-                else:
-                    # Se não há registro até esta data, usar saldo inicial
-                    if hasattr(conta, 'data_criacao'):
-                        data_conta = conta.data_criacao.date() if hasattr(conta.data_criacao, 'date') else conta.data_criacao
-                        if data_conta <= data:
-                            total += conta.saldo_inicial
-                    else:
-                        total += conta.saldo_inicial
-            
-            labels_consolidado.append(data.strftime('%d/%m/%Y'))
-            valores_consolidado.append(float(total))
-    
-    # Adicionar ponto atual se necessário
-    if contas_investimento and (not valores_consolidado or valores_consolidado[-1] != float(total_investido)):
-        labels_consolidado.append(date.today().strftime('%d/%m/%Y'))
-        valores_consolidado.append(float(total_investido))
-    
-    dados_consolidado = {
-        'labels': labels_consolidado,
-        'valores': valores_consolidado
-    }
+        # Último registro da conta (e o mais recente entre todas)
+        conta.ultimo_registro = historico[-1][0] if historico else None
+        if conta.ultimo_registro and (not ultimo_registro_geral or conta.ultimo_registro > ultimo_registro_geral):
+            ultimo_registro_geral = conta.ultimo_registro
     
     # Calcular estatísticas gerais
     total_inicial = sum(conta.saldo_inicial for conta in contas_investimento)
@@ -131,8 +59,7 @@ def dashboard():
                          rendimento_total=rendimento_total,
                          percentual_total=percentual_total,
                          ultimo_registro=ultimo_registro_geral,
-                         dados_consolidado=json.dumps(dados_consolidado),
-                         dados_contas=json.dumps(dados_contas))
+                         retornos_consolidado=retornos['consolidado'])
 
 @investimentos_bp.route('/registrar-saldo', methods=['GET', 'POST'])
 def registrar_saldo():
@@ -181,6 +108,8 @@ def registrar_saldo():
         
         try:
             db.session.add(novo_registro)
+            # Registro retroativo: o rendimento dos meses seguintes muda junto
+            recalcular_rendimentos(conta_id, data_registro)
             db.session.commit()
             flash('Saldo registrado com sucesso!', 'success')
             return redirect(url_for('investimentos.dashboard'))
@@ -194,19 +123,131 @@ def registrar_saldo():
     
     # Sugerir última data do mês anterior
     hoje = date.today()
-    if hoje.day < 15:
-        # Se estamos no início do mês, sugerir último dia do mês anterior
-        data_sugerida = hoje.replace(day=1) - timedelta(days=1)
-    else:
-        # Se estamos no final do mês, sugerir último dia do mês atual
-        proximo_mes = hoje.replace(day=28) + timedelta(days=4)
-        data_sugerida = proximo_mes - timedelta(days=proximo_mes.day)
     
     return render_template('registrar_saldo.html',
                          contas=contas,
-                         data_sugerida=data_sugerida,
+                         data_sugerida=_data_sugerida(hoje),
+                         today=hoje)
+
+def _data_sugerida(hoje):
+    """Última data do mês anterior no início do mês; senão, último dia do mês atual"""
+    if hoje.day < 15:
+        return hoje.replace(day=1) - timedelta(days=1)
+    proximo_mes = hoje.replace(day=28) + timedelta(days=4)
+    return proximo_mes - timedelta(days=proximo_mes.day)
+
+@investimentos_bp.route('/registrar-saldos', methods=['GET', 'POST'])
+def registrar_saldos_lote():
+    """Registrar o saldo de todas as contas de investimento na mesma data"""
+    contas = Conta.query.filter_by(tipo_conta='Investimento').order_by(Conta.nome).all()
+    
+    if request.method == 'POST':
+        try:
+            data_registro = datetime.strptime(request.form.get('data_registro'), '%Y-%m-%d').date()
+            
+            # Contas com o saldo em branco ficam de fora
+            saldos = [
+                (conta.id,
+                 Decimal(request.form.get(f'saldo_{conta.id}').replace(',', '.')),
+                 request.form.get(f'observacoes_{conta.id}', ''))
+                for conta in contas
+                if request.form.get(f'saldo_{conta.id}', '').strip()
+            ]
+            
+            if not saldos:
+                flash('Informe o saldo de pelo menos uma conta.', 'error')
+                return redirect(url_for('investimentos.registrar_saldos_lote'))
+            
+            total = registrar_saldos(data_registro, saldos)
+            db.session.commit()
+            flash(f'{total} saldo(s) registrado(s) com sucesso!', 'success')
+            return redirect(url_for('investimentos.dashboard'))
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+        except Exception as e:
+            db.session.rollback()
+            flash('Erro ao registrar saldos. Tente novamente.', 'error')
+            print(f"Erro: {e}")
+        return redirect(url_for('investimentos.registrar_saldos_lote'))
+    
+    hoje = date.today()
+    return render_template('registrar_saldos.html',
+                         contas=contas,
+                         data_sugerida=_data_sugerida(hoje),
                          today=hoje)
 
+@investimentos_bp.route('/api/saldos', methods=['POST'])
+def api_registrar_saldos():
+    """
+    Registrar saldos em lote via JSON:
+    {"data_registro": "AAAA-MM-DD", "saldos": [{"conta_id": 1, "saldo": "1234.56", "observacoes": ""}]}
+    """
+    dados = request.get_json(silent=True) or {}
+    try:
+        data_registro = date.fromisoformat(dados.get('data_registro', ''))
+        saldos = [
+            (int(item['conta_id']),
+             Decimal(str(item['saldo']).replace(',', '.')),
+             item.get('observacoes', ''))
+            for item in dados.get('saldos', [])
+        ]
+        if not saldos:
+            raise ValueError('Nenhum saldo informado')
+        
+        total = registrar_saldos(data_registro, saldos)
+        db.session.commit()
+    except (ValueError, KeyError, TypeError, ArithmeticError) as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e) if isinstance(e, ValueError) else 'Parâmetros inválidos'
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao registrar saldos: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erro ao registrar saldos'
+        }), 500
+    
+    return jsonify({'success': True, 'registrados': total})
+
+@investimentos_bp.route('/importar-saldos', methods=['POST'])
+def importar_saldos():
+    """Importar saldos históricos de um arquivo CSV (conta, data, saldo, observações)"""
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        flash('Selecione um arquivo CSV.', 'error')
+        return redirect(url_for('investimentos.registrar_saldos_lote'))
+    
+    try:
+        # Ler o arquivo linha a linha, sem carregá-lo inteiro na memória
+        entrada = io.TextIOWrapper(arquivo.stream, encoding='utf-8-sig', newline='')
+        resultado = importar_saldos_csv(entrada)
+    except UnicodeDecodeError:
+        db.session.rollback()
+        flash('O arquivo precisa estar em UTF-8.', 'error')
+        return redirect(url_for('investimentos.registrar_saldos_lote'))
+    except Exception as e:
+        db.session.rollback()
+        flash('Erro ao importar saldos.', 'error')
+        print(f"Erro: {e}")
+        return redirect(url_for('investimentos.registrar_saldos_lote'))
+    
+    if resultado['erros']:
+        erros = resultado['erros']
+        for erro in erros[:10]:
+            flash(erro, 'error')
+        if len(erros) > 10:
+            flash(f'... e mais {len(erros) - 10} erro(s). Nada foi importado.', 'error')
+        else:
+            flash('Nada foi importado.', 'error')
+        return redirect(url_for('investimentos.registrar_saldos_lote'))
+    
+    flash(f"{resultado['importados']} saldo(s) importado(s) em {resultado['contas']} conta(s)!", 'success')
+    return redirect(url_for('investimentos.dashboard'))
+
 @investimentos_bp.route('/historico/<int:conta_id>')
 def historico_conta(conta_id):
     """Ver histórico detalhado de uma conta"""
@@ -227,32 +268,7 @@ def historico_conta(conta_id):
         status='pago'
     ).order_by(Lancamento.data_pagamento.desc()).limit(20).all()
     
-    # Preparar dados para o gráfico
-    labels = []
-    valores = []
-    rendimentos = []
-    percentuais = []
-    
-    # Adicionar ponto inicial
-    data_inicial = conta.data_criacao if hasattr(conta, 'data_criacao') else date.today()
-    labels.append(data_inicial.strftime('%d/%m/%Y'))
-    valores.append(float(conta.saldo_inicial))
-    rendimentos.append(0)
-    percentuais.append(0)
-    
-    # Adicionar dados do histórico
-    for registro in historico:
-        labels.append(registro.data_registro.strftime('%d/%m/%Y'))
-        valores.append(float(registro.saldo))
-        rendimentos.append(float(registro.rendimento_mes) if registro.rendimento_mes else 0)
-        percentuais.append(float(registro.percentual_mes) if registro.percentual_mes else 0)
-    
-    dados_grafico = {
-        'labels': labels,
-        'valores': valores,
-        'rendimentos': rendimentos,
-        'percentuais': percentuais
-    }
+    # O gráfico é carregado depois pela API de séries (já reduzida)
     
     # Reverter a ordem do histórico para exibição na tabela (mais recente primeiro)
     historico_tabela = list(reversed(historico))
@@ -260,71 +276,53 @@ def historico_conta(conta_id):
     return render_template('historico_conta.html',
                          conta=conta,
                          historico=historico_tabela,
-                         lancamentos=lancamentos,
-                         dados_grafico=json.dumps(dados_grafico))
+                         lancamentos=lancamentos)
+
+def _parametros_serie():
+    """inicio, fim (AAAA-MM-DD) e pontos da query string das APIs de séries"""
+    inicio = request.args.get('inicio')
+    fim = request.args.get('fim')
+    pontos = request.args.get('pontos', type=int, default=PONTOS_GRAFICO)
+    return (
+        date.fromisoformat(inicio) if inicio else None,
+        date.fromisoformat(fim) if fim else None,
+        max(3, min(pontos, 2000))
+    )
 
 @investimentos_bp.route('/api/dados-grafico-consolidado')
 def dados_grafico_consolidado():
-    """API para retornar dados do gráfico consolidado"""
+    """API para retornar dados do gráfico consolidado (?inicio=&fim=&pontos=)"""
+    try:
+        inicio, fim, pontos = _parametros_serie()
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Parâmetros inválidos'
+        }), 400
+    
     # Buscar todas as contas de investimento
     contas = Conta.query.filter_by(tipo_conta='Investimento').all()
     
-    # Coletar todas as datas únicas
-    datas_set = set()
-    
-    for conta in contas:
-        # Data inicial
-        if hasattr(conta, 'data_criacao') and conta.data_criacao:
-            datas_set.add(conta.data_criacao.date() if hasattr(conta.data_criacao, 'date') else conta.data_criacao)
-        
-        # Datas do histórico
-        historico = SaldoInvestimento.query.filter_by(conta_id=conta.id).all()
-        for registro in historico:
-            datas_set.add(registro.data_registro)
-    
-    # Ordenar datas
-    datas_ordenadas = sorted(list(datas_set))
-    
-    # Construir dados consolidados
-    labels = []
-    valores = []
-    
-    for data in datas_ordenadas:
-        total = Decimal('0')
-        
-        for conta in contas:
-            # Buscar o saldo mais recente até esta data
-            registro = SaldoInvestimento.query.filter(
-                and_(
-                    SaldoInvestimento.conta_id == conta.id,
-                    SaldoInvestimento.data_registro <= data
-                )
-            ).order_by(SaldoInvestimento.data_registro.desc()).first()
-            
-            if registro:
-                total += registro.saldo
-            else:
-                # Verificar se a conta já existia nesta data
-                if hasattr(conta, 'data_criacao'):
-                    data_conta = conta.data_criacao.date() if hasattr(conta.data_criacao, 'date') else conta.data_criacao
-                    if data_conta <= data:
-                        total += conta.saldo_inicial
-                else:
-                    total += conta.saldo_inicial
-        
-        labels.append(data.strftime('%d/%m/%Y'))
-        valores.append(float(total))
-    
-    # Adicionar ponto atual se necessário
-    total_atual = sum(conta.saldo_atual for conta in contas)
-    if not valores or valores[-1] != float(total_atual):
-        labels.append(date.today().strftime('%d/%m/%Y'))
-        valores.append(float(total_atual))
-    
-    return jsonify({
-        'labels': labels,
-        'valores': valores
-    })
+    return jsonify(dados_consolidado_investimentos(contas, inicio, fim, pontos))
+
+@investimentos_bp.route('/api/serie/<int:conta_id>')
+def dados_serie_conta(conta_id):
+    """API com a série de saldos de uma conta (?inicio=&fim=&pontos=)"""
+    conta = Conta.query.get_or_404(conta_id)
+    try:
+        inicio, fim, pontos = _parametros_serie()
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Parâmetros inválidos'
+        }), 400
+    
+    return jsonify(dados_grafico(pontos_conta(conta), inicio, fim, pontos))
+
+@investimentos_bp.route('/api/rentabilidade')
+def dados_rentabilidade():
+    """API com TWR, XIRR e rendimento acumulado de cada conta e do consolidado"""
+    return jsonify(retornos_investimentos())
 
 @investimentos_bp.route('/editar-registro/<int:id>', methods=['GET', 'POST'])
 def editar_registro(id):
@@ -335,18 +333,7 @@ def editar_registro(id):
         novo_saldo = Decimal(request.form.get('saldo', '0').replace(',', '.'))
         registro.observacoes = request.form.get('observacoes', '')
         
-        # Recalcular rendimento
-        ultimo_registro_anterior = SaldoInvestimento.query.filter(
-            and_(
-                SaldoInvestimento.conta_id == registro.conta_id,
-                SaldoInvestimento.data_registro < registro.data_registro
-            )
-        ).order_by(SaldoInvestimento.data_registro.desc()).first()
-        
-        saldo_anterior = ultimo_registro_anterior.saldo if ultimo_registro_anterior else registro.conta.saldo_inicial
         registro.saldo = novo_saldo
-        registro.rendimento_mes = novo_saldo - saldo_anterior
-        registro.percentual_mes = ((novo_saldo / saldo_anterior - 1) * 100) if saldo_anterior > 0 else 0
         
         # Se for o registro mais recente, atualizar saldo da conta
         registro_mais_recente = SaldoInvestimento.query.filter_by(
@@ -357,6 +344,8 @@ def editar_registro(id):
             registro.conta.saldo_atual = novo_saldo
         
         try:
+            # Recalcular o rendimento deste registro e dos seguintes
+            recalcular_rendimentos(registro.conta_id, registro.data_registro)
             db.session.commit()
             flash('Registro atualizado com sucesso!', 'success')
             return redirect(url_for('investimentos.historico_conta', conta_id=registro.conta_id))
@@ -399,6 +388,8 @@ def excluir_registro(id):
                 registro.conta.saldo_atual = registro.conta.saldo_inicial
         
         db.session.delete(registro)
+        # O registro seguinte passa a comparar com o anterior ao excluído
+        recalcular_rendimentos(conta_id, registro.data_registro)
         db.session.commit()
         flash('Registro excluído com sucesso!', 'success')
     except Exception as e:
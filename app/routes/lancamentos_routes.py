@@ -2,13 +2,33 @@
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app.models import db, Lancamento, Conta, Categoria, Subcategoria, Cartao
+from app.services.fatura_service import obter_fatura
+from app.services.recorrencia_service import FREQUENCIAS, criar_regra, atualizar_modelo, encerrar_regra
+from app.services.eventos_lancamento import nova_linha, inserir_em_lote, lancamentos_em_lote
+from app.services.listagem_service import buscar_pagina, ler_cursor, para_json, LIMITE_PADRAO
 from decimal import Decimal
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 
 # Criar o Blueprint
 lancamentos_bp = Blueprint('lancamentos', __name__)
 
+def criterio_serie_futura(lancamento):
+    """Filtro dos demais lançamentos da mesma série com vencimento a partir deste"""
+    if lancamento.regra_id:
+        mesma_serie = Lancamento.regra_id == lancamento.regra_id
+    elif lancamento.lancamento_pai_id:
+        mesma_serie = Lancamento.lancamento_pai_id == lancamento.lancamento_pai_id
+    else:
+        mesma_serie = Lancamento.lancamento_pai_id == lancamento.id
+    return (
+        mesma_serie,
+        Lancamento.data_vencimento >= lancamento.data_vencimento,
+        Lancamento.id != lancamento.id
+    )
+
 @lancamentos_bp.route('/lancamentos')
 def listar_lancamentos():
     """Página principal de lançamentos"""
@@ -18,11 +38,10 @@ def listar_lancamentos():
     categorias_receita = Categoria.query.filter_by(tipo='Receita', ativa=True).order_by(Categoria.nome).all()
     cartoes = Cartao.query.filter_by(ativo=True).order_by(Cartao.nome).all()
     
-    # Buscar lançamentos recentes (últimos 30 dias) - ordenados do mais recente para o mais antigo
-    data_limite = date.today() - timedelta(days=30)
-    lancamentos = Lancamento.query.filter(
-        Lancamento.data_vencimento >= data_limite
-    ).order_by(Lancamento.data_criacao.desc()).all()
+    # Primeira página: do vencimento mais distante (até 30 dias à frente) para trás;
+    # as seguintes são carregadas pela API conforme a rolagem
+    data_fim = date.today() + timedelta(days=30)
+    lancamentos, proximo = buscar_pagina(data_fim=data_fim)
     
     return render_template('lancamentos.html', 
                          contas=contas, 
@@ -30,8 +49,51 @@ def listar_lancamentos():
                          categorias_receita=categorias_receita,
                          cartoes=cartoes,
                          lancamentos=lancamentos,
+                         proximo=proximo,
+                         data_fim=data_fim,
                          today=date.today())
 
+@lancamentos_bp.route('/api/lancamentos')
+def api_lancamentos():
+    """
+    Lista lançamentos em páginas (mais recentes primeiro).
+    Filtros: conta_id, cartao_id, categoria_id, tag, status, tipo, data_inicio, data_fim.
+    Paginação: limite e apos (cursor devolvido em "proximo"). Campos: campos=id,descricao,...
+    """
+    try:
+        filtros = {
+            'conta_id': request.args.get('conta_id', type=int),
+            'cartao_id': request.args.get('cartao_id', type=int),
+            'categoria_id': request.args.get('categoria_id', type=int),
+            'tag': request.args.get('tag'),
+            'status': request.args.get('status'),
+            'tipo': request.args.get('tipo'),
+        }
+        data_inicio = request.args.get('data_inicio')
+        data_fim = request.args.get('data_fim')
+        apos = request.args.get('apos')
+        campos = request.args.get('campos')
+        
+        linhas, proximo = buscar_pagina(
+            filtros=filtros,
+            data_inicio=date.fromisoformat(data_inicio) if data_inicio else None,
+            data_fim=date.fromisoformat(data_fim) if data_fim else None,
+            apos=ler_cursor(apos) if apos else None,
+            limite=request.args.get('limite', type=int, default=LIMITE_PADRAO),
+            campos=campos.split(',') if campos else None
+        )
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Parâmetros inválidos'
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'lancamentos': [para_json(linha) for linha in linhas],
+        'proximo': proximo
+    })
+
 @lancamentos_bp.route('/lancamentos/cartao', methods=['POST'])
 def criar_despesa_cartao():
     """Criar nova despesa no cartão de crédito"""
@@ -95,108 +157,46 @@ def criar_despesa_cartao():
             valor_total_parcelas = valor_parcela * num_parcelas
             diferenca = valor - valor_total_parcelas
             
-            # Criar lançamento pai
-            lancamento_pai = Lancamento(
-                descricao=f"{descricao} (1/{num_parcelas})",
-                valor=valor_parcela + diferenca,
-                tipo='cartao_credito',
-                conta_id=cartao.conta_id,
-                cartao_id=cartao_id,
-                categoria_id=categoria_id,
-                subcategoria_id=subcategoria_id,
-                data_vencimento=data_vencimento,
-                mes_inicial_cartao=mes_inicial,
-                status='pendente',
-                recorrencia=recorrencia,
-                numero_parcela=1,
-                total_parcelas=num_parcelas,
-                tag=tag if tag else None
-            )
-            db.session.add(lancamento_pai)
-            db.session.flush()
-            
-            # Criar parcelas restantes
-            for i in range(2, num_parcelas + 1):
-                data_parcela = data_vencimento + relativedelta(months=i-1)
-                mes_parcela = mes_inicial + relativedelta(months=i-1)
-                parcela = Lancamento(
+            # Montar todas as parcelas e gravar em lote (a primeira recebe o ajuste)
+            parcelas = []
+            for i in range(1, num_parcelas + 1):
+                parcelas.append(nova_linha(
                     descricao=f"{descricao} ({i}/{num_parcelas})",
-                    valor=valor_parcela,
+                    valor=valor_parcela + diferenca if i == 1 else valor_parcela,
                     tipo='cartao_credito',
                     conta_id=cartao.conta_id,
                     cartao_id=cartao_id,
                     categoria_id=categoria_id,
                     subcategoria_id=subcategoria_id,
-                    data_vencimento=data_parcela,
-                    mes_inicial_cartao=mes_parcela,
+                    data_vencimento=data_vencimento + relativedelta(months=i-1),
+                    mes_inicial_cartao=mes_inicial + relativedelta(months=i-1),
                     status='pendente',
                     recorrencia=recorrencia,
                     numero_parcela=i,
                     total_parcelas=num_parcelas,
-                    lancamento_pai_id=lancamento_pai.id,
                     tag=tag if tag else None
-                )
-                db.session.add(parcela)
+                ))
+            inserir_em_lote(parcelas)
                 
         else:
-            # Lançamentos recorrentes
-            if recorrencia == 'mensal':
-                incremento = relativedelta(months=1)
-                total_lancamentos = 60
-            elif recorrencia == 'anual':
-                incremento = relativedelta(years=1)
-                total_lancamentos = 5
-            elif recorrencia == 'semanal':
-                incremento = timedelta(weeks=1)
-                total_lancamentos = 260
-            elif recorrencia == 'quinzenal':
-                incremento = timedelta(weeks=2)
-                total_lancamentos = 130
-            else:
+            # Lançamentos recorrentes: grava a regra e só as ocorrências do horizonte
+            if recorrencia not in FREQUENCIAS:
                 flash('Tipo de recorrência inválido!', 'error')
                 return redirect(url_for('lancamentos.listar_lancamentos'))
             
-            # Criar primeiro lançamento
-            lancamento_pai = Lancamento(
+            criar_regra(
+                tipo='cartao_credito',
+                frequencia=recorrencia,
                 descricao=descricao,
                 valor=valor,
-                tipo='cartao_credito',
-                conta_id=cartao.conta_id,
-                cartao_id=cartao_id,
+                conta=cartao.conta,
+                data_inicio=data_vencimento,
                 categoria_id=categoria_id,
                 subcategoria_id=subcategoria_id,
-                data_vencimento=data_vencimento,
-                mes_inicial_cartao=mes_inicial,
-                status='pendente',
-                recorrencia=recorrencia,
-                tag=tag if tag else None
+                tag=tag if tag else None,
+                cartao_id=cartao_id,
+                mes_inicial_cartao=mes_inicial
             )
-            db.session.add(lancamento_pai)
-            db.session.flush()
-            
-            # Criar lançamentos futuros
-            data_atual = data_vencimento
-            mes_atual = mes_inicial
-            for i in range(1, total_lancamentos):
-                # CORREÇÃO: Incrementar ambas as datas
-                data_atual = data_atual + incremento
-                mes_atual = mes_atual + incremento
-                lancamento = Lancamento(
-                    descricao=descricao,
-                    valor=valor,
-                    tipo='cartao_credito',
-                    conta_id=cartao.conta_id,
-                    cartao_id=cartao_id,
-                    categoria_id=categoria_id,
-                    subcategoria_id=subcategoria_id,
-                    data_vencimento=data_atual,
-                    mes_inicial_cartao=mes_atual,
-                    status='pendente',
-                    recorrencia=recorrencia,
-                    lancamento_pai_id=lancamento_pai.id,
-                    tag=tag if tag else None
-                )
-                db.session.add(lancamento)
         
         db.session.commit()
         flash('Despesa no cartão cadastrada com sucesso!', 'success')
@@ -262,6 +262,7 @@ def criar_transferencia():
             tipo='transferencia',
             conta_id=conta_origem_id,
             conta_destino_id=conta_destino_id,
+            sentido='saida',
             categoria_id=categoria_transferencia.id,
             data_vencimento=data_vencimento,
             data_pagamento=data_vencimento,  # Transferência é realizada imediatamente
@@ -277,6 +278,7 @@ def criar_transferencia():
             tipo='transferencia',
             conta_id=conta_destino_id,
             conta_destino_id=conta_origem_id,  # Inverter para rastreabilidade
+            sentido='entrada',
             categoria_id=categoria_transferencia.id,
             data_vencimento=data_vencimento,
             data_pagamento=data_vencimento,
@@ -340,7 +342,8 @@ def criar_despesa():
         data_pagamento = data_vencimento if is_investimento else None
         
         # Se for conta de investimento e status 'pago', atualizar saldo imediatamente
-        if is_investimento:
+        # (nas séries recorrentes o saldo é atualizado a cada ocorrência gerada)
+        if is_investimento and recorrencia in ('unica', 'parcelada'):
             conta.saldo_atual -= valor
             print(f"Atualizando saldo da conta de investimento. Novo saldo: {conta.saldo_atual}")
         
@@ -378,113 +381,48 @@ def criar_despesa():
             valor_total_parcelas = valor_parcela * num_parcelas
             diferenca = valor - valor_total_parcelas
             
-            # Criar lançamento pai
-            lancamento_pai = Lancamento(
-                descricao=f"{descricao} (1/{num_parcelas})",
-                valor=valor_parcela + diferenca,  # Primeira parcela com ajuste
-                tipo='despesa',
-                conta_id=conta_id,
-                categoria_id=categoria_id,
-                subcategoria_id=subcategoria_id,
-                data_vencimento=data_vencimento,
-                data_pagamento=data_pagamento,
-                status=status_lancamento,
-                recorrencia=recorrencia,
-                numero_parcela=1,
-                total_parcelas=num_parcelas,
-                tag=tag if tag else None
-            )
-            db.session.add(lancamento_pai)
-            db.session.flush()  # Para obter o ID
-            
-            # Criar parcelas restantes
-            for i in range(2, num_parcelas + 1):
+            # Montar todas as parcelas e gravar em lote (a primeira recebe o ajuste)
+            parcelas = []
+            for i in range(1, num_parcelas + 1):
                 data_parcela = data_vencimento + relativedelta(months=i-1)
-                data_pagamento_parcela = data_parcela if is_investimento else None
-                
-                parcela = Lancamento(
+                parcelas.append(nova_linha(
                     descricao=f"{descricao} ({i}/{num_parcelas})",
-                    valor=valor_parcela,
+                    valor=valor_parcela + diferenca if i == 1 else valor_parcela,
                     tipo='despesa',
                     conta_id=conta_id,
                     categoria_id=categoria_id,
                     subcategoria_id=subcategoria_id,
                     data_vencimento=data_parcela,
-                    data_pagamento=data_pagamento_parcela,
+                    data_pagamento=data_parcela if is_investimento else None,
                     status=status_lancamento,
                     recorrencia=recorrencia,
                     numero_parcela=i,
                     total_parcelas=num_parcelas,
-                    lancamento_pai_id=lancamento_pai.id,
                     tag=tag if tag else None
-                )
-                db.session.add(parcela)
-                
-                # Se for conta de investimento, atualizar saldo para cada parcela
-                if is_investimento:
-                    conta.saldo_atual -= valor_parcela
+                ))
+            inserir_em_lote(parcelas)
+            
+            # Se for conta de investimento, atualizar saldo para cada parcela além da primeira
+            if is_investimento:
+                conta.saldo_atual -= valor_parcela * (num_parcelas - 1)
                 
         else:
-            # Lançamentos recorrentes (mensal, semanal, quinzenal, anual)
-            # Definir período e incremento
-            if recorrencia == 'mensal':
-                incremento = relativedelta(months=1)
-                total_lancamentos = 60  # 5 anos
-            elif recorrencia == 'anual':
-                incremento = relativedelta(years=1)
-                total_lancamentos = 5  # 5 anos
-            elif recorrencia == 'semanal':
-                incremento = timedelta(weeks=1)
-                total_lancamentos = 260  # ~5 anos
-            elif recorrencia == 'quinzenal':
-                incremento = timedelta(weeks=2)
-                total_lancamentos = 130  # ~5 anos
-            else:
+            # Lançamentos recorrentes: grava a regra e só as ocorrências do horizonte
+            if recorrencia not in FREQUENCIAS:
                 flash('Tipo de recorrência inválido!', 'error')
                 return redirect(url_for('lancamentos.listar_lancamentos'))
             
-            # Criar primeiro lançamento
-            lancamento_pai = Lancamento(
+            criar_regra(
+                tipo='despesa',
+                frequencia=recorrencia,
                 descricao=descricao,
                 valor=valor,
-                tipo='despesa',
-                conta_id=conta_id,
+                conta=conta,
+                data_inicio=data_vencimento,
                 categoria_id=categoria_id,
                 subcategoria_id=subcategoria_id,
-                data_vencimento=data_vencimento,
-                data_pagamento=data_pagamento,
-                status=status_lancamento,
-                recorrencia=recorrencia,
                 tag=tag if tag else None
             )
-            db.session.add(lancamento_pai)
-            db.session.flush()
-            
-            # Criar lançamentos futuros
-            data_atual = data_vencimento
-            for i in range(1, total_lancamentos):
-                data_atual = data_atual + incremento
-                data_pagamento_futura = data_atual if is_investimento else None
-                
-                lancamento = Lancamento(
-                    descricao=descricao,
-                    valor=valor,
-                    tipo='despesa',
-                    conta_id=conta_id,
-                    categoria_id=categoria_id,
-                    subcategoria_id=subcategoria_id,
-                    data_vencimento=data_atual,
-                    data_pagamento=data_pagamento_futura,
-                    status=status_lancamento,
-                    recorrencia=recorrencia,
-                    lancamento_pai_id=lancamento_pai.id,
-                    tag=tag if tag else None
-                )
-                db.session.add(lancamento)
-                
-                # Se for conta de investimento, atualizar saldo para cada lançamento futuro
-                if is_investimento:
-                    conta.saldo_atual -= valor
         
         db.session.commit()
         
@@ -538,7 +476,8 @@ def criar_receita():
         data_pagamento = data_vencimento if is_investimento else None
         
         # Se for conta de investimento e status 'pago', atualizar saldo imediatamente
-        if is_investimento:
+        # (nas séries recorrentes o saldo é atualizado a cada ocorrência gerada)
+        if is_investimento and recorrencia in ('unica', 'parcelada'):
             conta.saldo_atual += valor  # NOTA: Para receita, SOMA ao invés de subtrair
             print(f"Atualizando saldo da conta de investimento. Novo saldo: {conta.saldo_atual}")
         
@@ -575,112 +514,48 @@ def criar_receita():
             valor_total_parcelas = valor_parcela * num_parcelas
             diferenca = valor - valor_total_parcelas
             
-            # Criar lançamento pai
-            lancamento_pai = Lancamento(
-                descricao=f"{descricao} (1/{num_parcelas})",
-                valor=valor_parcela + diferenca,
-                tipo='receita',
-                conta_id=conta_id,
-                categoria_id=categoria_id,
-                subcategoria_id=subcategoria_id,
-                data_vencimento=data_vencimento,
-                data_pagamento=data_pagamento,
-                status=status_lancamento,
-                recorrencia=recorrencia,
-                numero_parcela=1,
-                total_parcelas=num_parcelas,
-                tag=tag if tag else None
-            )
-            db.session.add(lancamento_pai)
-            db.session.flush()
-            
-            # Criar parcelas restantes
-            for i in range(2, num_parcelas + 1):
+            # Montar todas as parcelas e gravar em lote (a primeira recebe o ajuste)
+            parcelas = []
+            for i in range(1, num_parcelas + 1):
                 data_parcela = data_vencimento + relativedelta(months=i-1)
-                data_pagamento_parcela = data_parcela if is_investimento else None
-                
-                parcela = Lancamento(
+                parcelas.append(nova_linha(
                     descricao=f"{descricao} ({i}/{num_parcelas})",
-                    valor=valor_parcela,
+                    valor=valor_parcela + diferenca if i == 1 else valor_parcela,
                     tipo='receita',
                     conta_id=conta_id,
                     categoria_id=categoria_id,
                     subcategoria_id=subcategoria_id,
                     data_vencimento=data_parcela,
-                    data_pagamento=data_pagamento_parcela,
+                    data_pagamento=data_parcela if is_investimento else None,
                     status=status_lancamento,
                     recorrencia=recorrencia,
                     numero_parcela=i,
                     total_parcelas=num_parcelas,
-                    lancamento_pai_id=lancamento_pai.id,
                     tag=tag if tag else None
-                )
-                db.session.add(parcela)
-                
-                # Se for conta de investimento, atualizar saldo para cada parcela
-                if is_investimento:
-                    conta.saldo_atual += valor_parcela  # SOMA para receitas
+                ))
+            inserir_em_lote(parcelas)
+            
+            # Se for conta de investimento, atualizar saldo para cada parcela além da primeira
+            if is_investimento:
+                conta.saldo_atual += valor_parcela * (num_parcelas - 1)
                 
         else:
-            # Lançamentos recorrentes
-            if recorrencia == 'mensal':
-                incremento = relativedelta(months=1)
-                total_lancamentos = 60
-            elif recorrencia == 'anual':
-                incremento = relativedelta(years=1)
-                total_lancamentos = 5
-            elif recorrencia == 'semanal':
-                incremento = timedelta(weeks=1)
-                total_lancamentos = 260
-            elif recorrencia == 'quinzenal':
-                incremento = timedelta(weeks=2)
-                total_lancamentos = 130
-            else:
+            # Lançamentos recorrentes: grava a regra e só as ocorrências do horizonte
+            if recorrencia not in FREQUENCIAS:
                 flash('Tipo de recorrência inválido!', 'error')
                 return redirect(url_for('lancamentos.listar_lancamentos'))
             
-            # Criar primeiro lançamento
-            lancamento_pai = Lancamento(
+            criar_regra(
+                tipo='receita',
+                frequencia=recorrencia,
                 descricao=descricao,
                 valor=valor,
-                tipo='receita',
-                conta_id=conta_id,
+                conta=conta,
+                data_inicio=data_vencimento,
                 categoria_id=categoria_id,
                 subcategoria_id=subcategoria_id,
-                data_vencimento=data_vencimento,
-                data_pagamento=data_pagamento,
-                status=status_lancamento,
-                recorrencia=recorrencia,
                 tag=tag if tag else None
             )
-            db.session.add(lancamento_pai)
-            db.session.flush()
-            
-            # Criar lançamentos futuros
-            data_atual = data_vencimento
-            for i in range(1, total_lancamentos):
-                data_atual = data_atual + incremento
-                data_pagamento_futura = data_atual if is_investimento else None
-                
-                lancamento = Lancamento(
-                    descricao=descricao,
-                    valor=valor,
-                    tipo='receita',
-                    conta_id=conta_id,
-                    categoria_id=categoria_id,
-                    subcategoria_id=subcategoria_id,
-                    data_vencimento=data_atual,
-                    data_pagamento=data_pagamento_futura,
-                    status=status_lancamento,
-                    recorrencia=recorrencia,
-                    lancamento_pai_id=lancamento_pai.id,
-                    tag=tag if tag else None
-                )
-                db.session.add(lancamento)
-                
-                # Se for conta de investimento, atualizar saldo para cada lançamento futuro
-                if is_investimento:
-                    conta.saldo_atual += valor  # SOMA para receitas
         
         db.session.commit()
         
@@ -738,37 +613,33 @@ def excluir_lancamento(id):
         
         if excluir_todos and lancamento.recorrencia != 'unica':
             # Excluir este e todos os futuros
-            if lancamento.lancamento_pai_id:
-                # É uma parcela/recorrência filha
-                lancamentos_excluir = Lancamento.query.filter(
-                    Lancamento.lancamento_pai_id == lancamento.lancamento_pai_id,
-                    Lancamento.data_vencimento >= lancamento.data_vencimento
-                ).all()
-                # Incluir o próprio lançamento
-                lancamentos_excluir.append(lancamento)
-            else:
-                # É o lançamento pai
-                lancamentos_excluir = Lancamento.query.filter(
-                    db.or_(
-                        Lancamento.id == lancamento.id,
-                        db.and_(
-                            Lancamento.lancamento_pai_id == lancamento.id,
-                            Lancamento.data_vencimento >= lancamento.data_vencimento
-                        )
-                    )
-                ).all()
+            if lancamento.regra_id:
+                # Série gerada por regra: encerrar a regra para não gerar novas ocorrências
+                encerrar_regra(lancamento.regra, lancamento.data_vencimento)
+            
+            criterio = criterio_serie_futura(lancamento)
+            
+            # Reverter saldo dos lançamentos pagos que serão excluídos (uma soma por conta e tipo)
+            pagos = db.session.query(
+                Lancamento.conta_id,
+                Lancamento.tipo,
+                func.sum(Lancamento.valor)
+            ).filter(*criterio, Lancamento.status == 'pago').group_by(
+                Lancamento.conta_id, Lancamento.tipo
+            ).all()
+            for conta_id, tipo, total in pagos:
+                conta = Conta.query.get(conta_id)
+                if tipo == 'receita':
+                    conta.saldo_atual -= total
+                else:  # despesa ou cartao_credito
+                    conta.saldo_atual += total
+            
+            # Um único DELETE para os demais lançamentos da série
+            with lancamentos_em_lote(*criterio):
+                quantidade = Lancamento.query.filter(*criterio).delete(synchronize_session=False)
+            db.session.delete(lancamento)
             
-            # Reverter saldo de todos os lançamentos pagos que serão excluídos
-            for lanc in lancamentos_excluir:
-                if lanc.status == 'pago' and lanc.id != lancamento.id:  # Já revertemos o principal
-                    conta = lanc.conta
-                    if lanc.tipo == 'receita':
-                        conta.saldo_atual -= lanc.valor
-                    else:  # despesa ou cartao_credito
-                        conta.saldo_atual += lanc.valor
-                db.session.delete(lanc)
-                
-            flash(f'{len(lancamentos_excluir)} lançamentos excluídos com sucesso!', 'success')
+            flash(f'{quantidade + 1} lançamentos excluídos com sucesso!', 'success')
         else:
             # Excluir apenas este lançamento
             db.session.delete(lancamento)
@@ -885,27 +756,24 @@ def editar_lancamento(id):
             editar_todos = request.form.get('editar_todos') == 'true'
             
             if editar_todos and lancamento.recorrencia != 'unica':
-                # Buscar lançamentos futuros relacionados
-                if lancamento.lancamento_pai_id:
-                    lancamentos_editar = Lancamento.query.filter(
-                        Lancamento.lancamento_pai_id == lancamento.lancamento_pai_id,
-                        Lancamento.data_vencimento >= lancamento.data_vencimento
-                    ).all()
-                else:
-                    lancamentos_editar = Lancamento.query.filter(
-                        Lancamento.lancamento_pai_id == lancamento.id,
-                        Lancamento.data_vencimento >= lancamento.data_vencimento
-                    ).all()
+                # Série gerada por regra: as próximas ocorrências usam os novos valores
+                if lancamento.regra_id:
+                    atualizar_modelo(lancamento)
+                
+                valores = {
+                    'valor': lancamento.valor,
+                    'categoria_id': lancamento.categoria_id,
+                    'subcategoria_id': lancamento.subcategoria_id,
+                    'tag': lancamento.tag
+                }
+                if lancamento.tipo != 'cartao_credito':
+                    valores['conta_id'] = lancamento.conta_id
                 
-                # Atualizar todos
-                for lanc in lancamentos_editar:
-                    lanc.valor = lancamento.valor
-                    if lancamento.tipo != 'cartao_credito':
-                        lanc.conta_id = lancamento.conta_id
-                    lanc.categoria_id = lancamento.categoria_id
-                    lanc.subcategoria_id = lancamento.subcategoria_id
-                    lanc.tag = lancamento.tag
-                    # NÃO atualizar mes_inicial_cartao para manter as datas originais
+                # Um único UPDATE para os lançamentos futuros relacionados
+                # (NÃO atualizar mes_inicial_cartao para manter as datas originais)
+                criterio = criterio_serie_futura(lancamento)
+                with lancamentos_em_lote(*criterio):
+                    Lancamento.query.filter(*criterio).update(valores, synchronize_session=False)
             
             db.session.commit()
             flash('Lançamento atualizado com sucesso!', 'success')
@@ -922,6 +790,9 @@ def editar_lancamento(id):
             
             return redirect(url_for('lancamentos.listar_lancamentos'))
             
+        except IntegrityError:
+            db.session.rollback()
+            flash('Já existe uma ocorrência desta série nessa data.', 'error')
         except Exception as e:
             db.session.rollback()
             print(f"Erro ao editar lançamento: {e}")
@@ -958,6 +829,12 @@ def pagar_fatura_cartao():
             flash('Cartão não encontrado!', 'error')
             return redirect(url_for('main.home', mes=mes, ano=ano))
         
+        # Buscar (ou criar) a fatura do mês e evitar pagamento em duplicidade
+        fatura = obter_fatura(cartao, ano, mes)
+        if fatura.status == 'pago':
+            flash(f'A fatura do {cartao.nome} já está paga.', 'warning')
+            return redirect(url_for('main.home', mes=mes, ano=ano))
+        
         # Buscar ou criar categoria para pagamento de fatura
         categoria_fatura = Categoria.query.filter_by(nome='Pagamento de Fatura').first()
         if not categoria_fatura:
@@ -971,15 +848,6 @@ def pagar_fatura_cartao():
             db.session.add(categoria_fatura)
             db.session.flush()
         
-        # Calcular data de vencimento
-        try:
-            data_vencimento = date(ano, mes, cartao.dia_vencimento)
-        except ValueError:
-            # Se o dia não existir no mês, usar o último dia
-            from calendar import monthrange
-            ultimo_dia = monthrange(ano, mes)[1]
-            data_vencimento = date(ano, mes, ultimo_dia)
-        
         # Criar lançamento de pagamento
         pagamento = Lancamento(
             descricao=f'Pagamento Fatura {cartao.nome}',
@@ -987,7 +855,7 @@ def pagar_fatura_cartao():
             tipo='despesa',
             conta_id=cartao.conta_id,
             categoria_id=categoria_fatura.id,
-            data_vencimento=data_vencimento,
+            data_vencimento=fatura.data_vencimento,
             data_pagamento=date.today(),
             status='pago',
             recorrencia='unica',
@@ -999,6 +867,11 @@ def pagar_fatura_cartao():
         conta.saldo_atual -= valor_fatura
         
         db.session.add(pagamento)
+        db.session.flush()
+        
+        # Vincular o pagamento à fatura
+        fatura.pagamento = pagamento
+        fatura.status = 'pago'
         db.session.commit()
         
         flash(f'Fatura do {cartao.nome} paga com sucesso!', 'success')
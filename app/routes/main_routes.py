@@ -1,12 +1,15 @@
 # app/routes/main_routes.py
 
-from flask import Blueprint, render_template, request, Response, flash, redirect, url_for, current_app
-from app.models import db, Conta, Lancamento, Cartao, Categoria, Subcategoria
+from flask import Blueprint, render_template, request, Response, flash, redirect, url_for, current_app, jsonify
+from app.models import db, Conta, Lancamento, Cartao, Fatura, Categoria, Subcategoria
+from app.services.dashboard_service import montar_dashboard
+from app.services.fatura_service import calcular_vencimento
+from app.services.recorrencia_service import garantir_periodo, fim_da_janela
+from app.services.periodo_service import intervalo_mes, filtro_intervalo
+from app.services.cubo_service import reconstruir_cubo
 from datetime import datetime, date, timedelta
-from calendar import monthrange
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import func, extract, and_
-from collections import defaultdict
+from sqlalchemy import func, and_
 import io
 import xlsxwriter
 
@@ -19,272 +22,8 @@ def home():
     mes = request.args.get('mes', type=int, default=date.today().month)
     ano = request.args.get('ano', type=int, default=date.today().year)
     
-    # Calcular primeiro e último dia do mês
-    primeiro_dia = date(ano, mes, 1)
-    ultimo_dia = date(ano, mes, monthrange(ano, mes)[1])
-    
-    # Buscar saldos das contas
-    contas_corrente = Conta.query.filter_by(tipo_conta='Corrente').all()
-    contas_investimento = Conta.query.filter_by(tipo_conta='Investimento').all()
-    
-    # Calcular totais usando saldo_atual (sempre recalcular para pegar mudanças)
-    total_corrente = db.session.query(func.sum(Conta.saldo_atual)).filter(Conta.tipo_conta == 'Corrente').scalar() or 0
-    total_investimento = db.session.query(func.sum(Conta.saldo_atual)).filter(Conta.tipo_conta == 'Investimento').scalar() or 0
-    
-    # IMPORTANTE: Buscar IDs das contas correntes para filtrar
-    ids_contas_corrente = [conta.id for conta in contas_corrente]
-    ids_contas_investimento = [conta.id for conta in contas_investimento]
-    
-    # Buscar lançamentos do mês - APENAS DE CONTAS CORRENTES
-    # Para receitas: apenas tipo = 'receita' E conta_id em contas correntes
-    receitas = Lancamento.query.filter(
-        Lancamento.tipo == 'receita',
-        Lancamento.conta_id.in_(ids_contas_corrente),  # FILTRO ADICIONADO
-        Lancamento.data_vencimento >= primeiro_dia,
-        Lancamento.data_vencimento <= ultimo_dia
-    ).order_by(Lancamento.data_vencimento).all()
-    
-    # Para despesas: apenas tipo = 'despesa' E conta_id em contas correntes
-    despesas_query = Lancamento.query.filter(
-        Lancamento.tipo == 'despesa',
-        Lancamento.conta_id.in_(ids_contas_corrente),  # FILTRO ADICIONADO
-        Lancamento.data_vencimento >= primeiro_dia,
-        Lancamento.data_vencimento <= ultimo_dia
-    ).order_by(Lancamento.data_vencimento).all()
-    
-    # Processar faturas de cartão (mantém lógica existente - cartões já são de contas correntes)
-    cartoes = Cartao.query.filter_by(ativo=True).all()
-    faturas_cartao = []
-    
-    for cartao in cartoes:
-        # Calcular a data de vencimento do cartão no mês atual
-        try:
-            data_vencimento_cartao = date(ano, mes, cartao.dia_vencimento)
-        except ValueError:
-            # Se o dia não existir no mês (ex: 31 de fevereiro), usar o último dia do mês
-            data_vencimento_cartao = ultimo_dia
-        
-        # Buscar despesas do cartão que devem aparecer neste mês
-        despesas_cartao = Lancamento.query.filter(
-            Lancamento.tipo == 'cartao_credito',
-            Lancamento.cartao_id == cartao.id,
-            extract('year', Lancamento.mes_inicial_cartao) == ano,
-            extract('month', Lancamento.mes_inicial_cartao) == mes
-        ).all()
-        
-        if despesas_cartao:
-            # Calcular total da fatura
-            total_fatura = sum(despesa.valor for despesa in despesas_cartao)
-            
-            # Criar um lançamento virtual para a fatura
-            fatura = type('Lancamento', (), {
-                'id': f'fatura_{cartao.id}_{ano}_{mes}',
-                'descricao': f'Fatura {cartao.nome}',
-                'valor': total_fatura,
-                'tipo': 'fatura_cartao',
-                'conta_id': cartao.conta_id,
-                'conta': cartao.conta,
-                'cartao_id': cartao.id,
-                'cartao': cartao,
-                'categoria': type('Categoria', (), {'nome': 'Cartão de Crédito', 'cor': '#6f42c1', 'icone': 'credit_card'}),
-                'subcategoria': None,
-                'data_vencimento': data_vencimento_cartao,
-                'data_pagamento': None,
-                'status': 'pendente',
-                'recorrencia': 'unica',
-                'tag': 'Fatura',
-                'despesas_cartao': despesas_cartao
-            })
-            
-            # Verificar se a fatura já foi paga (buscar um lançamento de pagamento)
-            pagamento_fatura = Lancamento.query.filter(
-                Lancamento.tipo == 'despesa',
-                Lancamento.descricao.like(f'%Pagamento Fatura {cartao.nome}%'),
-                Lancamento.data_vencimento >= primeiro_dia,
-                Lancamento.data_vencimento <= ultimo_dia
-            ).first()
-            
-            if pagamento_fatura and pagamento_fatura.status == 'pago':
-                fatura.status = 'pago'
-                fatura.data_pagamento = pagamento_fatura.data_pagamento
-            
-            faturas_cartao.append(fatura)
-    
-    # Combinar despesas normais com faturas de cartão
-    despesas = despesas_query + faturas_cartao
-    # Ordenar por data de vencimento
-    despesas.sort(key=lambda x: x.data_vencimento)
-    
-    # Calcular totais de receitas e despesas
-    total_receitas = sum(lancamento.valor for lancamento in receitas)
-    total_despesas = sum(lancamento.valor for lancamento in despesas)
-    
-    # Calcular totais de receitas e despesas PENDENTES para o resultado do mês
-    total_receitas_pendentes = sum(lancamento.valor for lancamento in receitas if lancamento.status == 'pendente')
-    total_despesas_pendentes = sum(lancamento.valor for lancamento in despesas if lancamento.status == 'pendente' and lancamento.tipo != 'fatura_cartao')
-    
-    # Calcular total das faturas de cartão não pagas
-    total_faturas_pendentes = sum(lancamento.valor for lancamento in despesas if lancamento.tipo == 'fatura_cartao' and lancamento.status == 'pendente')
-    
-    # ========== ANÁLISE POR CATEGORIAS ==========
-    
-    # Estrutura para armazenar análise
-    analise_categorias = {
-        'despesas': [],
-        'investimentos': [],
-        'receitas': [],
-        'total_despesas': 0,
-        'total_investimentos': 0,
-        'total_receitas': 0,
-        'economia_mes': 0
-    }
-    
-    # 1. ANÁLISE DE DESPESAS (excluindo investimentos)
-    # Buscar apenas despesas normais (NÃO incluir cartão_credito aqui)
-    despesas_normais = Lancamento.query.filter(
-        Lancamento.tipo == 'despesa',  # Apenas despesas, sem cartão_credito
-        Lancamento.conta_id.in_(ids_contas_corrente),
-        Lancamento.data_vencimento >= primeiro_dia,
-        Lancamento.data_vencimento <= ultimo_dia,
-        Lancamento.status != 'cancelado'
-    ).all()
-    
-    # Agrupar por categoria e subcategoria
-    despesas_por_categoria = defaultdict(lambda: {
-        'nome': '',
-        'total': 0,
-        'subcategorias': defaultdict(float),
-        'cor': '#6c757d',
-        'icone': 'category'
-    })
-    
-    # Adicionar despesas normais
-    for despesa in despesas_normais:
-        if despesa.categoria:
-            cat_id = despesa.categoria_id
-            despesas_por_categoria[cat_id]['nome'] = despesa.categoria.nome
-            despesas_por_categoria[cat_id]['cor'] = despesa.categoria.cor or '#6c757d'
-            despesas_por_categoria[cat_id]['icone'] = despesa.categoria.icone or 'category'
-            despesas_por_categoria[cat_id]['total'] += float(despesa.valor)
-            
-            if despesa.subcategoria:
-                despesas_por_categoria[cat_id]['subcategorias'][despesa.subcategoria.nome] += float(despesa.valor)
-            else:
-                despesas_por_categoria[cat_id]['subcategorias']['Sem subcategoria'] += float(despesa.valor)
-    
-    # Adicionar APENAS as despesas do cartão que fazem parte das faturas deste mês
-    for fatura in faturas_cartao:
-        # Apenas processar despesas de faturas não canceladas
-        if hasattr(fatura, 'despesas_cartao'):
-            for despesa_cartao in fatura.despesas_cartao:
-                if despesa_cartao.categoria:
-                    cat_id = despesa_cartao.categoria_id
-                    despesas_por_categoria[cat_id]['nome'] = despesa_cartao.categoria.nome
-                    despesas_por_categoria[cat_id]['cor'] = despesa_cartao.categoria.cor or '#6c757d'
-                    despesas_por_categoria[cat_id]['icone'] = despesa_cartao.categoria.icone or 'category'
-                    despesas_por_categoria[cat_id]['total'] += float(despesa_cartao.valor)
-                    
-                    if despesa_cartao.subcategoria:
-                        despesas_por_categoria[cat_id]['subcategorias'][despesa_cartao.subcategoria.nome] += float(despesa_cartao.valor)
-                    else:
-                        despesas_por_categoria[cat_id]['subcategorias']['Sem subcategoria'] += float(despesa_cartao.valor)
-    
-    # Converter para lista e ordenar
-    for cat_id, dados in despesas_por_categoria.items():
-        subcategorias_lista = []
-        for sub_nome, sub_valor in dados['subcategorias'].items():
-            subcategorias_lista.append({
-                'nome': sub_nome,
-                'valor': sub_valor
-            })
-        subcategorias_lista.sort(key=lambda x: x['valor'], reverse=True)
-        
-        analise_categorias['despesas'].append({
-            'id': cat_id,
-            'nome': dados['nome'],
-            'cor': dados['cor'],
-            'icone': dados['icone'],
-            'total': dados['total'],
-            'subcategorias': subcategorias_lista
-        })
-    
-    analise_categorias['despesas'].sort(key=lambda x: x['total'], reverse=True)
-    analise_categorias['total_despesas'] = sum(cat['total'] for cat in analise_categorias['despesas'])
-    
-    # 2. ANÁLISE DE INVESTIMENTOS
-    # Buscar lançamentos de investimento
-    lancamentos_investimento = Lancamento.query.filter(
-        Lancamento.tipo == 'transferencia',
-        Lancamento.conta_destino_id.in_(ids_contas_investimento),
-        Lancamento.data_vencimento >= primeiro_dia,
-        Lancamento.data_vencimento <= ultimo_dia,
-        Lancamento.status != 'cancelado'
-    ).all()
-    
-    investimentos_por_conta = defaultdict(float)
-    for lanc in lancamentos_investimento:
-        if lanc.conta_destino:
-            investimentos_por_conta[lanc.conta_destino.nome] += float(lanc.valor)
-    
-    for conta_nome, valor in investimentos_por_conta.items():
-        analise_categorias['investimentos'].append({
-            'nome': conta_nome,
-            'valor': valor
-        })
-    
-    analise_categorias['investimentos'].sort(key=lambda x: x['valor'], reverse=True)
-    analise_categorias['total_investimentos'] = sum(inv['valor'] for inv in analise_categorias['investimentos'])
-    
-    # 3. ANÁLISE DE RECEITAS
-    receitas_por_categoria = defaultdict(lambda: {
-        'nome': '',
-        'total': 0,
-        'subcategorias': defaultdict(float),
-        'cor': '#28a745',
-        'icone': 'attach_money'
-    })
-    
-    for receita in receitas:
-        if receita.categoria:
-            cat_id = receita.categoria_id
-            receitas_por_categoria[cat_id]['nome'] = receita.categoria.nome
-            receitas_por_categoria[cat_id]['cor'] = receita.categoria.cor or '#28a745'
-            receitas_por_categoria[cat_id]['icone'] = receita.categoria.icone or 'attach_money'
-            receitas_por_categoria[cat_id]['total'] += float(receita.valor)
-            
-            if receita.subcategoria:
-                receitas_por_categoria[cat_id]['subcategorias'][receita.subcategoria.nome] += float(receita.valor)
-            else:
-                receitas_por_categoria[cat_id]['subcategorias']['Sem subcategoria'] += float(receita.valor)
-    
-    # Converter para lista e ordenar
-    for cat_id, dados in receitas_por_categoria.items():
-        subcategorias_lista = []
-        for sub_nome, sub_valor in dados['subcategorias'].items():
-            subcategorias_lista.append({
-                'nome': sub_nome,
-                'valor': sub_valor
-            })
-        subcategorias_lista.sort(key=lambda x: x['valor'], reverse=True)
-        
-        analise_categorias['receitas'].append({
-            'id': cat_id,
-            'nome': dados['nome'],
-            'cor': dados['cor'],
-            'icone': dados['icone'],
-            'total': dados['total'],
-            'subcategorias': subcategorias_lista
-        })
-    
-    analise_categorias['receitas'].sort(key=lambda x: x['total'], reverse=True)
-    analise_categorias['total_receitas'] = sum(cat['total'] for cat in analise_categorias['receitas'])
-    
-    # 4. CALCULAR ECONOMIA DO MÊS
-    analise_categorias['economia_mes'] = (
-        analise_categorias['total_receitas'] - 
-        analise_categorias['total_despesas'] - 
-        analise_categorias['total_investimentos']
-    )
+    # Todos os números do dashboard vêm de um número fixo de consultas agregadas
+    dados = montar_dashboard(ano, mes)
     
     # Criar lista de meses para o seletor
     meses = [
@@ -303,18 +42,7 @@ def home():
     ]
     
     return render_template('home.html',
-                         contas_corrente=contas_corrente,
-                         contas_investimento=contas_investimento,
-                         total_corrente=total_corrente,
-                         total_investimento=total_investimento,
-                         receitas=receitas,
-                         despesas=despesas,
-                         total_receitas=total_receitas,
-                         total_despesas=total_despesas,
-                         total_receitas_pendentes=total_receitas_pendentes,
-                         total_despesas_pendentes=total_despesas_pendentes,
-                         total_faturas_pendentes=total_faturas_pendentes,
-                         analise_categorias=analise_categorias,
+                         **dados,
                          mes_selecionado=mes,
                          ano_selecionado=ano,
                          meses=meses,
@@ -327,6 +55,9 @@ def extrato_cartao():
     ano = request.args.get('ano', type=int, default=date.today().year)
     cartao_id = request.args.get('cartao_id', type=int)
     
+    # Séries recorrentes: gravar as ocorrências do mês consultado
+    garantir_periodo(fim_da_janela(ano, mes))
+    
     # Buscar todos os cartões ativos
     cartoes = Cartao.query.filter_by(ativo=True).order_by(Cartao.nome).all()
     
@@ -344,38 +75,25 @@ def extrato_cartao():
         cartao_selecionado = Cartao.query.get(cartao_id)
         
         if cartao_selecionado:
-            # Calcular a data de vencimento do cartão no mês selecionado
-            try:
-                data_vencimento = date(ano, mes, cartao_selecionado.dia_vencimento)
-            except ValueError:
-                # Se o dia não existir no mês, usar o último dia
-                ultimo_dia = monthrange(ano, mes)[1]
-                data_vencimento = date(ano, mes, ultimo_dia)
-            
             # Buscar despesas do cartão para o mês selecionado
             despesas = Lancamento.query.filter(
                 Lancamento.tipo == 'cartao_credito',
                 Lancamento.cartao_id == cartao_id,
-                extract('year', Lancamento.mes_inicial_cartao) == ano,
-                extract('month', Lancamento.mes_inicial_cartao) == mes
+                filtro_intervalo(Lancamento.mes_inicial_cartao, *intervalo_mes(ano, mes))
             ).order_by(Lancamento.data_vencimento).all()
             
-            # Calcular total da fatura
-            total_fatura = sum(despesa.valor for despesa in despesas)
-            
-            # Verificar se a fatura foi paga
-            primeiro_dia = date(ano, mes, 1)
-            ultimo_dia = date(ano, mes, monthrange(ano, mes)[1])
-            
-            pagamento_fatura = Lancamento.query.filter(
-                Lancamento.tipo == 'despesa',
-                Lancamento.descricao.like(f'%Pagamento Fatura {cartao_selecionado.nome}%'),
-                Lancamento.data_vencimento >= primeiro_dia,
-                Lancamento.data_vencimento <= ultimo_dia
+            # Total, vencimento e status vêm da fatura do mês
+            fatura = Fatura.query.filter_by(
+                cartao_id=cartao_id,
+                competencia=date(ano, mes, 1)
             ).first()
             
-            if pagamento_fatura and pagamento_fatura.status == 'pago':
-                fatura_paga = True
+            if fatura:
+                total_fatura = fatura.valor_total
+                data_vencimento = fatura.data_vencimento
+                fatura_paga = fatura.status == 'pago'
+            else:
+                data_vencimento = calcular_vencimento(cartao_selecionado.dia_vencimento, ano, mes)
     
     # Criar lista de meses para o seletor
     meses = [
@@ -416,6 +134,8 @@ def download_extrato_cartao():
     if not cartao_id:
         return "Cartão não selecionado", 400
     
+    garantir_periodo(fim_da_janela(ano, mes))
+    
     # Buscar cartão
     cartao = Cartao.query.get(cartao_id)
     if not cartao:
@@ -425,8 +145,7 @@ def download_extrato_cartao():
     despesas = Lancamento.query.filter(
         Lancamento.tipo == 'cartao_credito',
         Lancamento.cartao_id == cartao_id,
-        extract('year', Lancamento.mes_inicial_cartao) == ano,
-        extract('month', Lancamento.mes_inicial_cartao) == mes
+        filtro_intervalo(Lancamento.mes_inicial_cartao, *intervalo_mes(ano, mes))
     ).order_by(Lancamento.data_vencimento).all()
     
     # Calcular total
@@ -499,11 +218,7 @@ def download_extrato_cartao():
     worksheet.write('B4', cartao.conta.nome)
     
     # Calcular data de vencimento
-    try:
-        data_vencimento_cartao = date(ano, mes, cartao.dia_vencimento)
-    except ValueError:
-        ultimo_dia = monthrange(ano, mes)[1]
-        data_vencimento_cartao = date(ano, mes, ultimo_dia)
+    data_vencimento_cartao = calcular_vencimento(cartao.dia_vencimento, ano, mes)
     
     worksheet.write('A5', 'Vencimento:', subtitle_format)
     worksheet.write_datetime('B5', data_vencimento_cartao, date_format)
@@ -564,11 +279,25 @@ def testar_alertas():
         sucesso = executar_alertas_agora(current_app)
         
         if sucesso:
-            flash('Alertas enviados com sucesso! Verifique seu email.', 'success')
+            flash('Alertas colocados na fila de envio! Verifique seu email em instantes.', 'success')
         else:
             flash('Nenhum alerta foi enviado. Verifique se há lançamentos vencendo amanhã ou se houve algum erro.', 'info')
             
     except Exception as e:
         flash(f'Erro ao enviar alertas: {str(e)}', 'error')
         
-    return redirect(url_for('main.home'))
\ No newline at end of file
+    return redirect(url_for('main.home'))
+
+@main_bp.route('/cubo/atualizar', methods=['POST'])
+def atualizar_cubo_relatorios():
+    """Reconstrói o cubo de relatórios imediatamente (sem esperar a tarefa agendada)"""
+    try:
+        total = reconstruir_cubo()
+        return jsonify({'success': True, 'linhas': total})
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao reconstruir cubo de relatórios: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erro ao reconstruir o cubo de relatórios'
+        }), 500
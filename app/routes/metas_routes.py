@@ -1,11 +1,12 @@
 # app/routes/metas_routes.py
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from app.models import db, Meta, MetaHistorico, Categoria, Lancamento
+from app.models import db, Meta, MetaHistorico, MetaContador, Categoria, Lancamento
+from app.services.recorrencia_service import garantir_periodo, fim_da_janela
+from app.services.periodo_service import ANO_INTEIRO, intervalo_meta, ultimo_dia
+from app.services.metas_service import progresso_metas, detalhes_meta, limpar_detalhes, historico_meta
 from datetime import date, datetime
-from dateutil.relativedelta import relativedelta
 from decimal import Decimal
-from sqlalchemy import func, extract, and_, or_
 
 # Criar o Blueprint
 metas_bp = Blueprint('metas', __name__, url_prefix='/metas')
@@ -22,6 +23,9 @@ def listar_metas():
     # Criar data de referência
     mes_referencia = date(ano, mes, 1)
     
+    # Séries recorrentes: gravar as ocorrências até o fim do ano (cobre metas mensais a anuais)
+    garantir_periodo(fim_da_janela(ano, ANO_INTEIRO))
+    
     # Buscar todas as metas ativas
     metas_ativas = Meta.query.filter_by(ativa=True).order_by(Meta.nome).all()
     
@@ -35,17 +39,15 @@ def listar_metas():
     ).distinct().order_by(Lancamento.tag)
     tags_disponiveis = [tag[0] for tag in tags_query.all()]
     
-    # Calcular progresso de cada meta para o mês selecionado
-    metas_com_progresso = []
+    # Metas que já estavam ativas no período selecionado
+    metas_periodo = [meta for meta in metas_ativas if meta.data_inicio <= mes_referencia]
     
-    for meta in metas_ativas:
-        # Verificar se a meta já estava ativa no período selecionado
-        if meta.data_inicio <= mes_referencia:
-            progresso = calcular_progresso_meta(meta, mes_referencia)
-            metas_com_progresso.append({
-                'meta': meta,
-                'progresso': progresso
-            })
+    # Progresso de todas as metas do mês (períodos fechados vêm do histórico)
+    progressos = progresso_metas(metas_periodo, mes_referencia)
+    metas_com_progresso = [
+        {'meta': meta, 'progresso': progressos[meta.id]}
+        for meta in metas_periodo
+    ]
     
     # Estatísticas gerais para o mês selecionado
     total_metas = len(metas_com_progresso)
@@ -214,6 +216,10 @@ def editar_meta(id):
         meta.renovar_automaticamente = request.form.get('renovar_automaticamente') == 'on'
         meta.incluir_cartao = request.form.get('incluir_cartao') == 'on'
         
+        # Limites e tipos incluídos mudam os contadores, os níveis de alerta e os detalhes
+        meta.contadores_ok = False
+        limpar_detalhes(meta.id)
+        
         db.session.commit()
         flash('Meta atualizada com sucesso!', 'success')
         
@@ -249,8 +255,10 @@ def excluir_meta(id):
     try:
         meta = Meta.query.get_or_404(id)
         
-        # Excluir históricos relacionados
+        # Excluir históricos e contadores relacionados
         MetaHistorico.query.filter_by(meta_id=id).delete()
+        MetaContador.query.filter_by(meta_id=id).delete()
+        limpar_detalhes(id)
         
         # Excluir meta
         db.session.delete(meta)
@@ -276,103 +284,20 @@ def obter_detalhes_meta(id):
         ano = request.args.get('ano', type=int, default=date.today().year)
         mes_referencia = date(ano, mes, 1)
         
-        # Calcular progresso para obter as datas
-        progresso = calcular_progresso_meta(meta, mes_referencia)
-        data_inicio = progresso['data_inicio']
-        data_fim = progresso['data_fim']
+        # Séries recorrentes: gravar as ocorrências até o fim do período da meta
+        garantir_periodo(ultimo_dia(intervalo_meta(meta.periodo, mes_referencia)[1]))
         
-        # Determinar se é período futuro
-        periodo_futuro = mes_referencia > date.today().replace(day=1)
-        
-        # Buscar despesas baseado no tipo de meta
-        if periodo_futuro:
-            query_base = Lancamento.query.filter(
-                Lancamento.tipo.in_(['despesa', 'cartao_credito'])
-            )
-        else:
-            query_base = Lancamento.query.filter(
-                Lancamento.tipo.in_(['despesa', 'cartao_credito']),
-                Lancamento.status == 'pago'
-            )
-        
-        # Filtrar por tipo de meta
-        if meta.tipo == 'categoria':
-            query_base = query_base.filter(Lancamento.categoria_id == meta.categoria_id)
-        elif meta.tipo == 'tag':
-            query_base = query_base.filter(Lancamento.tag == meta.tag)
-        
-        # Incluir ou não despesas de cartão
-        if not meta.incluir_cartao:
-            query_base = query_base.filter(Lancamento.tipo != 'cartao_credito')
-        
-        # Buscar despesas normais
-        if periodo_futuro:
-            despesas_normais = query_base.filter(
-                Lancamento.tipo == 'despesa',
-                Lancamento.data_vencimento >= data_inicio,
-                Lancamento.data_vencimento <= data_fim
-            ).order_by(Lancamento.data_vencimento.desc()).all()
-        else:
-            despesas_normais = query_base.filter(
-                Lancamento.tipo == 'despesa',
-                Lancamento.data_pagamento >= data_inicio,
-                Lancamento.data_pagamento <= data_fim
-            ).order_by(Lancamento.data_pagamento.desc()).all()
-        
-        # Buscar despesas de cartão
-        if meta.periodo == 'mensal':
-            despesas_cartao = query_base.filter(
-                Lancamento.tipo == 'cartao_credito',
-                extract('year', Lancamento.mes_inicial_cartao) == data_inicio.year,
-                extract('month', Lancamento.mes_inicial_cartao) == data_inicio.month
-            ).order_by(Lancamento.data_vencimento.desc()).all()
-        else:
-            despesas_cartao = query_base.filter(
-                Lancamento.tipo == 'cartao_credito',
-                Lancamento.mes_inicial_cartao >= data_inicio,
-                Lancamento.mes_inicial_cartao <= data_fim
-            ).order_by(Lancamento.mes_inicial_cartao.desc()).all()
-        
-        # Combinar todas as despesas
-        todas_despesas = despesas_normais + despesas_cartao
-        
-        # Preparar dados para retornar
-        despesas_json = []
-        resumo_categorias = {}
-        
-        for despesa in todas_despesas:
-            # Adicionar ao resumo por categoria
-            cat_nome = despesa.categoria.nome if despesa.categoria else 'Sem categoria'
-            if cat_nome not in resumo_categorias:
-                resumo_categorias[cat_nome] = 0
-            resumo_categorias[cat_nome] += float(despesa.valor)
-            
-            # Preparar dados da despesa
-            despesas_json.append({
-                'id': despesa.id,
-                'descricao': despesa.descricao,
-                'valor': float(despesa.valor),
-                'data': despesa.data_vencimento.strftime('%d/%m/%Y'),
-                'tipo': despesa.tipo,
-                'categoria': cat_nome,
-                'cartao': despesa.cartao.nome if despesa.cartao else None,
-                'status': despesa.status
-            })
-        
-        # Ordenar despesas por valor (maior primeiro)
-        despesas_json.sort(key=lambda x: x['valor'], reverse=True)
-        
-        # Preparar resumo
-        resumo_json = [
-            {'categoria': cat, 'total': total} 
-            for cat, total in sorted(resumo_categorias.items(), key=lambda x: x[1], reverse=True)
-        ]
+        # Despesas, resumo por categoria e progresso (uma consulta, em cache por período)
+        detalhes = detalhes_meta(meta, mes_referencia)
+        progresso = detalhes['progresso']
         
         return jsonify({
             'success': True,
-            'despesas': despesas_json,
-            'resumo': resumo_json,
-            'total': sum(d['valor'] for d in despesas_json)
+            'despesas': detalhes['despesas'],
+            'resumo': detalhes['resumo'],
+            'total': detalhes['total'],
+            'percentual': progresso['percentual'],
+            'status': progresso['status']
         })
         
     except Exception as e:
@@ -382,111 +307,24 @@ def obter_detalhes_meta(id):
             'error': 'Erro ao carregar detalhes'
         }), 500
 
-# Funções auxiliares
-def calcular_progresso_meta(meta, mes_referencia):
-    """Calcular o progresso de uma meta para um determinado mês"""
-    # Calcular período baseado no tipo
-    if meta.periodo == 'mensal':
-        data_inicio = mes_referencia
-        data_fim = mes_referencia + relativedelta(months=1) - relativedelta(days=1)
-    elif meta.periodo == 'trimestral':
-        # Descobrir qual trimestre
-        trimestre = ((mes_referencia.month - 1) // 3) * 3 + 1
-        data_inicio = date(mes_referencia.year, trimestre, 1)
-        data_fim = data_inicio + relativedelta(months=3) - relativedelta(days=1)
-    elif meta.periodo == 'anual':
-        data_inicio = date(mes_referencia.year, 1, 1)
-        data_fim = date(mes_referencia.year, 12, 31)
-    else:
-        data_inicio = mes_referencia
-        data_fim = mes_referencia + relativedelta(months=1) - relativedelta(days=1)
-    
-    # Determinar se estamos visualizando período futuro
-    periodo_futuro = mes_referencia > date.today().replace(day=1)
-    
-    # Construir query base para cálculo do gasto
-    if periodo_futuro:
-        # Para períodos futuros, considerar todos os lançamentos (pagos e pendentes)
-        query_base = Lancamento.query.filter(
-            Lancamento.tipo.in_(['despesa', 'cartao_credito'])
-        )
-    else:
-        # Para períodos passados e atual, considerar apenas pagos
-        query_base = Lancamento.query.filter(
-            Lancamento.tipo.in_(['despesa', 'cartao_credito']),
-            Lancamento.status == 'pago'
-        )
-    
-    # Filtrar por tipo de meta
-    if meta.tipo == 'categoria':
-        query_base = query_base.filter(Lancamento.categoria_id == meta.categoria_id)
-    elif meta.tipo == 'tag':
-        query_base = query_base.filter(Lancamento.tag == meta.tag)
-    # Se for global, não precisa filtrar mais nada
-    
-    # Incluir ou não despesas de cartão
-    if not meta.incluir_cartao:
-        query_base = query_base.filter(Lancamento.tipo != 'cartao_credito')
-    
-    # Para despesas normais
-    if periodo_futuro:
-        # Para futuro, usar data_vencimento
-        despesas_normais = query_base.filter(
-            Lancamento.tipo == 'despesa',
-            Lancamento.data_vencimento >= data_inicio,
-            Lancamento.data_vencimento <= data_fim
-        )
-    else:
-        # Para passado/atual, usar data_pagamento
-        despesas_normais = query_base.filter(
-            Lancamento.tipo == 'despesa',
-            Lancamento.data_pagamento >= data_inicio,
-            Lancamento.data_pagamento <= data_fim
-        )
-    
-    # Para despesas de cartão, sempre usar mes_inicial_cartao
-    # independente se é futuro ou passado
-    if meta.periodo == 'mensal':
-        # Para metas mensais, filtrar pelo mês específico
-        despesas_cartao = query_base.filter(
-            Lancamento.tipo == 'cartao_credito',
-            extract('year', Lancamento.mes_inicial_cartao) == data_inicio.year,
-            extract('month', Lancamento.mes_inicial_cartao) == data_inicio.month
-        )
-    else:
-        # Para metas trimestrais/anuais, usar range de datas
-        despesas_cartao = query_base.filter(
-            Lancamento.tipo == 'cartao_credito',
-            Lancamento.mes_inicial_cartao >= data_inicio,
-            Lancamento.mes_inicial_cartao <= data_fim
-        )
-    
-    # Calcular total gasto
-    total_normal = despesas_normais.with_entities(func.sum(Lancamento.valor)).scalar() or 0
-    total_cartao = despesas_cartao.with_entities(func.sum(Lancamento.valor)).scalar() or 0
-    total_gasto = total_normal + total_cartao
-    
-    # Calcular percentual
-    percentual = (total_gasto / meta.valor_limite * 100) if meta.valor_limite > 0 else 0
-    
-    # Definir status
-    if percentual <= meta.alertar_percentual:
-        status = 'ok'
-        cor = 'success'
-    elif percentual <= 100:
-        status = 'alerta'
-        cor = 'warning'
-    else:
-        status = 'excedido'
-        cor = 'danger'
-    
-    return {
-        'valor_gasto': total_gasto,
-        'valor_limite': meta.valor_limite,
-        'percentual': float(percentual),
-        'status': status,
-        'cor': cor,
-        'data_inicio': data_inicio,
-        'data_fim': data_fim,
-        'periodo_futuro': periodo_futuro
-    }
\ No newline at end of file
+@metas_bp.route('/<int:id>/historico')
+def obter_historico_meta(id):
+    """Gasto x limite de cada período da meta nos últimos meses (JSON)"""
+    try:
+        meta = Meta.query.get_or_404(id)
+        
+        # Janela em meses (padrão 12, no máximo 10 anos)
+        meses = min(max(request.args.get('meses', type=int, default=12), 1), 120)
+        
+        return jsonify({
+            'success': True,
+            'meta': {'id': meta.id, 'nome': meta.nome, 'periodo': meta.periodo},
+            'historico': historico_meta(meta, meses)
+        })
+        
+    except Exception as e:
+        print(f"Erro ao obter histórico da meta: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erro ao carregar histórico'
+        }), 500
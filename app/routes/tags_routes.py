@@ -1,10 +1,12 @@
 # app/routes/tags_routes.py
 
 from flask import Blueprint, render_template, request
-from app.models import db, Lancamento, Categoria
+from app.models import db, Lancamento, Categoria, CuboLancamentos
+from app.services.recorrencia_service import garantir_periodo, fim_da_janela
+from app.services.periodo_service import intervalo_selecao, filtro_intervalo
+from app.services.cubo_service import filtro_selecao
 from datetime import datetime, date
-from calendar import monthrange
-from sqlalchemy import func, extract, and_, or_
+from sqlalchemy import func, and_, or_
 
 # Criar o Blueprint
 tags_bp = Blueprint('tags', __name__, url_prefix='/tags')
@@ -18,6 +20,9 @@ def visao_geral_tags():
     mes = request.args.get('mes', type=int, default=0)  # 0 = todo período
     ano = request.args.get('ano', type=int, default=date.today().year)
     
+    # Séries recorrentes: gravar as ocorrências do período consultado
+    garantir_periodo(fim_da_janela(ano, mes))
+    
     # Buscar todas as tags únicas do sistema
     tags_query = db.session.query(Lancamento.tag).filter(
         Lancamento.tag.isnot(None),
@@ -35,26 +40,16 @@ def visao_geral_tags():
     # Se uma tag foi selecionada, buscar lançamentos
     if tag_selecionada:
         # Construir query base
+        # Cancelados ficam de fora, como nos totais do cubo
         query_base = Lancamento.query.filter(
-            Lancamento.tag == tag_selecionada
+            Lancamento.tag == tag_selecionada,
+            Lancamento.status != 'cancelado'
         )
         
-        # Aplicar filtros de data
-        if mes > 0:  # Mês específico
-            primeiro_dia = date(ano, mes, 1)
-            ultimo_dia = date(ano, mes, monthrange(ano, mes)[1])
-            query_base = query_base.filter(
-                Lancamento.data_vencimento >= primeiro_dia,
-                Lancamento.data_vencimento <= ultimo_dia
-            )
-        elif mes == -1:  # Ano inteiro
-            primeiro_dia = date(ano, 1, 1)
-            ultimo_dia = date(ano, 12, 31)
-            query_base = query_base.filter(
-                Lancamento.data_vencimento >= primeiro_dia,
-                Lancamento.data_vencimento <= ultimo_dia
-            )
-        # Se mes == 0, não aplica filtro de data (todo período)
+        # Aplicar filtro de data (mês, ano inteiro ou, com mes == 0, todo o período)
+        query_base = query_base.filter(
+            filtro_intervalo(Lancamento.mes_competencia, *intervalo_selecao(ano, mes))
+        )
         
         # Buscar receitas (apenas tipo = 'receita')
         receitas = query_base.filter(
@@ -69,9 +64,13 @@ def visao_geral_tags():
             )
         ).order_by(Lancamento.data_vencimento.desc()).all()
         
-        # Calcular totais
-        total_receitas = sum(lancamento.valor for lancamento in receitas)
-        total_despesas = sum(lancamento.valor for lancamento in despesas)
+        # Totais lidos do cubo de relatórios (nível tag/tipo no período)
+        totais = dict(db.session.query(
+            CuboLancamentos.tipo,
+            CuboLancamentos.valor_total
+        ).filter(filtro_selecao(ano, mes, 'tag', 'tipo', tag=tag_selecionada)).all())
+        total_receitas = totais.get('receita', 0)
+        total_despesas = totais.get('despesa', 0) + totais.get('cartao_credito', 0)
     
     # Criar lista de meses para o seletor
     meses = [
@@ -0,0 +1,178 @@
+# app/services/cubo_service.py
+# Cubo de relatórios: somas dos lançamentos em vários níveis de agrupamento (GROUPING SETS),
+# mantido com deltas a cada alteração de lançamento e lido com uma consulta por nível
+
+from datetime import datetime
+from sqlalchemy import select, insert, update, delete, func, text, extract, cast, Integer, tuple_, null, literal, union_all, and_
+from app.models import db, Lancamento, CuboLancamentos, CuboEstado
+from app.services.eventos_lancamento import registrar_tratador, mes_competencia, somar_deltas
+from app.services.periodo_service import TODO_PERIODO, ANO_INTEIRO
+import logging
+
+logger = logging.getLogger(__name__)
+
+tabela = CuboLancamentos.__table__
+estado = CuboEstado.__table__
+indice_chave = next(indice for indice in tabela.indexes if indice.name == 'ux_cubo_lancamentos_chave')
+
+# Dimensões do cubo, na ordem usada para calcular o nível
+DIMENSOES = ('ano', 'mes', 'categoria_id', 'subcategoria_id', 'tag', 'tipo', 'conta_id', 'cartao_id')
+
+# Dashboard: categoria e subcategoria por conta e cartão no mês
+DETALHE_MENSAL = ('ano', 'mes', 'categoria_id', 'subcategoria_id', 'tipo', 'conta_id', 'cartao_id')
+
+# Períodos do seletor: mês, ano inteiro e todo o período
+PERIODOS = (('ano', 'mes'), ('ano',), ())
+
+# Níveis gravados (visões por categoria, subcategoria e tag em cada período)
+AGRUPAMENTOS = (DETALHE_MENSAL,) + tuple(
+    periodo + grupo + ('tipo',)
+    for periodo in PERIODOS
+    for grupo in (('categoria_id', 'subcategoria_id'), ('categoria_id',), ('tag',))
+)
+
+
+def nivel(dimensoes):
+    """Máscara das dimensões agregadas, no mesmo formato de GROUPING(ano, mes, ...)"""
+    return sum(
+        1 << (len(DIMENSOES) - 1 - i)
+        for i, dimensao in enumerate(DIMENSOES)
+        if dimensao not in dimensoes
+    )
+
+
+NIVEIS = {nivel(agrupamento): agrupamento for agrupamento in AGRUPAMENTOS}
+
+
+def _colunas():
+    """Expressão de cada dimensão sobre a tabela de lançamentos"""
+    return {
+        'ano': cast(extract('year', Lancamento.mes_competencia), Integer),
+        'mes': cast(extract('month', Lancamento.mes_competencia), Integer),
+        'categoria_id': Lancamento.categoria_id,
+        'subcategoria_id': Lancamento.subcategoria_id,
+        'tag': Lancamento.tag,
+        'tipo': Lancamento.tipo,
+        'conta_id': Lancamento.conta_id,
+        'cartao_id': Lancamento.cartao_id,
+    }
+
+
+def _consulta_cubo():
+    """SELECT com todos os níveis do cubo (lançamentos cancelados ficam de fora)"""
+    colunas = _colunas()
+    somas = (
+        func.sum(Lancamento.valor).label('valor_total'),
+        func.count(Lancamento.id).label('quantidade'),
+    )
+    validos = Lancamento.status != 'cancelado'
+
+    if db.engine.dialect.name == 'postgresql':
+        # Uma única leitura da tabela; GROUPING() informa quais dimensões foram agregadas
+        return select(
+            func.grouping(*colunas.values()).label('nivel'),
+            *[coluna.label(nome) for nome, coluna in colunas.items()],
+            *somas
+        ).where(validos).group_by(func.grouping_sets(*[
+            tuple_(*[colunas[d] for d in agrupamento]) for agrupamento in AGRUPAMENTOS
+        ]))
+
+    # Demais bancos: um GROUP BY por nível, unidos com UNION ALL
+    return union_all(*[
+        select(
+            literal(nivel(agrupamento)).label('nivel'),
+            *[(coluna if nome in agrupamento else null()).label(nome) for nome, coluna in colunas.items()],
+            *somas
+        ).where(validos).group_by(*[colunas[d] for d in agrupamento])
+        for agrupamento in AGRUPAMENTOS
+    ])
+
+
+@registrar_tratador
+def atualizar_cubo_deltas(conexao, linhas, sinal):
+    """Aplica em todos os níveis do cubo as somas das linhas que entraram ou saíram"""
+    deltas = {}
+    for linha in linhas:
+        if linha['status'] == 'cancelado':
+            continue
+        competencia = mes_competencia(linha)
+        valores = dict(
+            {dimensao: linha.get(dimensao) for dimensao in DIMENSOES},
+            ano=competencia.year if competencia else None,
+            mes=competencia.month if competencia else None
+        )
+        for agrupamento in AGRUPAMENTOS:
+            chave = (nivel(agrupamento),) + tuple(
+                valores[dimensao] if dimensao in agrupamento else None for dimensao in DIMENSOES
+            )
+            valor, quantidade = deltas.get(chave, (0, 0))
+            deltas[chave] = (valor + linha['valor'], quantidade + linha['quantidade'])
+
+    somar_deltas(conexao, tabela, indice_chave, ('nivel',) + DIMENSOES, deltas, sinal)
+
+
+def reconstruir_cubo():
+    """
+    Apaga e recalcula o cubo inteiro em uma única instrução INSERT ... SELECT.
+    Usado na carga inicial e para reparo (tarefa agendada, POST /cubo/atualizar e CLI);
+    as leituras nunca reconstroem.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        # Quem grava lançamentos espera a reconstrução terminar e aplica seus deltas depois,
+        # já sobre o cubo novo (sem perder nem contar duas vezes)
+        db.session.execute(text('LOCK TABLE cubo_lancamentos IN EXCLUSIVE MODE'))
+
+    agora = datetime.now()
+    if db.session.execute(update(estado).values(desatualizado=False, atualizado_em=agora)).rowcount == 0:
+        db.session.execute(insert(estado).values(id=1, desatualizado=False, atualizado_em=agora))
+
+    db.session.execute(delete(tabela))
+    db.session.execute(
+        insert(tabela).from_select(
+            ['nivel'] + list(DIMENSOES) + ['valor_total', 'quantidade'],
+            _consulta_cubo()
+        )
+    )
+    db.session.commit()
+
+    total = db.session.query(func.count(CuboLancamentos.id)).scalar()
+    logger.info(f"Cubo de relatórios reconstruído: {total} linhas")
+    return total
+
+
+def atualizar_cubo(app):
+    """Tarefa agendada: monta o cubo se ele ainda não foi carregado (ou foi marcado para reconstruir)"""
+    with app.app_context():
+        try:
+            desatualizado = db.session.execute(select(estado.c.desatualizado)).scalar()
+            if desatualizado is False:
+                return 0
+            return reconstruir_cubo()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao reconstruir o cubo de relatórios: {str(e)}")
+            return 0
+
+
+def filtro_cubo(dimensoes, **valores):
+    """Seleciona as linhas do nível agrupado exatamente pelas dimensões, com os valores informados"""
+    codigo = nivel(dimensoes)
+    if codigo not in NIVEIS:
+        raise ValueError(f"Nível não gravado no cubo: {dimensoes}")
+
+    condicoes = [CuboLancamentos.nivel == codigo]
+    for nome, valor in valores.items():
+        coluna = getattr(CuboLancamentos, nome)
+        condicoes.append(coluna.is_(None) if valor is None else coluna == valor)
+    return and_(*condicoes)
+
+
+def filtro_selecao(ano, mes, *dimensoes, **valores):
+    """filtro_cubo no período do seletor: mês, ano inteiro (-1) ou todo o período (0)"""
+    if mes == TODO_PERIODO:
+        periodo, chave = (), {}
+    elif mes == ANO_INTEIRO:
+        periodo, chave = ('ano',), {'ano': ano}
+    else:
+        periodo, chave = ('ano', 'mes'), {'ano': ano, 'mes': mes}
+    return filtro_cubo(periodo + dimensoes, **chave, **valores)
@@ -0,0 +1,198 @@
+# app/services/dashboard_service.py
+
+from app.models import db, Conta, Lancamento, Cartao, Fatura, Categoria, Subcategoria, ResumoMensal, CuboLancamentos
+from app.services.resumo_service import filtro_periodo
+from app.services.recorrencia_service import garantir_periodo
+from app.services.periodo_service import intervalo_mes, ultimo_dia
+from app.services.cubo_service import filtro_cubo, DETALHE_MENSAL
+from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import joinedload
+
+def montar_dashboard(ano, mes):
+    """
+    Reúne todos os dados do dashboard de um mês com um número fixo de consultas,
+    independente da quantidade de cartões ou lançamentos.
+    """
+    primeiro_dia, proximo_mes = intervalo_mes(ano, mes)
+
+    # Séries recorrentes: gravar as ocorrências que caem no mês consultado
+    garantir_periodo(ultimo_dia(proximo_mes))
+
+    # 1. Contas (uma consulta só, separadas em memória)
+    contas = Conta.query.all()
+    contas_corrente = [c for c in contas if c.tipo_conta == 'Corrente']
+    contas_investimento = [c for c in contas if c.tipo_conta == 'Investimento']
+    ids_contas_corrente = [c.id for c in contas_corrente]
+    ids_contas_investimento = [c.id for c in contas_investimento]
+
+    total_corrente = sum((c.saldo_atual for c in contas_corrente), 0)
+    total_investimento = sum((c.saldo_atual for c in contas_investimento), 0)
+
+    # 2. Listas exibidas nas tabelas (categoria carregada junto para evitar N+1 no template)
+    filtro_mes = and_(
+        Lancamento.conta_id.in_(ids_contas_corrente),
+        Lancamento.data_vencimento >= primeiro_dia,
+        Lancamento.data_vencimento < proximo_mes
+    )
+    receitas = Lancamento.query.options(joinedload(Lancamento.categoria)).filter(
+        Lancamento.tipo == 'receita',
+        filtro_mes
+    ).order_by(Lancamento.data_vencimento).all()
+
+    despesas_normais = Lancamento.query.options(joinedload(Lancamento.categoria)).filter(
+        Lancamento.tipo == 'despesa',
+        filtro_mes
+    ).order_by(Lancamento.data_vencimento).all()
+
+    # 3. Totais de receitas e despesas lidos do resumo mensal pré-agregado
+    filtro_resumo = and_(
+        filtro_periodo(ano, mes),
+        ResumoMensal.conta_id.in_(ids_contas_corrente)
+    )
+    totais = db.session.query(
+        ResumoMensal.tipo,
+        ResumoMensal.status,
+        func.sum(ResumoMensal.valor_total)
+    ).filter(
+        ResumoMensal.tipo.in_(['receita', 'despesa']),
+        filtro_resumo
+    ).group_by(ResumoMensal.tipo, ResumoMensal.status).all()
+
+    total_receitas = sum((t[2] for t in totais if t[0] == 'receita'), 0)
+    total_despesas = sum((t[2] for t in totais if t[0] == 'despesa'), 0)
+    total_receitas_pendentes = sum((t[2] for t in totais if t[0] == 'receita' and t[1] == 'pendente'), 0)
+    total_despesas_pendentes = sum((t[2] for t in totais if t[0] == 'despesa' and t[1] == 'pendente'), 0)
+
+    # 4. Faturas do mês lidas da tabela de faturas (uma consulta pela chave cartao/competência)
+    cartoes = Cartao.query.filter_by(ativo=True).all()
+    ids_cartoes = [c.id for c in cartoes]
+
+    faturas_cartao = Fatura.query.options(
+        joinedload(Fatura.cartao).joinedload(Cartao.conta),
+        joinedload(Fatura.pagamento)
+    ).filter(
+        Fatura.cartao_id.in_(ids_cartoes),
+        Fatura.competencia == primeiro_dia,
+        Fatura.quantidade > 0
+    ).order_by(Fatura.cartao_id).all()
+
+    despesas = despesas_normais + faturas_cartao
+    despesas.sort(key=lambda x: x.data_vencimento)
+
+    total_despesas += sum((f.valor for f in faturas_cartao), 0)
+    total_faturas_pendentes = sum((f.valor for f in faturas_cartao if f.status == 'pendente'), 0)
+
+    # 5. Análise por categorias lida do cubo de relatórios (nível mensal por conta e cartão):
+    # despesas normais e de cartão juntas pelo mês de competência (mês da fatura no cartão)
+    filtro_cubo_mes = filtro_cubo(DETALHE_MENSAL, ano=ano, mes=mes)
+    linhas_despesas = _agrupar_por_categoria(CuboLancamentos, CuboLancamentos.valor_total, and_(
+        filtro_cubo_mes,
+        or_(
+            and_(CuboLancamentos.tipo == 'despesa', CuboLancamentos.conta_id.in_(ids_contas_corrente)),
+            and_(CuboLancamentos.tipo == 'cartao_credito', CuboLancamentos.cartao_id.in_(ids_cartoes))
+        )
+    ))
+
+    # 6. Receitas por categoria
+    linhas_receitas = _agrupar_por_categoria(CuboLancamentos, CuboLancamentos.valor_total, and_(
+        filtro_cubo_mes,
+        CuboLancamentos.tipo == 'receita',
+        CuboLancamentos.conta_id.in_(ids_contas_corrente)
+    ))
+
+    # 7. Transferências para contas de investimento, agrupadas por conta destino
+    linhas_investimentos = db.session.query(
+        Conta.nome,
+        func.sum(Lancamento.valor)
+    ).join(Conta, Conta.id == Lancamento.conta_destino_id).filter(
+        Lancamento.tipo == 'transferencia',
+        Lancamento.conta_destino_id.in_(ids_contas_investimento),
+        Lancamento.data_vencimento >= primeiro_dia,
+        Lancamento.data_vencimento < proximo_mes,
+        Lancamento.status != 'cancelado'
+    ).group_by(Conta.nome).all()
+
+    analise_categorias = {
+        'despesas': _montar_categorias(linhas_despesas, '#6c757d', 'category'),
+        'investimentos': sorted(
+            [{'nome': nome, 'valor': float(valor)} for nome, valor in linhas_investimentos],
+            key=lambda x: x['valor'],
+            reverse=True
+        ),
+        'receitas': _montar_categorias(linhas_receitas, '#28a745', 'attach_money')
+    }
+    analise_categorias['total_despesas'] = sum(cat['total'] for cat in analise_categorias['despesas'])
+    analise_categorias['total_investimentos'] = sum(inv['valor'] for inv in analise_categorias['investimentos'])
+    analise_categorias['total_receitas'] = sum(cat['total'] for cat in analise_categorias['receitas'])
+    analise_categorias['economia_mes'] = (
+        analise_categorias['total_receitas'] -
+        analise_categorias['total_despesas'] -
+        analise_categorias['total_investimentos']
+    )
+
+    return {
+        'contas_corrente': contas_corrente,
+        'contas_investimento': contas_investimento,
+        'total_corrente': total_corrente,
+        'total_investimento': total_investimento,
+        'receitas': receitas,
+        'despesas': despesas,
+        'total_receitas': total_receitas,
+        'total_despesas': total_despesas,
+        'total_receitas_pendentes': total_receitas_pendentes,
+        'total_despesas_pendentes': total_despesas_pendentes,
+        'total_faturas_pendentes': total_faturas_pendentes,
+        'analise_categorias': analise_categorias
+    }
+
+
+def _agrupar_por_categoria(modelo, coluna_valor, criterio):
+    """Soma os valores (de lançamentos, do resumo ou do cubo) por categoria e subcategoria"""
+    return db.session.query(
+        Categoria.id,
+        Categoria.nome,
+        Categoria.cor,
+        Categoria.icone,
+        Subcategoria.nome,
+        func.sum(coluna_valor)
+    ).select_from(modelo).join(
+        Categoria, Categoria.id == modelo.categoria_id
+    ).outerjoin(
+        Subcategoria, Subcategoria.id == modelo.subcategoria_id
+    ).filter(criterio).group_by(
+        Categoria.id, Categoria.nome, Categoria.cor, Categoria.icone, Subcategoria.nome
+    ).all()
+
+
+def _montar_categorias(linhas, cor_padrao, icone_padrao):
+    """Converte as linhas agrupadas na estrutura de categorias usada pelo template"""
+    categorias = {}
+
+    for cat_id, nome, cor, icone, sub_nome, valor in linhas:
+        if cat_id not in categorias:
+            categorias[cat_id] = {
+                'id': cat_id,
+                'nome': nome,
+                'cor': cor or cor_padrao,
+                'icone': icone or icone_padrao,
+                'total': 0,
+                'subcategorias': {}
+            }
+        # Soma em Decimal e converte para float apenas no final
+        sub_nome = sub_nome or 'Sem subcategoria'
+        categorias[cat_id]['total'] += valor
+        categorias[cat_id]['subcategorias'][sub_nome] = categorias[cat_id]['subcategorias'].get(sub_nome, 0) + valor
+
+    resultado = []
+    for dados in categorias.values():
+        subcategorias_lista = [
+            {'nome': sub_nome, 'valor': float(sub_valor)}
+            for sub_nome, sub_valor in dados['subcategorias'].items()
+        ]
+        subcategorias_lista.sort(key=lambda x: x['valor'], reverse=True)
+        dados['subcategorias'] = subcategorias_lista
+        dados['total'] = float(dados['total'])
+        resultado.append(dados)
+
+    resultado.sort(key=lambda x: x['total'], reverse=True)
+    return resultado
@@ -1,8 +1,7 @@
 # app/services/email_service.py
 
-from flask_mail import Message
-from app import mail
-from app.models import Lancamento, db
+from app.models import Lancamento, Meta, MetaContador, db
+from app.services.outbox_service import enfileirar_email
 from datetime import date, timedelta
 from sqlalchemy import and_
 import logging
@@ -12,19 +11,16 @@ logger = logging.getLogger(__name__)
 
 def enviar_email_alerta(assunto, corpo, destinatario):
     """
-    Envia um email de alerta
+    Coloca um email de alerta na fila de envio (email_outbox)
     """
     try:
-        msg = Message(
-            subject=assunto,
-            recipients=[destinatario],
-            body=corpo
-        )
-        mail.send(msg)
-        logger.info(f"Email enviado com sucesso para {destinatario}")
+        enfileirar_email(assunto, corpo, destinatario)
+        db.session.commit()
+        logger.info(f"Email para {destinatario} colocado na fila de envio")
         return True
     except Exception as e:
-        logger.error(f"Erro ao enviar email: {str(e)}")
+        db.session.rollback()
+        logger.error(f"Erro ao enfileirar email: {str(e)}")
         return False
 
 def verificar_vencimentos(dias_antecedencia=1):
@@ -87,6 +83,56 @@ def formatar_corpo_email(lancamentos):
     
     return corpo
 
+def verificar_alertas_metas():
+    """
+    Contadores de metas que atingiram o percentual de alerta ou o limite e ainda não foram avisados
+    """
+    return MetaContador.query.join(Meta).filter(
+        MetaContador.alerta_pendente == True,
+        Meta.ativa == True
+    ).order_by(MetaContador.nivel_alerta.desc(), Meta.nome).all()
+
+def formatar_alertas_metas(contadores):
+    """
+    Formata o corpo do email com as metas que atingiram o alerta
+    """
+    corpo = f"Olá!\n\n"
+    corpo += f"{len(contadores)} meta(s) atingiram o limite de alerta:\n\n"
+    
+    for contador in contadores:
+        meta = contador.meta
+        situacao = 'LIMITE EXCEDIDO' if contador.nivel_alerta == 2 else f'acima de {meta.alertar_percentual}%'
+        corpo += f"- {meta.nome} ({situacao}): R$ {contador.valor_pago:,.2f} de R$ {meta.valor_limite:,.2f}".replace('.', 'X').replace(',', '.').replace('X', ',')
+        corpo += f" - período a partir de {contador.inicio.strftime('%d/%m/%Y')}\n"
+    
+    corpo += "\nAtenciosamente,\n"
+    corpo += "Sistema de Finanças"
+    
+    return corpo
+
+def enviar_alertas_metas(destinatario):
+    """
+    Coloca na fila os avisos de metas pendentes e marca os contadores como avisados
+    """
+    contadores = verificar_alertas_metas()
+    if not contadores:
+        return True
+    
+    assunto = f"[Finanças] {len(contadores)} meta(s) atingiram o limite de alerta"
+    
+    # O email e a marcação dos contadores entram na mesma transação
+    try:
+        enfileirar_email(assunto, formatar_alertas_metas(contadores), destinatario)
+        for contador in contadores:
+            contador.alerta_pendente = False
+        db.session.commit()
+        logger.info(f"Alerta de metas na fila de envio: {len(contadores)} metas")
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erro ao enfileirar alerta de metas: {str(e)}")
+        return False
+
 def enviar_alertas_diarios(app):
     """
     Função principal que verifica e envia os alertas
@@ -101,6 +147,9 @@ def enviar_alertas_diarios(app):
                 logger.error("ALERT_RECIPIENT não configurado")
                 return False
             
+            # Avisos das metas que passaram do percentual de alerta
+            enviar_alertas_metas(destinatario)
+            
             # Verificar lançamentos vencendo
             lancamentos = verificar_vencimentos(dias_antes)
             
@@ -113,13 +162,13 @@ def enviar_alertas_diarios(app):
             corpo = formatar_corpo_email(lancamentos)
             
             if corpo:
-                # Enviar email
+                # Colocar o email na fila (o envio é feito em segundo plano)
                 sucesso = enviar_email_alerta(assunto, corpo, destinatario)
                 
                 if sucesso:
-                    logger.info(f"Alerta enviado: {len(lancamentos)} lançamentos")
+                    logger.info(f"Alerta na fila de envio: {len(lancamentos)} lançamentos")
                 else:
-                    logger.error("Falha ao enviar alerta")
+                    logger.error("Falha ao enfileirar alerta")
                 
                 return sucesso
             
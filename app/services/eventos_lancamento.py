@@ -0,0 +1,187 @@
+# app/services/eventos_lancamento.py
+# Propaga as alterações de Lancamento para as tabelas derivadas (resumos, faturas, etc.)
+
+from contextlib import contextmanager
+from sqlalchemy import event, func, select, insert, delete
+from sqlalchemy.orm.attributes import get_history
+from app.models import db, Lancamento
+
+# Campos de Lancamento que alimentam as tabelas derivadas
+CAMPOS = (
+    'tipo', 'status', 'conta_id', 'cartao_id', 'categoria_id', 'subcategoria_id',
+    'tag', 'data_vencimento', 'data_pagamento', 'mes_inicial_cartao'
+)
+
+# Colunas informadas no INSERT em lote (todas as linhas precisam ter as mesmas chaves)
+COLUNAS_LOTE = CAMPOS + (
+    'descricao', 'valor', 'recorrencia', 'numero_parcela', 'total_parcelas',
+    'lancamento_pai_id', 'regra_id'
+)
+
+# Funções chamadas a cada alteração: tratador(conexao, linhas, sinal)
+_tratadores = []
+
+
+def registrar_tratador(tratador):
+    """Registra uma função que recebe as linhas alteradas (sinal +1 entrou, -1 saiu)"""
+    _tratadores.append(tratador)
+    return tratador
+
+
+def propagar(conexao, linhas, sinal):
+    """Envia as linhas para todos os tratadores registrados"""
+    linhas = [l for l in linhas if l['quantidade']]
+    if not linhas:
+        return
+    for tratador in _tratadores:
+        tratador(conexao, linhas, sinal)
+
+
+def mes_competencia(linha):
+    """Mês de competência (dia 01) de uma linha, com a mesma regra da coluna gerada mes_competencia"""
+    data = linha['data_vencimento']
+    if linha['tipo'] == 'cartao_credito' and linha['mes_inicial_cartao']:
+        data = linha['mes_inicial_cartao']
+    return data.replace(day=1) if data else None
+
+
+def insert_do_banco(conexao):
+    """insert() do dialeto em uso (PostgreSQL ou SQLite), com suporte a ON CONFLICT"""
+    if conexao.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    else:
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    return insert_dialeto
+
+
+def somar_deltas(conexao, tabela, indice, colunas, deltas, sinal, novas=None, apagar_vazias=True):
+    """
+    Soma os deltas {chave: (valor, quantidade)} em uma tabela de somas (valor_total, quantidade)
+    com um único INSERT ... ON CONFLICT sobre o índice (ou constraint) único da chave, e apaga as
+    linhas que ficaram vazias. `colunas` são os nomes das colunas da chave, na ordem das tuplas;
+    `novas(chave)` devolve as demais colunas gravadas só quando a linha é criada.
+    """
+    if not deltas:
+        return
+    insert_dialeto = insert_do_banco(conexao)
+    comando = insert_dialeto(tabela).values([
+        dict(zip(colunas, chave), valor_total=sinal * valor, quantidade=sinal * quantidade,
+             **(novas(chave) if novas else {}))
+        for chave, (valor, quantidade) in deltas.items()
+    ])
+    comando = comando.on_conflict_do_update(
+        index_elements=list(getattr(indice, 'expressions', None) or indice.columns),
+        set_={
+            'valor_total': tabela.c.valor_total + comando.excluded.valor_total,
+            'quantidade': tabela.c.quantidade + comando.excluded.quantidade
+        }
+    ).returning(tabela.c.id, tabela.c.quantidade)
+
+    vazias = [linha_id for linha_id, quantidade in conexao.execute(comando) if quantidade <= 0]
+    if vazias and apagar_vazias:
+        conexao.execute(delete(tabela).where(tabela.c.id.in_(vazias)))
+
+
+def linha_atual(lancamento):
+    """Valores atuais do lançamento no formato usado pelos tratadores"""
+    linha = {campo: getattr(lancamento, campo) for campo in CAMPOS}
+    linha['valor'] = lancamento.valor
+    linha['quantidade'] = 1
+    return linha
+
+
+def linha_anterior(lancamento):
+    """Valores do lançamento antes das alterações ainda não gravadas"""
+    linha = {}
+    for campo in CAMPOS + ('valor',):
+        historico = get_history(lancamento, campo)
+        if historico.deleted:
+            linha[campo] = historico.deleted[0]
+        elif historico.unchanged:
+            linha[campo] = historico.unchanged[0]
+        else:
+            linha[campo] = getattr(lancamento, campo)
+    linha['quantidade'] = 1
+    return linha
+
+
+def nova_linha(**valores):
+    """Linha para inserir_em_lote com todas as colunas (as não informadas ficam NULL)"""
+    linha = dict.fromkeys(COLUNAS_LOTE)
+    linha.update(valores)
+    return linha
+
+
+def inserir_em_lote(linhas):
+    """
+    Grava uma série de lançamentos com no máximo duas instruções: a primeira linha
+    com RETURNING (quando ela é o lançamento pai) e as demais em um único executemany,
+    já com o lancamento_pai_id. Retorna o id do lançamento pai.
+    """
+    if not linhas:
+        return None
+    tabela = Lancamento.__table__
+    conexao = db.session.connection()
+
+    pai_id = linhas[0]['lancamento_pai_id']
+    filhos = linhas
+    if pai_id is None:
+        pai_id = conexao.execute(
+            insert(tabela).values(**linhas[0]).returning(tabela.c.id)
+        ).scalar_one()
+        filhos = linhas[1:]
+        for linha in filhos:
+            linha['lancamento_pai_id'] = pai_id
+
+    if filhos:
+        conexao.execute(insert(tabela), filhos)
+
+    # INSERT em lote não dispara os eventos do ORM
+    propagar(conexao, [
+        dict({campo: linha[campo] for campo in CAMPOS}, valor=linha['valor'], quantidade=1)
+        for linha in linhas
+    ], 1)
+    return pai_id
+
+
+def agrupar_linhas(*criterio):
+    """Agrupa os lançamentos que atendem ao critério nos campos usados pelos tratadores"""
+    colunas = [getattr(Lancamento, campo) for campo in CAMPOS]
+    consulta = select(
+        *colunas,
+        func.sum(Lancamento.valor).label('valor'),
+        func.count(Lancamento.id).label('quantidade')
+    ).where(*criterio).group_by(*colunas)
+    return [dict(linha._mapping) for linha in db.session.execute(consulta)]
+
+
+@contextmanager
+def lancamentos_em_lote(*criterio):
+    """
+    Mantém as tabelas derivadas corretas em UPDATE/DELETE em massa, que não disparam
+    os eventos do ORM. O critério deve selecionar as mesmas linhas antes e depois.
+    """
+    conexao = db.session.connection()
+    propagar(conexao, agrupar_linhas(*criterio), -1)
+    yield
+    propagar(conexao, agrupar_linhas(*criterio), 1)
+
+
+@event.listens_for(Lancamento, 'after_insert')
+def _apos_inserir(mapper, conexao, lancamento):
+    propagar(conexao, [linha_atual(lancamento)], 1)
+
+
+@event.listens_for(Lancamento, 'after_update')
+def _apos_atualizar(mapper, conexao, lancamento):
+    anterior = linha_anterior(lancamento)
+    atual = linha_atual(lancamento)
+    if anterior == atual:
+        return
+    propagar(conexao, [anterior], -1)
+    propagar(conexao, [atual], 1)
+
+
+@event.listens_for(Lancamento, 'after_delete')
+def _apos_excluir(mapper, conexao, lancamento):
+    propagar(conexao, [linha_anterior(lancamento)], -1)
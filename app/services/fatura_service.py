@@ -0,0 +1,153 @@
+# app/services/fatura_service.py
+# Mantém a tabela de faturas sincronizada com as despesas de cartão
+
+from datetime import date
+from calendar import monthrange
+from sqlalchemy import event, select, update, func
+from sqlalchemy.orm.attributes import get_history
+from app.models import db, Lancamento, Cartao, Fatura
+from app.services.eventos_lancamento import registrar_tratador, insert_do_banco, somar_deltas
+import logging
+
+logger = logging.getLogger(__name__)
+
+tabela = Fatura.__table__
+chave_unica = next(c for c in tabela.constraints if c.name == '_cartao_competencia_uc')
+
+
+def calcular_vencimento(dia_vencimento, ano, mes):
+    """Data de vencimento do cartão no mês (último dia do mês se o dia não existir)"""
+    try:
+        return date(ano, mes, dia_vencimento)
+    except ValueError:
+        return date(ano, mes, monthrange(ano, mes)[1])
+
+
+def obter_fatura(cartao, ano, mes):
+    """Busca a fatura do cartão no mês, criando-a (vazia) se ainda não existir"""
+    competencia = date(ano, mes, 1)
+    fatura = Fatura.query.filter_by(cartao_id=cartao.id, competencia=competencia).first()
+    if not fatura:
+        # ON CONFLICT DO NOTHING: outra transação pode estar criando a mesma fatura
+        insert_dialeto = insert_do_banco(db.session.connection())
+        db.session.execute(
+            insert_dialeto(tabela).values(
+                cartao_id=cartao.id,
+                competencia=competencia,
+                valor_total=0,
+                quantidade=0,
+                data_vencimento=calcular_vencimento(cartao.dia_vencimento, ano, mes),
+                status='pendente'
+            ).on_conflict_do_nothing(index_elements=list(chave_unica.columns))
+        )
+        fatura = Fatura.query.filter_by(cartao_id=cartao.id, competencia=competencia).one()
+    return fatura
+
+
+def atualizar_vencimentos(cartao):
+    """Recalcula o vencimento das faturas pendentes após mudança no dia de vencimento"""
+    for fatura in Fatura.query.filter_by(cartao_id=cartao.id, status='pendente').all():
+        fatura.data_vencimento = calcular_vencimento(
+            cartao.dia_vencimento, fatura.competencia.year, fatura.competencia.month
+        )
+
+
+@registrar_tratador
+def atualizar_faturas(conexao, linhas, sinal):
+    """Soma (ou subtrai) as despesas de cartão no total da fatura do mês correspondente"""
+    deltas = {}
+    for linha in linhas:
+        if linha['tipo'] != 'cartao_credito' or linha['status'] == 'cancelado':
+            continue
+        if not linha['cartao_id'] or not linha['mes_inicial_cartao']:
+            continue
+        chave = (linha['cartao_id'], linha['mes_inicial_cartao'].replace(day=1))
+        valor, quantidade = deltas.get(chave, (0, 0))
+        deltas[chave] = (valor + linha['valor'], quantidade + linha['quantidade'])
+
+    # INSERT ... ON CONFLICT na chave (cartão, competência): duas transações somando a primeira
+    # despesa do mês não criam a mesma fatura duas vezes. Faturas zeradas ficam (podem ter pagamento)
+    if not deltas:
+        return
+    vencimentos = dict(conexao.execute(
+        select(Cartao.id, Cartao.dia_vencimento).where(Cartao.id.in_({cartao_id for cartao_id, _ in deltas}))
+    ).all())
+
+    def nova_fatura(chave):
+        cartao_id, competencia = chave
+        return {
+            'data_vencimento': calcular_vencimento(vencimentos[cartao_id], competencia.year, competencia.month),
+            'status': 'pendente'
+        }
+
+    somar_deltas(conexao, tabela, chave_unica, ('cartao_id', 'competencia'), deltas, sinal,
+                 novas=nova_fatura, apagar_vazias=False)
+
+
+@event.listens_for(Lancamento, 'after_update')
+def _pagamento_atualizado(mapper, conexao, lancamento):
+    """Mantém o status da fatura igual ao do lançamento de pagamento"""
+    if lancamento.tipo != 'despesa' or not get_history(lancamento, 'status').has_changes():
+        return
+    conexao.execute(
+        update(tabela).where(
+            tabela.c.lancamento_pagamento_id == lancamento.id
+        ).values(status='pago' if lancamento.status == 'pago' else 'pendente')
+    )
+
+
+@event.listens_for(Lancamento, 'before_delete')
+def _pagamento_excluido(mapper, conexao, lancamento):
+    """Ao excluir o pagamento, a fatura volta a ficar pendente"""
+    if lancamento.tipo != 'despesa':
+        return
+    conexao.execute(
+        update(tabela).where(
+            tabela.c.lancamento_pagamento_id == lancamento.id
+        ).values(status='pendente', lancamento_pagamento_id=None)
+    )
+
+
+def reconstruir_faturas():
+    """Recalcula total e quantidade de todas as faturas a partir das despesas de cartão"""
+    competencia = func.date_trunc('month', Lancamento.mes_inicial_cartao)
+    if db.engine.dialect.name != 'postgresql':
+        competencia = func.date(Lancamento.mes_inicial_cartao, 'start of month')
+
+    linhas = db.session.query(
+        Lancamento.cartao_id,
+        competencia,
+        func.sum(Lancamento.valor),
+        func.count(Lancamento.id)
+    ).filter(
+        Lancamento.tipo == 'cartao_credito',
+        Lancamento.status != 'cancelado',
+        Lancamento.cartao_id.isnot(None),
+        Lancamento.mes_inicial_cartao.isnot(None)
+    ).group_by(Lancamento.cartao_id, competencia).all()
+
+    totais = {}
+    for cartao_id, mes, valor, quantidade in linhas:
+        if isinstance(mes, str):
+            mes = date.fromisoformat(mes)
+        elif hasattr(mes, 'date'):
+            mes = mes.date()
+        totais[(cartao_id, mes)] = (valor, quantidade)
+
+    # Zerar faturas que não têm mais despesas
+    for fatura in Fatura.query.all():
+        valor, quantidade = totais.pop((fatura.cartao_id, fatura.competencia), (0, 0))
+        fatura.valor_total = valor
+        fatura.quantidade = quantidade
+
+    # Criar as faturas que ainda não existiam
+    cartoes = {c.id: c for c in Cartao.query.all()}
+    for (cartao_id, competencia), (valor, quantidade) in totais.items():
+        fatura = obter_fatura(cartoes[cartao_id], competencia.year, competencia.month)
+        fatura.valor_total = valor
+        fatura.quantidade = quantidade
+
+    db.session.commit()
+    total = db.session.query(func.count(Fatura.id)).scalar()
+    logger.info(f"Faturas reconstruídas: {total}")
+    return total
@@ -0,0 +1,425 @@
+# app/services/investimentos_service.py
+# Séries de saldo das contas de investimento: todo o histórico lido em uma consulta
+# e a série consolidada montada com preenchimento "as-of" (último saldo até cada data)
+
+import csv
+import unicodedata
+from datetime import date, datetime
+from decimal import InvalidOperation
+from itertools import chain, islice
+from decimal import Decimal
+from sqlalchemy import event, func, case, update, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import get_history
+from app.models import db, Conta, SaldoInvestimento
+
+# Linhas validadas e gravadas por vez na importação de CSV
+TAMANHO_LOTE_IMPORTACAO = 500
+
+# Pontos devolvidos por padrão nas séries dos gráficos
+PONTOS_GRAFICO = 200
+
+# Séries já montadas (dados simples, sem objetos do ORM). Cache do processo,
+# limpo depois do commit que altera um saldo registrado ou uma conta de investimento
+# e conferido a cada leitura com a versão do banco (alterações de outros processos)
+_cache = {}
+
+
+def limpar_series():
+    _cache.clear()
+
+
+def _versao():
+    """Assinatura barata dos dados das séries: quantidade, maior id e soma dos saldos e das contas"""
+    saldos = select(
+        func.count(SaldoInvestimento.id), func.max(SaldoInvestimento.id), func.sum(SaldoInvestimento.saldo)
+    ).subquery()
+    contas = select(
+        func.count(Conta.id), func.max(Conta.id), func.sum(Conta.saldo_inicial)
+    ).where(Conta.tipo_conta == 'Investimento').subquery()
+    return tuple(db.session.execute(select(saldos, contas)).one())
+
+
+def _carregar():
+    """Saldo inicial e histórico (data, saldo) de cada conta de investimento, em uma consulta"""
+    saldos_iniciais = dict(
+        db.session.query(Conta.id, Conta.saldo_inicial).filter(Conta.tipo_conta == 'Investimento')
+    )
+    historicos = {conta_id: [] for conta_id in saldos_iniciais}
+
+    registros = db.session.query(
+        SaldoInvestimento.conta_id,
+        SaldoInvestimento.data_registro,
+        SaldoInvestimento.saldo
+    ).join(Conta, Conta.id == SaldoInvestimento.conta_id).filter(
+        Conta.tipo_conta == 'Investimento'
+    ).order_by(SaldoInvestimento.conta_id, SaldoInvestimento.data_registro)
+
+    for conta_id, data_registro, saldo in registros:
+        historicos[conta_id].append((data_registro, saldo))
+    return saldos_iniciais, historicos
+
+
+def _consolidar(saldos_iniciais, historicos):
+    """
+    Total das contas em cada data com registro: cada conta entra com o último saldo
+    registrado até a data (ou o saldo inicial, antes do primeiro registro)
+    """
+    por_data = {}
+    for conta_id, historico in historicos.items():
+        for data_registro, saldo in historico:
+            por_data.setdefault(data_registro, []).append((conta_id, saldo))
+
+    vigente = dict(saldos_iniciais)
+    total = sum(vigente.values(), Decimal('0'))
+    serie = []
+    for data_registro in sorted(por_data):
+        for conta_id, saldo in por_data[data_registro]:
+            total += saldo - vigente[conta_id]
+            vigente[conta_id] = saldo
+        serie.append((data_registro, total))
+    return serie
+
+
+def series_investimentos():
+    """{'historicos': {conta_id: [(data, saldo)]}, 'consolidado': [(data, total)]}"""
+    versao = _versao()
+    if _cache.get('versao') != versao:
+        saldos_iniciais, historicos = _carregar()
+        _cache.update(versao=versao, series={
+            'historicos': historicos,
+            'consolidado': _consolidar(saldos_iniciais, historicos)
+        })
+    return _cache['series']
+
+
+def _lttb(valores, limite):
+    """
+    Índices dos pontos mantidos pelo Largest-Triangle-Three-Buckets: o primeiro, o último e,
+    em cada balde, o ponto que forma o maior triângulo com o escolhido antes e a média do
+    balde seguinte. O eixo x é a posição, como no gráfico de categorias.
+    """
+    total = len(valores)
+    if limite >= total or limite < 3:
+        return list(range(total))
+
+    tamanho = (total - 2) / (limite - 2)
+    escolhidos = [0]
+    a = 0
+    for balde in range(limite - 2):
+        inicio = int(balde * tamanho) + 1
+        fim = int((balde + 1) * tamanho) + 1
+        proximo_fim = min(int((balde + 2) * tamanho) + 1, total)
+
+        media_x = (fim + proximo_fim - 1) / 2
+        media_y = sum(valores[fim:proximo_fim]) / (proximo_fim - fim)
+
+        a = max(range(inicio, fim), key=lambda b: abs(
+            (a - media_x) * (valores[b] - valores[a]) - (a - b) * (media_y - valores[a])
+        ))
+        escolhidos.append(a)
+
+    escolhidos.append(total - 1)
+    return escolhidos
+
+
+def dados_grafico(pontos, inicio=None, fim=None, limite=PONTOS_GRAFICO):
+    """
+    Labels e valores de uma série [(data, valor)] para o Chart.js: recortada em [inicio, fim]
+    e reduzida a `limite` pontos. Data None marca o saldo inicial (antes de qualquer registro).
+    """
+    recorte = [
+        (data, float(valor)) for data, valor in pontos
+        if (data is None and inicio is None)
+        or (data is not None and (inicio is None or data >= inicio) and (fim is None or data <= fim))
+    ]
+    valores = [valor for _, valor in recorte]
+    indices = _lttb(valores, limite)
+
+    return {
+        'labels': [recorte[i][0].strftime('%d/%m/%Y') if recorte[i][0] else 'Inicial' for i in indices],
+        'valores': [valores[i] for i in indices],
+        'total_pontos': len(recorte)
+    }
+
+
+def pontos_conta(conta):
+    """Saldo inicial, saldos registrados e o saldo atual (se diferente do último registro)"""
+    historico = series_investimentos()['historicos'].get(conta.id, [])
+    pontos = [(None, conta.saldo_inicial)] + historico
+    if not historico or historico[-1][1] != conta.saldo_atual:
+        pontos.append((date.today(), conta.saldo_atual))
+    return pontos
+
+
+def pontos_consolidado(contas):
+    """Série consolidada, com o saldo atual das contas no fim"""
+    pontos = list(series_investimentos()['consolidado'])
+
+    # Adicionar ponto atual se necessário
+    total_atual = sum(conta.saldo_atual for conta in contas)
+    if contas and (not pontos or pontos[-1][1] != total_atual):
+        pontos.append((date.today(), total_atual))
+    return pontos
+
+
+def dados_consolidado(contas, inicio=None, fim=None, limite=PONTOS_GRAFICO):
+    """Labels e valores do gráfico consolidado, com o saldo atual das contas no fim"""
+    return dados_grafico(pontos_consolidado(contas), inicio, fim, limite)
+
+
+def recalcular_rendimentos(conta_id, desde=None):
+    """
+    Regrava rendimento_mes e percentual_mes dos registros da conta a partir de `desde`
+    (todos, se None) em um único UPDATE: o saldo anterior vem de LAG() sobre o histórico
+    inteiro da conta, e o primeiro registro compara com o saldo inicial.
+    Não faz commit; roda na transação de quem chamou.
+    """
+    db.session.flush()
+
+    anterior = func.coalesce(
+        func.lag(SaldoInvestimento.saldo).over(
+            partition_by=SaldoInvestimento.conta_id,
+            order_by=SaldoInvestimento.data_registro
+        ),
+        Conta.saldo_inicial
+    )
+    cadeia = select(
+        SaldoInvestimento.id.label('id'),
+        SaldoInvestimento.data_registro.label('data_registro'),
+        (SaldoInvestimento.saldo - anterior).label('rendimento'),
+        case(
+            (anterior > 0, func.round(SaldoInvestimento.saldo * Decimal('100') / anterior - 100, 2)),
+            else_=0
+        ).label('percentual')
+    ).join(Conta, Conta.id == SaldoInvestimento.conta_id).where(
+        SaldoInvestimento.conta_id == conta_id
+    ).subquery()
+
+    tabela = SaldoInvestimento.__table__
+    comando = update(tabela).where(tabela.c.id == cadeia.c.id).values(
+        rendimento_mes=cadeia.c.rendimento,
+        percentual_mes=cadeia.c.percentual
+    )
+    if desde is not None:
+        comando = comando.where(cadeia.c.data_registro >= desde)
+
+    return db.session.execute(comando).rowcount
+
+
+def registrar_saldos(data_registro, saldos):
+    """
+    Registra de uma vez os saldos [(conta_id, saldo, observacoes)] de várias contas na mesma data.
+    Saldo anterior e existência de registros posteriores vêm de uma consulta feita na própria
+    transação; registro repetido na data é barrado pela constraint _conta_data_uc.
+    ValueError se a conta não for de investimento ou já tiver registro na data.
+    """
+    registros = SaldoInvestimento.__table__.alias('registros')
+    saldo_anterior = select(registros.c.saldo).where(
+        registros.c.conta_id == Conta.id,
+        registros.c.data_registro < data_registro
+    ).order_by(registros.c.data_registro.desc()).limit(1).scalar_subquery()
+    tem_posterior = select(registros.c.id).where(
+        registros.c.conta_id == Conta.id,
+        registros.c.data_registro > data_registro
+    ).exists()
+
+    contas = {
+        conta.id: (conta, anterior, posterior)
+        for conta, anterior, posterior in db.session.query(Conta, saldo_anterior, tem_posterior).filter(
+            Conta.id.in_([conta_id for conta_id, _, _ in saldos]),
+            Conta.tipo_conta == 'Investimento'
+        )
+    }
+
+    retroativas = []
+    for conta_id, saldo, observacoes in saldos:
+        if conta_id not in contas:
+            raise ValueError(f"Conta {conta_id} não é de investimento")
+        conta, anterior, posterior = contas[conta_id]
+
+        if anterior is None:
+            anterior = conta.saldo_inicial
+        try:
+            with db.session.begin_nested():
+                db.session.add(SaldoInvestimento(
+                    conta_id=conta_id,
+                    data_registro=data_registro,
+                    saldo=saldo,
+                    rendimento_mes=saldo - anterior,
+                    percentual_mes=((saldo / anterior - 1) * 100) if anterior > 0 else 0,
+                    observacoes=observacoes
+                ))
+        except IntegrityError:
+            raise ValueError(f"Já existe um registro para {conta.nome} nesta data")
+
+        # Só o registro mais recente define o saldo atual da conta
+        if posterior:
+            retroativas.append(conta_id)
+        else:
+            conta.saldo_atual = saldo
+
+    # Os registros seguintes aos retroativos passam a comparar com o novo saldo
+    for conta_id in retroativas:
+        recalcular_rendimentos(conta_id, data_registro)
+
+    return len(saldos)
+
+
+def _coluna(nome):
+    """Nome de coluna do CSV sem acentos, espaços e maiúsculas ('Observações' -> 'observacoes')"""
+    sem_acento = unicodedata.normalize('NFKD', nome or '').encode('ascii', 'ignore').decode()
+    return sem_acento.strip().lower()
+
+
+def _ler_data(texto):
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"data inválida '{texto}'")
+
+
+def _ler_valor(texto):
+    """Aceita '1234.56' e o formato brasileiro '1.234,56' (com ou sem 'R$')"""
+    texto = texto.replace('R$', '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f"saldo inválido '{texto}'")
+
+
+def _gravar_lote(registros):
+    """INSERT ... ON CONFLICT (_conta_data_uc) DO UPDATE de um lote de registros"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    comando = insert(SaldoInvestimento.__table__).values(registros)
+    comando = comando.on_conflict_do_update(
+        index_elements=['conta_id', 'data_registro'],
+        set_={
+            'saldo': comando.excluded.saldo,
+            'observacoes': comando.excluded.observacoes
+        }
+    )
+    db.session.execute(comando)
+
+
+def importar_saldos_csv(linhas, tamanho_lote=TAMANHO_LOTE_IMPORTACAO):
+    """
+    Importa saldos de um CSV (conta, data, saldo, observações) lido linha a linha.
+    A conta pode ser o nome ou o id; separador ',' ou ';'. Valida e grava em lotes;
+    registros já existentes na mesma data são atualizados. No fim recalcula a cadeia de
+    rendimentos e o saldo atual de cada conta afetada. Qualquer linha inválida desfaz tudo.
+    Retorna {'importados': n, 'contas': n, 'erros': [mensagens]}.
+    """
+    contas = Conta.query.filter_by(tipo_conta='Investimento').all()
+    por_chave = {str(conta.id): conta.id for conta in contas}
+    por_chave.update({conta.nome.strip().lower(): conta.id for conta in contas})
+
+    linhas = iter(linhas)
+    cabecalho = next(linhas, '')
+    separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    leitor = csv.DictReader(chain([cabecalho], linhas), delimiter=separador)
+    leitor.fieldnames = [_coluna(nome) for nome in (leitor.fieldnames or [])]
+
+    faltando = {'conta', 'data', 'saldo'} - set(leitor.fieldnames)
+    if faltando:
+        return {'importados': 0, 'contas': 0, 'erros': [f"Colunas ausentes: {', '.join(sorted(faltando))}"]}
+
+    importados = 0
+    inicio_por_conta = {}
+    erros = []
+    numero = 1
+    while True:
+        lote = list(islice(leitor, tamanho_lote))
+        if not lote:
+            break
+
+        # Validar o lote inteiro; a mesma conta e data repetida no lote fica com a última linha
+        registros = {}
+        for linha in lote:
+            numero += 1
+            try:
+                conta_id = por_chave.get((linha.get('conta') or '').strip().lower())
+                if conta_id is None:
+                    raise ValueError(f"conta de investimento não encontrada '{linha.get('conta')}'")
+                data_registro = _ler_data((linha.get('data') or '').strip())
+                registros[(conta_id, data_registro)] = {
+                    'conta_id': conta_id,
+                    'data_registro': data_registro,
+                    'saldo': _ler_valor(linha.get('saldo') or ''),
+                    'observacoes': (linha.get('observacoes') or '').strip() or None
+                }
+            except ValueError as e:
+                erros.append(f"Linha {numero}: {e}")
+                continue
+
+            if data_registro < inicio_por_conta.get(conta_id, date.max):
+                inicio_por_conta[conta_id] = data_registro
+
+        if registros and not erros:
+            _gravar_lote(list(registros.values()))
+            importados += len(registros)
+
+    if erros:
+        db.session.rollback()
+        return {'importados': 0, 'contas': 0, 'erros': erros}
+
+    for conta_id, desde in inicio_por_conta.items():
+        recalcular_rendimentos(conta_id, desde)
+
+    # Saldo atual: o do registro mais recente de cada conta
+    ultimo_saldo = select(SaldoInvestimento.saldo).where(
+        SaldoInvestimento.conta_id == Conta.id
+    ).order_by(SaldoInvestimento.data_registro.desc()).limit(1).scalar_subquery()
+    db.session.execute(
+        update(Conta).where(Conta.id.in_(list(inicio_por_conta))).values(saldo_atual=ultimo_saldo)
+    )
+
+    db.session.commit()
+    # Os comandos em lote não passam pelos eventos do ORM
+    limpar_series()
+
+    return {'importados': importados, 'contas': len(inicio_por_conta), 'erros': []}
+
+
+def _marcar_alteracao(objeto):
+    sessao = object_session(objeto)
+    if sessao is not None:
+        sessao.info['series_alteradas'] = True
+
+
+@event.listens_for(SaldoInvestimento, 'after_insert')
+@event.listens_for(SaldoInvestimento, 'after_update')
+@event.listens_for(SaldoInvestimento, 'after_delete')
+@event.listens_for(Conta, 'after_insert')
+@event.listens_for(Conta, 'after_delete')
+def _saldo_alterado(mapper, conexao, objeto):
+    _marcar_alteracao(objeto)
+
+
+@event.listens_for(Conta, 'after_update')
+def _conta_alterada(mapper, conexao, conta):
+    # saldo_atual muda a cada lançamento pago e não entra nas séries
+    if get_history(conta, 'saldo_inicial').has_changes() or get_history(conta, 'tipo_conta').has_changes():
+        _marcar_alteracao(conta)
+
+
+@event.listens_for(Session, 'after_commit')
+def _series_confirmadas(sessao):
+    # Só depois do commit: limpar no flush deixaria outra requisição remontar o cache
+    # com os dados antigos antes de a transação terminar
+    if sessao.info.pop('series_alteradas', False):
+        limpar_series()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _series_desfeitas(sessao):
+    sessao.info.pop('series_alteradas', None)
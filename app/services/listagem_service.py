@@ -0,0 +1,137 @@
+# app/services/listagem_service.py
+# Listagem de lançamentos paginada pela chave (data_vencimento, id), com filtros e campos escolhidos
+
+from datetime import date
+from sqlalchemy import select, and_, or_
+from sqlalchemy.orm import aliased
+from app.models import db, Lancamento, Categoria, Subcategoria, Conta, Cartao
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+ContaDestino = aliased(Conta)
+
+# Campos que podem ser pedidos e as colunas lidas para cada um
+CAMPOS = {
+    'id': (Lancamento.id,),
+    'data_vencimento': (Lancamento.data_vencimento,),
+    'descricao': (Lancamento.descricao,),
+    'valor': (Lancamento.valor,),
+    'tipo': (Lancamento.tipo,),
+    'status': (Lancamento.status,),
+    'recorrencia': (Lancamento.recorrencia,),
+    'tag': (Lancamento.tag,),
+    'data_pagamento': (Lancamento.data_pagamento,),
+    'mes_inicial_cartao': (Lancamento.mes_inicial_cartao,),
+    'categoria': (Categoria.nome, Categoria.cor, Categoria.icone),
+    'subcategoria': (Subcategoria.nome,),
+    'conta': (Conta.nome,),
+    'conta_destino': (ContaDestino.nome,),
+    'cartao': (Cartao.nome,),
+}
+
+# Tabelas relacionadas, só incluídas na consulta quando o campo é pedido
+JUNCOES = {
+    'categoria': (Categoria, Categoria.id == Lancamento.categoria_id),
+    'subcategoria': (Subcategoria, Subcategoria.id == Lancamento.subcategoria_id),
+    'conta': (Conta, Conta.id == Lancamento.conta_id),
+    'conta_destino': (ContaDestino, ContaDestino.id == Lancamento.conta_destino_id),
+    'cartao': (Cartao, Cartao.id == Lancamento.cartao_id),
+}
+
+# Filtros aceitos: nome -> coluna comparada por igualdade
+FILTROS = {
+    'conta_id': Lancamento.conta_id,
+    'cartao_id': Lancamento.cartao_id,
+    'categoria_id': Lancamento.categoria_id,
+    'tag': Lancamento.tag,
+    'status': Lancamento.status,
+    'tipo': Lancamento.tipo,
+}
+
+
+def ler_cursor(texto):
+    """Converte o cursor 'AAAA-MM-DD,id' em (data, id); ValueError se inválido"""
+    data, id_ = texto.split(',')
+    return date.fromisoformat(data), int(id_)
+
+
+def montar_cursor(linha):
+    return f"{linha['data_vencimento'].isoformat()},{linha['id']}"
+
+
+def buscar_pagina(filtros=None, data_inicio=None, data_fim=None, apos=None,
+                  limite=LIMITE_PADRAO, campos=None):
+    """
+    Retorna (linhas, proximo_cursor) com os lançamentos do mais recente para o mais antigo.
+    A página seguinte começa depois do cursor (data_vencimento, id), então o custo
+    não cresce com o número de páginas já lidas.
+    """
+    filtros = filtros or {}
+    campos = [c for c in (campos or CAMPOS) if c in CAMPOS]
+    # id e vencimento sempre vêm junto: formam o cursor
+    for obrigatorio in ('data_vencimento', 'id'):
+        if obrigatorio not in campos:
+            campos.insert(0, obrigatorio)
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+
+    colunas = [
+        coluna.label(f'{campo}__{i}')
+        for campo in campos
+        for i, coluna in enumerate(CAMPOS[campo])
+    ]
+    consulta = select(*colunas).select_from(Lancamento)
+    for campo in campos:
+        if campo in JUNCOES:
+            consulta = consulta.outerjoin(*JUNCOES[campo])
+
+    for nome, valor in filtros.items():
+        if nome in FILTROS and valor not in (None, ''):
+            consulta = consulta.where(FILTROS[nome] == valor)
+    if data_inicio:
+        consulta = consulta.where(Lancamento.data_vencimento >= data_inicio)
+    if data_fim:
+        consulta = consulta.where(Lancamento.data_vencimento <= data_fim)
+    if apos:
+        data, id_ = apos
+        consulta = consulta.where(or_(
+            Lancamento.data_vencimento < data,
+            and_(Lancamento.data_vencimento == data, Lancamento.id < id_)
+        ))
+
+    # Uma linha a mais indica se existe próxima página
+    consulta = consulta.order_by(
+        Lancamento.data_vencimento.desc(), Lancamento.id.desc()
+    ).limit(limite + 1)
+
+    linhas = []
+    for registro in db.session.execute(consulta):
+        valores = registro._mapping
+        linha = {}
+        for campo in campos:
+            if campo == 'categoria':
+                linha[campo] = None if valores['categoria__0'] is None else {
+                    'nome': valores['categoria__0'],
+                    'cor': valores['categoria__1'],
+                    'icone': valores['categoria__2'],
+                }
+            else:
+                linha[campo] = valores[f'{campo}__0']
+        linhas.append(linha)
+
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = montar_cursor(linhas[-1])
+    return linhas, proximo
+
+
+def para_json(linha):
+    """Converte datas e valores da linha para tipos do JSON"""
+    resultado = dict(linha)
+    for campo, valor in linha.items():
+        if isinstance(valor, date):
+            resultado[campo] = valor.isoformat()
+        elif campo == 'valor' and valor is not None:
+            resultado[campo] = str(valor)
+    return resultado
@@ -0,0 +1,707 @@
+# app/services/metas_service.py
+# Progresso das metas orçamentárias: consulta das despesas de uma meta e cálculo
+# em lote do progresso de todas as metas de um mês com uma única consulta agrupada.
+# Meses fechados ficam gravados em metas_historico e não são recalculados; o período
+# aberto é lido de metas_contadores, atualizados a cada lançamento gravado
+
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import event, inspect, select, insert, update, delete, func, and_, or_, case
+from sqlalchemy.orm import Session, joinedload
+from app.models import db, Lancamento, Meta, MetaHistorico, MetaContador, Categoria, Subcategoria, Cartao, inicio_do_mes
+from app.services.eventos_lancamento import CAMPOS, registrar_tratador, mes_competencia, insert_do_banco
+from app.services.periodo_service import intervalo_meta, ultimo_dia, filtro_intervalo
+import logging
+
+logger = logging.getLogger(__name__)
+
+contadores = MetaContador.__table__
+chave_contador = next(c for c in contadores.constraints if c.name == '_meta_inicio_uc')
+
+# Status exibido para cada nível de progresso (0 ok, 1 alerta, 2 excedido)
+STATUS_NIVEL = (('ok', 'success'), ('alerta', 'warning'), ('excedido', 'danger'))
+
+# Detalhes já montados: (meta_id, início do período, período futuro) -> (versão, resultado).
+# Cache do processo com os mais usados (LRU), limpo depois do commit que altera um lançamento
+# da meta ou um nome exibido; a versão (limites da meta e valores do contador) é conferida a
+# cada leitura para pegar alterações feitas por outros processos
+_detalhes_cache = OrderedDict()
+_trava_detalhes = threading.Lock()
+DETALHES_MAXIMO = 256
+
+
+def tipos_meta(meta):
+    """Tipos de lançamento que contam para a meta"""
+    return ['despesa', 'cartao_credito'] if meta.incluir_cartao else ['despesa']
+
+
+def eh_periodo_futuro(mes_referencia):
+    return mes_referencia > date.today().replace(day=1)
+
+
+def _filtro_despesas(tipos, data_inicio, fim, periodo_futuro):
+    """
+    Despesas que contam para metas no período [data_inicio, fim).
+    Futuro: pagas e pendentes pelo mês de competência (vencimento ou mês da fatura).
+    Passado/atual: apenas pagas; despesas normais pela data de pagamento e
+    despesas de cartão pelo mês da fatura.
+    """
+    if periodo_futuro:
+        return and_(
+            Lancamento.tipo.in_(tipos),
+            filtro_intervalo(Lancamento.mes_competencia, data_inicio, fim)
+        )
+
+    return and_(
+        Lancamento.tipo.in_(tipos),
+        Lancamento.status == 'pago',
+        or_(
+            and_(Lancamento.tipo == 'despesa',
+                 filtro_intervalo(Lancamento.data_pagamento, data_inicio, fim)),
+            and_(Lancamento.tipo == 'cartao_credito',
+                 filtro_intervalo(Lancamento.mes_competencia, data_inicio, fim))
+        )
+    )
+
+
+def _mes_pago(linha):
+    """Mês em que a linha conta como gasto realizado (None se não estiver paga)"""
+    if linha['status'] != 'pago':
+        return None
+    if linha['tipo'] == 'despesa':
+        return linha['data_pagamento'].replace(day=1) if linha['data_pagamento'] else None
+    return mes_competencia(linha)
+
+
+def _mes_da_despesa(periodo_futuro):
+    """Mês (dia 01) em que a despesa conta para a meta, coerente com _filtro_despesas"""
+    if periodo_futuro:
+        return Lancamento.mes_competencia
+    return case(
+        (Lancamento.tipo == 'despesa', inicio_do_mes(Lancamento.data_pagamento)),
+        else_=Lancamento.mes_competencia
+    )
+
+
+def consulta_despesas_meta(meta, data_inicio, fim, periodo_futuro):
+    """Consulta das despesas que contam para a meta no período [data_inicio, fim)"""
+    query_base = Lancamento.query.filter(
+        _filtro_despesas(tipos_meta(meta), data_inicio, fim, periodo_futuro)
+    )
+
+    # Filtrar por tipo de meta (global não filtra mais nada)
+    if meta.tipo == 'categoria':
+        query_base = query_base.filter(Lancamento.categoria_id == meta.categoria_id)
+    elif meta.tipo == 'tag':
+        query_base = query_base.filter(Lancamento.tag == meta.tag)
+
+    return query_base
+
+
+def _linha_da_meta(meta, categoria_id, tag, tipo):
+    """A linha (categoria, tag, tipo) conta para a meta?"""
+    if tipo not in tipos_meta(meta):
+        return False
+    if meta.tipo == 'categoria':
+        return categoria_id == meta.categoria_id
+    if meta.tipo == 'tag':
+        return tag == meta.tag
+    return True
+
+
+def calcular_percentual(total_gasto, valor_limite):
+    return (total_gasto / valor_limite * 100) if valor_limite > 0 else 0
+
+
+def nivel_progresso(percentual, alertar_percentual):
+    """0 ok, 1 alerta (passou de alertar_percentual), 2 excedido (passou de 100%)"""
+    if percentual <= alertar_percentual:
+        return 0
+    if percentual <= 100:
+        return 1
+    return 2
+
+
+def montar_progresso(meta, total_gasto, data_inicio, fim, periodo_futuro, valor_limite=None):
+    """Percentual e status da meta a partir do total gasto no período"""
+    # Limite da foto do mês fechado, quando houver
+    if valor_limite is None:
+        valor_limite = meta.valor_limite
+    
+    # Calcular percentual e status
+    percentual = calcular_percentual(total_gasto, valor_limite)
+    status, cor = STATUS_NIVEL[nivel_progresso(percentual, meta.alertar_percentual)]
+
+    return {
+        'valor_gasto': total_gasto,
+        'valor_limite': valor_limite,
+        'percentual': float(percentual),
+        'status': status,
+        'cor': cor,
+        'data_inicio': data_inicio,
+        'data_fim': ultimo_dia(fim),
+        'periodo_futuro': periodo_futuro,
+        # Projeção do fim do período (preenchida só para o período em andamento)
+        'projecao': total_gasto,
+        'percentual_projetado': float(percentual),
+        'status_projetado': status,
+        'taxa_diaria': None
+    }
+
+
+def calcular_progresso_metas(metas, mes_referencia):
+    """
+    Progresso de várias metas no mês de referência: {meta.id: progresso}.
+    Os períodos das metas (mês, trimestre, ano) contêm o mês de referência, então
+    o maior deles cobre todos: uma consulta agrupada por mês, categoria, tag e tipo
+    traz as somas e cada meta soma em memória as linhas do seu período.
+    """
+    if not metas:
+        return {}
+
+    periodo_futuro = eh_periodo_futuro(mes_referencia)
+    intervalos = {meta.id: intervalo_meta(meta.periodo, mes_referencia) for meta in metas}
+    data_inicio = min(inicio for inicio, _ in intervalos.values())
+    fim = max(fim for _, fim in intervalos.values())
+
+    linhas = _somas_por_mes(metas, periodo_futuro, data_inicio, fim)
+
+    progressos = {}
+    for meta in metas:
+        inicio_meta, fim_meta = intervalos[meta.id]
+        total_gasto = sum((
+            valor for mes, categoria_id, tag, tipo, valor in linhas
+            if inicio_meta <= mes < fim_meta and _linha_da_meta(meta, categoria_id, tag, tipo)
+        ), 0)
+        progressos[meta.id] = montar_progresso(meta, total_gasto, inicio_meta, fim_meta, periodo_futuro)
+
+    _projetar(metas, progressos, mes_referencia)
+    return progressos
+
+
+def _projetar(metas, progressos, mes_referencia):
+    """
+    Projeção do gasto no fim do período em andamento: o que já foi pago, mais as despesas e
+    compras de cartão pendentes até data_fim, mais o ritmo diário dos gastos avulsos
+    (recorrência 'unica') nos dias que faltam. Duas consultas agrupadas para todas as metas.
+    """
+    hoje = date.today()
+    if eh_periodo_futuro(mes_referencia):
+        return
+    intervalos = {meta.id: intervalo_meta(meta.periodo, mes_referencia) for meta in metas}
+    em_andamento = [meta for meta in metas if intervalos[meta.id][0] <= hoje < intervalos[meta.id][1]]
+    if not em_andamento:
+        return
+
+    data_inicio = min(intervalos[meta.id][0] for meta in em_andamento)
+    fim = max(intervalos[meta.id][1] for meta in em_andamento)
+    pendentes = _somas_por_mes(em_andamento, True, data_inicio, fim, Lancamento.status == 'pendente')
+    avulsos = _somas_por_mes(em_andamento, False, data_inicio, fim, Lancamento.recorrencia == 'unica')
+
+    for meta in em_andamento:
+        inicio_meta, fim_meta = intervalos[meta.id]
+
+        def soma(linhas):
+            return sum((
+                valor for mes, categoria_id, tag, tipo, valor in linhas
+                if inicio_meta <= mes < fim_meta and _linha_da_meta(meta, categoria_id, tag, tipo)
+            ), Decimal(0))
+
+        dias_decorridos = (hoje - inicio_meta).days + 1
+        dias_restantes = (fim_meta - hoje).days - 1
+        taxa_diaria = soma(avulsos) / dias_decorridos
+        progresso = progressos[meta.id]
+        projecao = progresso['valor_gasto'] + soma(pendentes) + taxa_diaria * dias_restantes
+
+        percentual = calcular_percentual(projecao, progresso['valor_limite'])
+        progresso.update({
+            'projecao': projecao,
+            'percentual_projetado': float(percentual),
+            'status_projetado': STATUS_NIVEL[nivel_progresso(percentual, meta.alertar_percentual)][0],
+            'taxa_diaria': taxa_diaria
+        })
+
+
+def _somas_por_mes(metas, periodo_futuro, data_inicio=None, fim=None, *criterios):
+    """Somas das despesas das metas agrupadas por (mês, categoria, tag, tipo)"""
+    mes = _mes_da_despesa(periodo_futuro)
+    query = db.session.query(
+        mes,
+        Lancamento.categoria_id,
+        Lancamento.tag,
+        Lancamento.tipo,
+        func.sum(Lancamento.valor)
+    ).filter(_filtro_despesas(['despesa', 'cartao_credito'], data_inicio, fim, periodo_futuro), *criterios)
+
+    # Sem meta global, basta ler as categorias e tags que têm meta
+    if not any(meta.tipo == 'global' for meta in metas):
+        categorias = {meta.categoria_id for meta in metas if meta.tipo == 'categoria'}
+        tags = {meta.tag for meta in metas if meta.tipo == 'tag'}
+        query = query.filter(or_(
+            Lancamento.categoria_id.in_(categorias),
+            Lancamento.tag.in_(tags)
+        ))
+
+    linhas = query.group_by(mes, Lancamento.categoria_id, Lancamento.tag, Lancamento.tipo).all()
+    return [linha for linha in linhas if linha[0] is not None]
+
+
+def calcular_progresso_meta(meta, mes_referencia):
+    """Calcular o progresso de uma meta para um determinado mês"""
+    return calcular_progresso_metas([meta], mes_referencia)[meta.id]
+
+
+def mes_aberto():
+    """Primeiro dia do mês corrente: meses anteriores a ele já podem ser fechados"""
+    return date.today().replace(day=1)
+
+
+def progresso_metas(metas, mes_referencia):
+    """
+    Progresso das metas no mês: períodos já encerrados vêm das fotos de metas_historico,
+    os demais (e os que ainda não foram fechados) dos contadores
+    """
+    fechadas = [
+        meta.id for meta in metas
+        if intervalo_meta(meta.periodo, mes_referencia)[1] <= mes_aberto()
+    ]
+    fotos = {}
+    if fechadas:
+        fotos = {
+            foto.meta_id: foto
+            for foto in MetaHistorico.query.filter(
+                MetaHistorico.meta_id.in_(fechadas),
+                MetaHistorico.mes_referencia == mes_referencia,
+                MetaHistorico.status != 'em_andamento'
+            )
+        }
+
+    progressos = ler_contadores([meta for meta in metas if meta.id not in fotos], mes_referencia)
+    for meta in metas:
+        if meta.id in fotos:
+            data_inicio, fim = intervalo_meta(meta.periodo, mes_referencia)
+            progressos[meta.id] = montar_progresso(
+                meta, fotos[meta.id].valor_gasto, data_inicio, fim, False,
+                valor_limite=fotos[meta.id].valor_limite
+            )
+    return progressos
+
+
+def reconstruir_contadores(metas):
+    """Recalcula os contadores de todos os períodos das metas (duas consultas agrupadas)"""
+    if not metas:
+        return 0
+
+    valores = {}
+    for coluna, periodo_futuro in (('valor_pago', False), ('valor_previsto', True)):
+        for mes, categoria_id, tag, tipo, valor in _somas_por_mes(metas, periodo_futuro):
+            for meta in metas:
+                if _linha_da_meta(meta, categoria_id, tag, tipo):
+                    chave = (meta.id, intervalo_meta(meta.periodo, mes)[0])
+                    valores.setdefault(chave, {'valor_pago': 0, 'valor_previsto': 0})[coluna] += valor
+
+    por_id = {meta.id: meta for meta in metas}
+    db.session.execute(delete(contadores).where(contadores.c.meta_id.in_(list(por_id))))
+    linhas = []
+    for (meta_id, inicio), valor in valores.items():
+        meta = por_id[meta_id]
+        # Gastos já existentes não geram aviso: o nível parte do valor atual
+        nivel = nivel_progresso(calcular_percentual(valor['valor_pago'], meta.valor_limite), meta.alertar_percentual)
+        linhas.append(dict(meta_id=meta_id, inicio=inicio, nivel_alerta=nivel, alerta_pendente=False, **valor))
+    if linhas:
+        db.session.execute(insert(contadores), linhas)
+
+    for meta in metas:
+        meta.contadores_ok = True
+    db.session.commit()
+    return len(linhas)
+
+
+def ler_contadores(metas, mes_referencia):
+    """Progresso das metas no mês lido dos contadores (montados antes, se preciso)"""
+    reconstruir_contadores([meta for meta in metas if not meta.contadores_ok])
+    if not metas:
+        return {}
+
+    periodo_futuro = eh_periodo_futuro(mes_referencia)
+    coluna = contadores.c.valor_previsto if periodo_futuro else contadores.c.valor_pago
+    intervalos = {meta.id: intervalo_meta(meta.periodo, mes_referencia) for meta in metas}
+    valores = dict(
+        ((meta_id, inicio), valor)
+        for meta_id, inicio, valor in db.session.execute(
+            select(contadores.c.meta_id, contadores.c.inicio, coluna).where(
+                contadores.c.meta_id.in_(list(intervalos)),
+                contadores.c.inicio.in_({inicio for inicio, _ in intervalos.values()})
+            )
+        )
+    )
+
+    progressos = {}
+    for meta in metas:
+        inicio, fim = intervalos[meta.id]
+        total_gasto = valores.get((meta.id, inicio), 0)
+        progressos[meta.id] = montar_progresso(meta, total_gasto, inicio, fim, periodo_futuro)
+
+    _projetar(metas, progressos, mes_referencia)
+    return progressos
+
+
+@registrar_tratador
+def atualizar_contadores(conexao, linhas, sinal):
+    """Soma (ou subtrai) as despesas nos contadores das metas e marca os limites atingidos"""
+    metas = conexao.execute(
+        select(Meta.id, Meta.tipo, Meta.categoria_id, Meta.tag, Meta.periodo,
+               Meta.incluir_cartao, Meta.valor_limite, Meta.alertar_percentual)
+        .where(Meta.contadores_ok == True)
+    ).all()
+    if not metas:
+        return
+
+    deltas = {}
+    for linha in linhas:
+        if linha['tipo'] not in ('despesa', 'cartao_credito'):
+            continue
+        for meta in metas:
+            if not _linha_da_meta(meta, linha['categoria_id'], linha['tag'], linha['tipo']):
+                continue
+            for coluna, mes in (('valor_pago', _mes_pago(linha)), ('valor_previsto', mes_competencia(linha))):
+                if mes is None:
+                    continue
+                chave = (meta, intervalo_meta(meta.periodo, mes)[0])
+                deltas.setdefault(chave, {'valor_pago': 0, 'valor_previsto': 0})[coluna] += linha['valor']
+
+    insert_dialeto = insert_do_banco(conexao)
+    for (meta, inicio), delta in deltas.items():
+        limpar_detalhes(meta.id, inicio)
+
+        # INSERT ... ON CONFLICT em (meta, início): a primeira despesa do período em duas
+        # transações não cria o contador duas vezes; o RETURNING já traz o valor somado
+        comando = insert_dialeto(contadores).values(
+            meta_id=meta.id,
+            inicio=inicio,
+            valor_pago=sinal * delta['valor_pago'],
+            valor_previsto=sinal * delta['valor_previsto'],
+            nivel_alerta=0,
+            alerta_pendente=False
+        )
+        comando = comando.on_conflict_do_update(
+            index_elements=list(chave_contador.columns),
+            set_={
+                'valor_pago': contadores.c.valor_pago + comando.excluded.valor_pago,
+                'valor_previsto': contadores.c.valor_previsto + comando.excluded.valor_previsto
+            }
+        ).returning(contadores.c.valor_pago, contadores.c.nivel_alerta)
+        valor_pago, nivel_atual = conexao.execute(comando).one()
+
+        # Limite atingido: o nível só sobe, para não repetir o aviso a cada edição
+        if sinal > 0 and delta['valor_pago']:
+            nivel = nivel_progresso(calcular_percentual(valor_pago, meta.valor_limite), meta.alertar_percentual)
+            if nivel > nivel_atual:
+                filtro = and_(contadores.c.meta_id == meta.id, contadores.c.inicio == inicio)
+                conexao.execute(update(contadores).where(filtro).values(nivel_alerta=nivel, alerta_pendente=True))
+                logger.info(f"Meta {meta.id} atingiu {STATUS_NIVEL[nivel][0]} no período de {inicio}")
+
+
+def limpar_detalhes(meta_id=None, inicio=None):
+    """
+    Descarta, no commit da transação atual, os detalhes em cache da meta (de um período ou
+    de todos; sem meta, o cache inteiro). Antes do commit outra requisição ainda leria os
+    dados antigos e os colocaria de volta no cache.
+    """
+    db.session.info.setdefault('detalhes_metas', set()).add((meta_id, inicio))
+
+
+def _descartar_detalhes(pendentes):
+    with _trava_detalhes:
+        for chave in list(_detalhes_cache):
+            if any(meta_id in (None, chave[0]) and inicio in (None, chave[1]) for meta_id, inicio in pendentes):
+                del _detalhes_cache[chave]
+
+
+@event.listens_for(Session, 'after_commit')
+def _detalhes_confirmados(sessao):
+    pendentes = sessao.info.pop('detalhes_metas', None)
+    if pendentes:
+        _descartar_detalhes(pendentes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _detalhes_desfeitos(sessao):
+    sessao.info.pop('detalhes_metas', None)
+
+
+@event.listens_for(Categoria, 'after_update')
+@event.listens_for(Categoria, 'after_delete')
+@event.listens_for(Subcategoria, 'after_update')
+@event.listens_for(Subcategoria, 'after_delete')
+@event.listens_for(Cartao, 'after_update')
+@event.listens_for(Cartao, 'after_delete')
+def _nome_alterado(mapper, conexao, objeto):
+    # Os detalhes exibem nomes de categorias e cartões
+    limpar_detalhes()
+
+
+@event.listens_for(Lancamento, 'after_update')
+def _lancamento_alterado(mapper, conexao, lancamento):
+    # Mudanças nos campos somados limpam só as metas afetadas (atualizar_contadores); as demais
+    # colunas exibidas nos detalhes (descrição, etc.) não mudam o contador nem a versão do cache
+    estado = inspect(lancamento)
+    if any(estado.attrs[coluna.key].history.has_changes()
+           for coluna in mapper.column_attrs if coluna.key not in CAMPOS + ('valor',)):
+        limpar_detalhes()
+
+
+def _versao_detalhes(meta, data_inicio):
+    """Limites da meta e valores gravados no contador do período"""
+    valores = db.session.execute(
+        select(contadores.c.valor_pago, contadores.c.valor_previsto).where(
+            contadores.c.meta_id == meta.id, contadores.c.inicio == data_inicio
+        )
+    ).first()
+    return (meta.valor_limite, meta.alertar_percentual, meta.incluir_cartao, tuple(valores or ()))
+
+
+def detalhes_meta(meta, mes_referencia):
+    """
+    Despesas da meta no período, resumo por categoria e progresso, montados a partir de
+    uma única consulta das linhas. O resultado fica em cache até um lançamento da meta mudar.
+    """
+    data_inicio, fim = intervalo_meta(meta.periodo, mes_referencia)
+    periodo_futuro = eh_periodo_futuro(mes_referencia)
+    chave = (meta.id, data_inicio, periodo_futuro)
+
+    # Sem contadores o tratador não enxerga a meta e não limparia o cache
+    if not meta.contadores_ok:
+        reconstruir_contadores([meta])
+
+    versao = _versao_detalhes(meta, data_inicio)
+    with _trava_detalhes:
+        if chave in _detalhes_cache and _detalhes_cache[chave][0] == versao:
+            _detalhes_cache.move_to_end(chave)
+            return _detalhes_cache[chave][1]
+
+    todas_despesas = consulta_despesas_meta(meta, data_inicio, fim, periodo_futuro).options(
+        joinedload(Lancamento.categoria), joinedload(Lancamento.cartao)
+    ).all()
+
+    despesas = []
+    resumo_categorias = {}
+    total_gasto = 0
+    for despesa in todas_despesas:
+        total_gasto += despesa.valor
+
+        # Adicionar ao resumo por categoria
+        cat_nome = despesa.categoria.nome if despesa.categoria else 'Sem categoria'
+        resumo_categorias[cat_nome] = resumo_categorias.get(cat_nome, 0) + float(despesa.valor)
+
+        despesas.append({
+            'id': despesa.id,
+            'descricao': despesa.descricao,
+            'valor': float(despesa.valor),
+            'data': despesa.data_vencimento.strftime('%d/%m/%Y'),
+            'tipo': despesa.tipo,
+            'categoria': cat_nome,
+            'cartao': despesa.cartao.nome if despesa.cartao else None,
+            'status': despesa.status
+        })
+
+    # Ordenar despesas e categorias por valor (maior primeiro)
+    despesas.sort(key=lambda x: x['valor'], reverse=True)
+    resumo = [
+        {'categoria': cat, 'total': total}
+        for cat, total in sorted(resumo_categorias.items(), key=lambda x: x[1], reverse=True)
+    ]
+
+    resultado = {
+        'despesas': despesas,
+        'resumo': resumo,
+        'total': float(total_gasto),
+        'progresso': montar_progresso(meta, total_gasto, data_inicio, fim, periodo_futuro)
+    }
+    with _trava_detalhes:
+        _detalhes_cache[chave] = (versao, resultado)
+        _detalhes_cache.move_to_end(chave)
+        while len(_detalhes_cache) > DETALHES_MAXIMO:
+            _detalhes_cache.popitem(last=False)
+    return resultado
+
+
+def historico_meta(meta, meses=12):
+    """
+    Gasto x limite de cada período da meta nos últimos `meses` meses (até o mês corrente).
+    Uma consulta agrupada por mês traz os valores calculados; períodos já fechados
+    usam as fotos de metas_historico.
+    """
+    atual = mes_aberto()
+    janela = atual - relativedelta(months=meses - 1)
+    inicio = max(
+        intervalo_meta(meta.periodo, janela)[0],
+        intervalo_meta(meta.periodo, meta.data_inicio.replace(day=1))[0]
+    )
+    fim = intervalo_meta(meta.periodo, atual)[1]
+    if inicio >= fim:
+        return []
+
+    # Gasto por mês (pagamento para despesas, mês da fatura para cartão)
+    mes = _mes_da_despesa(False)
+    por_mes = consulta_despesas_meta(meta, inicio, fim, False).with_entities(
+        mes, func.sum(Lancamento.valor)
+    ).group_by(mes).all()
+
+    # Fotos dos períodos encerrados (todas as fotos do período têm o total final)
+    fotos = {
+        intervalo_meta(meta.periodo, foto.mes_referencia)[0]: foto
+        for foto in MetaHistorico.query.filter(
+            MetaHistorico.meta_id == meta.id,
+            MetaHistorico.mes_referencia >= inicio,
+            MetaHistorico.mes_referencia < fim,
+            MetaHistorico.status != 'em_andamento'
+        )
+    }
+
+    historico = []
+    periodo_inicio = inicio
+    while periodo_inicio < fim:
+        periodo_fim = intervalo_meta(meta.periodo, periodo_inicio)[1]
+        foto = fotos.get(periodo_inicio)
+        if foto is not None:
+            valor_gasto, valor_limite = foto.valor_gasto, foto.valor_limite
+        else:
+            valor_gasto = sum((v for m, v in por_mes if m is not None and periodo_inicio <= m < periodo_fim), 0)
+            valor_limite = meta.valor_limite
+        progresso = montar_progresso(meta, valor_gasto, periodo_inicio, periodo_fim, False, valor_limite=valor_limite)
+        historico.append({
+            'inicio': periodo_inicio.isoformat(),
+            'fim': progresso['data_fim'].isoformat(),
+            'rotulo': periodo_inicio.strftime('%m/%Y'),
+            'valor_gasto': float(valor_gasto),
+            'valor_limite': float(valor_limite),
+            'percentual': progresso['percentual'],
+            'status': progresso['status'],
+            'fechado': foto is not None
+        })
+        periodo_inicio = periodo_fim
+
+    return historico
+
+def fechar_mes(mes_referencia, ids_metas=None):
+    """
+    Grava a foto de cada meta ativa no mês (uma linha por meta e mês em metas_historico).
+    Quando o mês encerra o período da meta, as fotos do período recebem o total final e o
+    status (cumprida/excedida); metas sem renovação automática são encerradas nesse ponto.
+    ids_metas restringe o fechamento a essas metas.
+    """
+    # Metas que começam em qualquer dia do mês entram no fechamento dele
+    query = Meta.query.filter(
+        Meta.ativa == True,
+        Meta.data_inicio <= ultimo_dia(mes_referencia + relativedelta(months=1))
+    )
+    if ids_metas is not None:
+        query = query.filter(Meta.id.in_(ids_metas))
+    metas = query.all()
+    progressos = calcular_progresso_metas(metas, mes_referencia)
+    agora = datetime.now()
+
+    fotos = {
+        foto.meta_id: foto
+        for foto in MetaHistorico.query.filter(
+            MetaHistorico.meta_id.in_([meta.id for meta in metas]),
+            MetaHistorico.mes_referencia == mes_referencia
+        )
+    }
+
+    for meta in metas:
+        progresso = progressos[meta.id]
+        data_inicio, fim = intervalo_meta(meta.periodo, mes_referencia)
+        encerra_periodo = fim == mes_referencia + relativedelta(months=1)
+
+        if encerra_periodo:
+            status = 'cumprida' if progresso['valor_gasto'] <= meta.valor_limite else 'excedida'
+        else:
+            status = 'em_andamento'
+
+        foto = fotos.get(meta.id)
+        if foto is None:
+            foto = MetaHistorico(meta_id=meta.id, mes_referencia=mes_referencia)
+            db.session.add(foto)
+        foto.valor_gasto = progresso['valor_gasto']
+        foto.valor_limite = meta.valor_limite
+        foto.status = status
+        foto.data_fechamento = agora
+
+        if encerra_periodo:
+            # Meses anteriores do mesmo período passam a mostrar o total final
+            MetaHistorico.query.filter(
+                MetaHistorico.meta_id == meta.id,
+                MetaHistorico.mes_referencia >= data_inicio,
+                MetaHistorico.mes_referencia < mes_referencia
+            ).update({
+                'valor_gasto': progresso['valor_gasto'],
+                'valor_limite': meta.valor_limite,
+                'status': status,
+                'data_fechamento': agora
+            }, synchronize_session=False)
+
+            if not meta.renovar_automaticamente:
+                meta.ativa = False
+                meta.data_fim = ultimo_dia(fim)
+
+    db.session.commit()
+    return len(metas)
+
+
+def fechar_meses(desde, ate=None):
+    """Fecha, em ordem, todos os meses de desde até ate (padrão: o mês anterior ao corrente)"""
+    if ate is None:
+        ate = mes_aberto() - relativedelta(months=1)
+
+    mes = desde.replace(day=1)
+    fechados = []
+    while mes <= ate:
+        total = fechar_mes(mes)
+        fechados.append((mes, total))
+        mes += relativedelta(months=1)
+    return fechados
+
+
+def fechar_meses_pendentes():
+    """
+    Fecha os meses ainda não fechados de cada meta ativa: depois da sua última foto ou, sem
+    fotos, desde o mês do seu início (metas criadas depois com início retroativo também entram)
+    """
+    ate = mes_aberto() - relativedelta(months=1)
+    ultimas = dict(
+        db.session.query(MetaHistorico.meta_id, func.max(MetaHistorico.mes_referencia))
+        .group_by(MetaHistorico.meta_id).all()
+    )
+    pendentes = {}
+    for meta_id, data_inicio in db.session.query(Meta.id, Meta.data_inicio).filter(Meta.ativa == True):
+        ultimo = ultimas.get(meta_id)
+        pendentes[meta_id] = ultimo + relativedelta(months=1) if ultimo else data_inicio.replace(day=1)
+    if not pendentes:
+        return []
+
+    mes = min(pendentes.values())
+    fechados = []
+    while mes <= ate:
+        ids_metas = [meta_id for meta_id, desde in pendentes.items() if desde <= mes]
+        fechados.append((mes, fechar_mes(mes, ids_metas)))
+        mes += relativedelta(months=1)
+    return fechados
+
+
+def fechamento_mensal(app):
+    """Tarefa agendada: fecha o mês anterior (e qualquer mês que tenha ficado para trás)"""
+    with app.app_context():
+        try:
+            fechados = fechar_meses_pendentes()
+            for mes, total in fechados:
+                logger.info(f"Metas de {mes.strftime('%m/%Y')} fechadas: {total}")
+            return fechados
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro no fechamento mensal das metas: {str(e)}")
+            return []
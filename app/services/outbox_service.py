@@ -0,0 +1,186 @@
+# app/services/outbox_service.py
+# Fila de emails: rotas e tarefas só gravam em email_outbox; um grupo de threads
+# envia em lotes (uma conexão SMTP por lote), com novas tentativas espaçadas
+
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask_mail import Message
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import mail
+from app.models import db, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Tempo de reserva de um lote: se o processo cair no meio do envio, o lote volta à fila depois disso.
+# Enquanto o envio anda, a reserva dos emails restantes é renovada (ver _renovar_reserva)
+RESERVA = timedelta(minutes=5)
+
+# Espera entre buscas quando a fila está vazia (segundos)
+INTERVALO = 30
+
+_acordar = threading.Event()
+_parar = threading.Event()
+_trava_reserva = threading.Lock()
+_workers = []
+
+
+def enfileirar_email(assunto, corpo, destinatario):
+    """
+    Grava o email na fila. Não faz commit: o email entra na transação de quem chamou
+    e os workers são acordados quando ela for confirmada.
+    """
+    email = EmailOutbox(
+        destinatario=destinatario,
+        assunto=assunto,
+        corpo=corpo,
+        status='pendente',
+        tentativas=0,
+        proxima_tentativa=datetime.now()
+    )
+    db.session.add(email)
+    db.session.info['outbox_novo'] = True
+    return email
+
+
+@event.listens_for(Session, 'after_commit')
+def _email_confirmado(sessao):
+    if sessao.info.pop('outbox_novo', False):
+        _acordar.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _email_desfeito(sessao):
+    sessao.info.pop('outbox_novo', None)
+
+
+def _espera(tentativas, base):
+    """Backoff exponencial: base, 2x, 4x... limitado a 1 hora"""
+    return timedelta(seconds=min(base * 2 ** (tentativas - 1), 3600))
+
+
+def reservar_lote(limite):
+    """
+    Marca como 'enviando' até `limite` emails vencidos (pendentes ou com a reserva expirada)
+    e os devolve. SKIP LOCKED separa os lotes entre processos; a trava, entre as threads.
+    """
+    agora = datetime.now()
+    with _trava_reserva:
+        ids = [email_id for email_id, in db.session.query(EmailOutbox.id).filter(
+            EmailOutbox.status.in_(('pendente', 'enviando')),
+            EmailOutbox.proxima_tentativa <= agora
+        ).order_by(EmailOutbox.proxima_tentativa, EmailOutbox.id).limit(limite).with_for_update(skip_locked=True)]
+
+        if not ids:
+            db.session.rollback()
+            return []
+
+        db.session.query(EmailOutbox).filter(EmailOutbox.id.in_(ids)).update({
+            'status': 'enviando',
+            'proxima_tentativa': agora + RESERVA
+        }, synchronize_session=False)
+        db.session.commit()
+
+    return EmailOutbox.query.filter(EmailOutbox.id.in_(ids)).order_by(EmailOutbox.id).all()
+
+
+def _registrar_falha(email, erro, max_tentativas, backoff):
+    email.tentativas += 1
+    email.ultimo_erro = str(erro)
+    if email.tentativas >= max_tentativas:
+        email.status = 'falhou'
+        logger.error(f"Email {email.id} para {email.destinatario} desistido após {email.tentativas} tentativas: {erro}")
+    else:
+        email.status = 'pendente'
+        email.proxima_tentativa = datetime.now() + _espera(email.tentativas, backoff)
+        logger.warning(f"Falha ao enviar email {email.id} (tentativa {email.tentativas}): {erro}")
+
+
+def _renovar_reserva(emails):
+    """
+    Estende a reserva dos emails ainda não enviados do lote quando metade dela já passou,
+    para que um lote lento não volte à fila (e seja enviado de novo por outro worker)
+    """
+    agora = datetime.now()
+    if emails and emails[0].proxima_tentativa - agora < RESERVA / 2:
+        for email in emails:
+            email.proxima_tentativa = agora + RESERVA
+
+
+def enviar_lote(emails, max_tentativas=5, backoff=60):
+    """Envia os emails reservados usando uma única conexão SMTP e grava o resultado de cada um"""
+    pendentes = list(emails)
+    try:
+        with mail.connect() as conexao:
+            _renovar_reserva(pendentes)
+            db.session.commit()
+            while pendentes:
+                email = pendentes[0]
+                try:
+                    conexao.send(Message(
+                        subject=email.assunto,
+                        recipients=[email.destinatario],
+                        body=email.corpo
+                    ))
+                except Exception as e:
+                    _registrar_falha(email, e, max_tentativas, backoff)
+                else:
+                    email.status = 'enviado'
+                    email.tentativas += 1
+                    email.data_envio = datetime.now()
+                    email.ultimo_erro = None
+                    logger.info(f"Email {email.id} enviado para {email.destinatario}")
+                pendentes.pop(0)
+                _renovar_reserva(pendentes)
+                db.session.commit()
+    except Exception as e:
+        # Falha na conexão: o que não foi enviado volta para a fila
+        db.session.rollback()
+        for email in pendentes:
+            _registrar_falha(email, e, max_tentativas, backoff)
+        db.session.commit()
+
+
+def processar_fila(app):
+    """Envia lotes até a fila não ter mais emails vencidos. Retorna quantos foram processados."""
+    total = 0
+    with app.app_context():
+        while True:
+            emails = reservar_lote(app.config['OUTBOX_LOTE'])
+            if not emails:
+                return total
+            enviar_lote(emails, app.config['OUTBOX_MAX_TENTATIVAS'], app.config['OUTBOX_BACKOFF'])
+            total += len(emails)
+
+
+def _worker(app):
+    while not _parar.is_set():
+        try:
+            processar_fila(app)
+        except Exception as e:
+            logger.error(f"Erro no envio da fila de emails: {str(e)}")
+        _acordar.wait(INTERVALO)
+        _acordar.clear()
+
+
+def iniciar_envio_emails(app):
+    """Inicia as threads que esvaziam a fila de emails (uma vez por processo)"""
+    if any(worker.is_alive() for worker in _workers):
+        return
+
+    _parar.clear()
+    _workers.clear()
+    for numero in range(app.config['OUTBOX_WORKERS']):
+        worker = threading.Thread(target=_worker, args=(app,), name=f'email-outbox-{numero + 1}', daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+    atexit.register(parar_envio_emails)
+    logger.info(f"Envio de emails iniciado com {app.config['OUTBOX_WORKERS']} worker(s)")
+
+
+def parar_envio_emails():
+    _parar.set()
+    _acordar.set()
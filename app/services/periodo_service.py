@@ -0,0 +1,60 @@
+# app/services/periodo_service.py
+# Períodos de consulta como intervalos semiabertos [inicio, fim): a coluna de data é
+# comparada direto (>= inicio e < fim), sem extract(), e os índices podem ser usados
+
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import and_, true
+
+# Valores especiais do seletor de mês (visões por tag e por categoria)
+TODO_PERIODO = 0
+ANO_INTEIRO = -1
+
+# Meses de cada período de meta
+MESES_PERIODO = {
+    'mensal': 1,
+    'trimestral': 3,
+    'anual': 12,
+}
+
+
+def intervalo_mes(ano, mes):
+    """(primeiro dia do mês, primeiro dia do mês seguinte)"""
+    inicio = date(ano, mes, 1)
+    return inicio, inicio + relativedelta(months=1)
+
+
+def intervalo_ano(ano):
+    return date(ano, 1, 1), date(ano + 1, 1, 1)
+
+
+def intervalo_selecao(ano, mes):
+    """Intervalo do seletor: mês (mes > 0), ano inteiro (-1) ou todo o período (0 -> (None, None))"""
+    if mes == TODO_PERIODO:
+        return None, None
+    if mes == ANO_INTEIRO:
+        return intervalo_ano(ano)
+    return intervalo_mes(ano, mes)
+
+
+def intervalo_meta(periodo, mes_referencia):
+    """Mês, trimestre ou ano (conforme o período da meta) que contém o mês de referência"""
+    meses = MESES_PERIODO.get(periodo, 1)
+    mes_inicial = ((mes_referencia.month - 1) // meses) * meses + 1
+    inicio = date(mes_referencia.year, mes_inicial, 1)
+    return inicio, inicio + relativedelta(months=meses)
+
+
+def ultimo_dia(fim):
+    """Último dia incluído no intervalo (para exibição e para gerar as séries)"""
+    return fim - timedelta(days=1)
+
+
+def filtro_intervalo(coluna, inicio, fim):
+    """coluna >= inicio AND coluna < fim; limites None não filtram"""
+    condicoes = []
+    if inicio is not None:
+        condicoes.append(coluna >= inicio)
+    if fim is not None:
+        condicoes.append(coluna < fim)
+    return and_(*condicoes) if condicoes else true()
@@ -0,0 +1,190 @@
+# app/services/recorrencia_service.py
+# Séries recorrentes guardadas como regra e geradas sob demanda
+
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Lancamento, RegraRecorrencia
+from app.services.eventos_lancamento import nova_linha, inserir_em_lote
+from app.services.periodo_service import intervalo_selecao, ultimo_dia
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Incremento entre ocorrências e quantidade total da série (~5 anos)
+FREQUENCIAS = {
+    'mensal': (relativedelta(months=1), 60),
+    'anual': (relativedelta(years=1), 5),
+    'semanal': (timedelta(weeks=1), 260),
+    'quinzenal': (timedelta(weeks=2), 130),
+}
+
+# Quantos meses à frente as ocorrências ficam gravadas na tabela de lançamentos
+HORIZONTE_MESES = 12
+
+
+def horizonte():
+    """Último dia do período mantido gravado a partir de hoje"""
+    return date.today().replace(day=1) + relativedelta(months=HORIZONTE_MESES + 1) - timedelta(days=1)
+
+
+def fim_da_janela(ano, mes):
+    """Último dia do período do seletor (mês, ano inteiro) ou o horizonte (todo o período)"""
+    inicio, fim = intervalo_selecao(ano, mes)
+    if fim is None:
+        return horizonte()
+    return ultimo_dia(fim)
+
+
+def ocorrencias(regra, ate, inicio=0):
+    """
+    Gera (indice, data_vencimento, mes_inicial_cartao) das ocorrências até a data.
+    Cada data é calculada a partir da data inicial (inicio + i * incremento),
+    então o dia 31 não "escorrega" para 28 depois de fevereiro.
+    """
+    incremento = FREQUENCIAS[regra.frequencia][0]
+    i = inicio
+    while True:
+        data = regra.data_inicio + incremento * i
+        mes_inicial = regra.mes_inicial_cartao + incremento * i if regra.mes_inicial_cartao else None
+        if data > regra.data_fim:
+            return
+        # Despesas de cartão também entram na janela pelo mês da fatura
+        if data > ate and (mes_inicial is None or mes_inicial > ate):
+            return
+        yield i, data, mes_inicial
+        i += 1
+
+
+def criar_regra(tipo, frequencia, descricao, valor, conta, data_inicio, categoria_id=None,
+                subcategoria_id=None, tag=None, cartao_id=None, mes_inicial_cartao=None):
+    """Cria a série e grava apenas as ocorrências dentro do horizonte"""
+    incremento, total = FREQUENCIAS[frequencia]
+    regra = RegraRecorrencia(
+        tipo=tipo,
+        frequencia=frequencia,
+        data_inicio=data_inicio,
+        data_fim=data_inicio + incremento * (total - 1),
+        mes_inicial_cartao=mes_inicial_cartao,
+        descricao=descricao,
+        valor=valor,
+        conta_id=conta.id,
+        cartao_id=cartao_id,
+        categoria_id=categoria_id,
+        subcategoria_id=subcategoria_id,
+        tag=tag,
+        ocorrencias_geradas=0,
+        ativa=True
+    )
+    db.session.add(regra)
+    db.session.flush()
+
+    materializar(regra, horizonte())
+    return regra
+
+
+def materializar(regra, ate):
+    """Grava as ocorrências da série que ainda não existem até a data informada"""
+    conta = regra.conta
+    # Em contas de investimento despesas e receitas já nascem pagas
+    is_investimento = (regra.tipo != 'cartao_credito' and conta.tipo_conta
+                       and conta.tipo_conta.lower() == 'investimento')
+
+    lancamento_pai_id = None
+    if regra.ocorrencias_geradas > 0:
+        lancamento_pai_id = db.session.query(func.min(Lancamento.id)).filter(
+            Lancamento.regra_id == regra.id
+        ).scalar()
+
+    linhas = []
+    proximo = regra.ocorrencias_geradas
+    for i, data, mes_inicial in ocorrencias(regra, ate, regra.ocorrencias_geradas):
+        linhas.append(nova_linha(
+            descricao=regra.descricao,
+            valor=regra.valor,
+            tipo=regra.tipo,
+            conta_id=regra.conta_id,
+            cartao_id=regra.cartao_id,
+            categoria_id=regra.categoria_id,
+            subcategoria_id=regra.subcategoria_id,
+            data_vencimento=data,
+            data_pagamento=data if is_investimento else None,
+            mes_inicial_cartao=mes_inicial,
+            status='pago' if is_investimento else 'pendente',
+            recorrencia=regra.frequencia,
+            lancamento_pai_id=lancamento_pai_id,
+            regra_id=regra.id,
+            tag=regra.tag
+        ))
+        proximo = i + 1
+
+    # Todas as ocorrências em um único INSERT em lote
+    inserir_em_lote(linhas)
+
+    if is_investimento:
+        if regra.tipo == 'receita':
+            conta.saldo_atual += regra.valor * len(linhas)
+        else:
+            conta.saldo_atual -= regra.valor * len(linhas)
+
+    regra.ocorrencias_geradas = proximo
+    regra.materializado_ate = min(ate, regra.data_fim)
+    if regra.materializado_ate >= regra.data_fim:
+        regra.ativa = False
+
+
+def garantir_periodo(ate):
+    """
+    Garante que as ocorrências de todas as séries até a data estejam gravadas.
+    As regras ficam travadas até o commit; as que outra requisição já está gerando
+    são puladas (SKIP LOCKED) em vez de geradas de novo.
+    """
+    regras = RegraRecorrencia.query.filter(
+        RegraRecorrencia.ativa == True,
+        RegraRecorrencia.materializado_ate < ate
+    ).with_for_update(skip_locked=True).all()
+    if not regras:
+        return 0
+
+    try:
+        for regra in regras:
+            materializar(regra, ate)
+        db.session.commit()
+    except IntegrityError:
+        # Bancos sem trava de linha: a outra requisição gravou primeiro (índice único da série)
+        db.session.rollback()
+        logger.info(f"Ocorrências até {ate} já gravadas por outra requisição")
+        return 0
+    logger.info(f"Ocorrências geradas até {ate} para {len(regras)} série(s)")
+    return len(regras)
+
+
+def atualizar_modelo(lancamento):
+    """Aplica na série os valores editados ("editar todos") para as próximas ocorrências"""
+    regra = lancamento.regra
+    if not regra:
+        return
+    regra.valor = lancamento.valor
+    if lancamento.tipo != 'cartao_credito':
+        regra.conta_id = lancamento.conta_id
+    regra.categoria_id = lancamento.categoria_id
+    regra.subcategoria_id = lancamento.subcategoria_id
+    regra.tag = lancamento.tag
+
+
+def encerrar_regra(regra, data):
+    """Encerra a série antes da data ("excluir todos"): nada a partir dela será gerado"""
+    regra.data_fim = data - timedelta(days=1)
+    regra.ativa = False
+
+
+def estender_horizonte(app):
+    """Tarefa diária: mantém as séries gravadas até o horizonte a partir de hoje"""
+    with app.app_context():
+        try:
+            return garantir_periodo(horizonte())
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao gerar ocorrências recorrentes: {str(e)}")
+            return 0
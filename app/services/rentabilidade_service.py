@@ -0,0 +1,206 @@
+# app/services/rentabilidade_service.py
+# Rentabilidade das contas de investimento descontando aportes e resgates:
+# TWR (Modified Dietz entre saldos registrados), XIRR e rendimento acumulado
+
+from sqlalchemy import or_
+from app.models import db, Conta, Lancamento
+from app.services.investimentos_service import series_investimentos
+
+
+def _origem_destino(transferencias):
+    """
+    Cada transferência é gravada como duas linhas espelhadas, marcadas pelo sentido
+    ('saida' na conta de origem, 'entrada' na de destino). Devolve (data, origem, destino, valor)
+    uma vez por transferência, também quando uma das metades foi excluída.
+    """
+    grupos = {}
+    for linha in transferencias:
+        if linha.sentido == 'saida':
+            origem, destino = linha.conta_id, linha.conta_destino_id
+        else:
+            origem, destino = linha.conta_destino_id, linha.conta_id
+        chave = (linha.data_pagamento or linha.data_vencimento, origem, destino, linha.valor)
+        saidas, entradas = grupos.get(chave, (0, 0))
+        if linha.sentido == 'saida':
+            saidas += 1
+        else:
+            entradas += 1
+        grupos[chave] = (saidas, entradas)
+
+    # Pares completos contam uma vez; metades sem par contam sozinhas
+    return [
+        chave
+        for chave, (saidas, entradas) in grupos.items()
+        for _ in range(max(saidas, entradas))
+    ]
+
+
+def fluxos_externos(ids_contas):
+    """
+    Aportes (+) e resgates (-) de cada conta: {conta_id: [(data, valor)]}.
+    Transferências entram e saem; receitas e despesas pagas na própria conta também
+    são dinheiro de fora (não rendimento).
+    """
+    fluxos = {conta_id: [] for conta_id in ids_contas}
+    if not ids_contas:
+        return fluxos
+
+    # Só as colunas usadas (linhas nomeadas, com acesso por atributo), sem montar objetos do ORM
+    linhas = db.session.query(
+        Lancamento.tipo,
+        Lancamento.sentido,
+        Lancamento.conta_id,
+        Lancamento.conta_destino_id,
+        Lancamento.data_pagamento,
+        Lancamento.data_vencimento,
+        Lancamento.valor
+    ).filter(
+        Lancamento.status == 'pago',
+        or_(
+            Lancamento.conta_id.in_(ids_contas),
+            (Lancamento.tipo == 'transferencia') & Lancamento.conta_destino_id.in_(ids_contas)
+        )
+    ).all()
+
+    for data, origem, destino, valor in _origem_destino([l for l in linhas if l.tipo == 'transferencia']):
+        if destino in fluxos:
+            fluxos[destino].append((data, valor))
+        if origem in fluxos:
+            fluxos[origem].append((data, -valor))
+
+    for linha in linhas:
+        if linha.tipo in ('receita', 'despesa') and linha.conta_id in fluxos:
+            sinal = 1 if linha.tipo == 'receita' else -1
+            fluxos[linha.conta_id].append((linha.data_pagamento or linha.data_vencimento, sinal * linha.valor))
+
+    for lista in fluxos.values():
+        lista.sort()
+    return fluxos
+
+
+def _dietz(valor_inicial, valor_final, fluxos, inicio, fim):
+    """Retorno do período (inicio, fim] pelo Modified Dietz (fluxos ponderados pelo tempo restante)"""
+    dias = (fim - inicio).days
+    liquido = sum(valor for _, valor in fluxos)
+    ponderado = sum(valor * (fim - data).days / dias for data, valor in fluxos)
+    base = valor_inicial + ponderado
+    if base <= 0:
+        return 0.0
+    return (valor_final - valor_inicial - liquido) / base
+
+
+def xirr(fluxos, chute=0.1):
+    """
+    Taxa anual que zera o valor presente dos fluxos [(data, valor)] (convenção 365 dias).
+    Newton a partir do chute; se não convergir, bissecção. None se não houver solução.
+    """
+    if len(fluxos) < 2 or all(v >= 0 for _, v in fluxos) or all(v <= 0 for _, v in fluxos):
+        return None
+    inicio = fluxos[0][0]
+    prazos = [((data - inicio).days / 365.0, valor) for data, valor in fluxos]
+
+    def vpl(taxa):
+        return sum(valor / (1 + taxa) ** t for t, valor in prazos)
+
+    def derivada(taxa):
+        return sum(-t * valor / (1 + taxa) ** (t + 1) for t, valor in prazos)
+
+    taxa = chute
+    for _ in range(50):
+        d = derivada(taxa)
+        if d == 0:
+            break
+        nova = taxa - vpl(taxa) / d
+        if nova <= -1:
+            break
+        if abs(nova - taxa) < 1e-10:
+            return nova
+        taxa = nova
+
+    # Bissecção: procurar um intervalo com troca de sinal
+    baixo, alto = -0.9999, 1.0
+    while vpl(baixo) * vpl(alto) > 0:
+        alto *= 2
+        if alto > 1e6:
+            return None
+    for _ in range(200):
+        meio = (baixo + alto) / 2
+        if vpl(baixo) * vpl(meio) <= 0:
+            alto = meio
+        else:
+            baixo = meio
+        if alto - baixo < 1e-10:
+            break
+    return (baixo + alto) / 2
+
+
+def calcular_retornos(pontos, fluxos):
+    """
+    Retornos de uma série de saldos [(data, saldo)] com os fluxos externos [(data, valor)].
+    Fluxos no dia de um saldo registrado entram no período que termina nesse dia.
+    """
+    if len(pontos) < 2:
+        return None
+    pontos = [(data, float(saldo)) for data, saldo in pontos]
+    fluxos = [(data, float(valor)) for data, valor in fluxos if pontos[0][0] < data <= pontos[-1][0]]
+
+    serie = [{'data': pontos[0][0].strftime('%d/%m/%Y'), 'saldo': pontos[0][1], 'twr_acumulado': 0.0}]
+    acumulado = 1.0
+    i = 0
+    for (inicio, valor_inicial), (fim, valor_final) in zip(pontos, pontos[1:]):
+        periodo = []
+        while i < len(fluxos) and fluxos[i][0] <= fim:
+            periodo.append(fluxos[i])
+            i += 1
+        acumulado *= 1 + _dietz(valor_inicial, valor_final, periodo, inicio, fim)
+        serie.append({
+            'data': fim.strftime('%d/%m/%Y'),
+            'saldo': valor_final,
+            'twr_acumulado': (acumulado - 1) * 100
+        })
+
+    inicio, valor_inicial = pontos[0]
+    fim, valor_final = pontos[-1]
+    dias = (fim - inicio).days
+    aportes = sum(valor for _, valor in fluxos if valor > 0)
+    liquido = sum(valor for _, valor in fluxos)
+    ganho = valor_final - valor_inicial - liquido
+    twr = acumulado - 1
+
+    # Fluxos do ponto de vista do investidor: aporte sai do bolso (-), saldo final volta (+)
+    taxa = xirr([(inicio, -valor_inicial)] + [(data, -valor) for data, valor in fluxos] + [(fim, valor_final)])
+
+    return {
+        'inicio': inicio.strftime('%d/%m/%Y'),
+        'fim': fim.strftime('%d/%m/%Y'),
+        'saldo_inicial': valor_inicial,
+        'saldo_final': valor_final,
+        'aportes_liquidos': liquido,
+        'rendimento': ganho,
+        'rendimento_percentual': (ganho / (valor_inicial + aportes) * 100) if valor_inicial + aportes > 0 else 0.0,
+        'twr': twr * 100,
+        'twr_anualizado': ((1 + twr) ** (365.0 / dias) - 1) * 100 if dias >= 365 and twr > -1 else None,
+        'xirr': taxa * 100 if taxa is not None else None,
+        'serie': serie
+    }
+
+
+def retornos_investimentos():
+    """Retornos de cada conta de investimento e do consolidado"""
+    ids_contas = [conta_id for conta_id, in db.session.query(Conta.id).filter(Conta.tipo_conta == 'Investimento')]
+    series = series_investimentos()
+    fluxos = fluxos_externos(ids_contas)
+
+    contas = {
+        conta_id: calcular_retornos(series['historicos'].get(conta_id, []), fluxos[conta_id])
+        for conta_id in ids_contas
+    }
+
+    # Transferências entre duas contas de investimento se anulam na soma
+    todos = sorted(fluxo for lista in fluxos.values() for fluxo in lista)
+    consolidado = calcular_retornos(series['consolidado'], todos)
+
+    return {
+        'contas': contas,
+        'consolidado': consolidado
+    }
@@ -0,0 +1,103 @@
+# app/services/resumo_service.py
+# Mantém a tabela resumo_mensal sincronizada com os lançamentos
+
+from sqlalchemy import select, insert, delete, func, extract, cast, Integer, and_
+from app.models import db, Lancamento, ResumoMensal
+from app.services.eventos_lancamento import registrar_tratador, somar_deltas
+import logging
+
+logger = logging.getLogger(__name__)
+
+tabela = ResumoMensal.__table__
+indice_chave = next(indice for indice in tabela.indexes if indice.name == 'ux_resumo_mensal_chave')
+
+# Colunas que identificam uma linha do resumo
+CHAVE = ('ano', 'mes', 'conta_id', 'categoria_id', 'subcategoria_id', 'tipo', 'status')
+
+
+def _chave(linha):
+    """Monta a chave do resumo a partir de uma linha de lançamento"""
+    data = linha['data_vencimento']
+    return (data.year, data.month, linha['conta_id'], linha['categoria_id'],
+            linha['subcategoria_id'], linha['tipo'], linha['status'])
+
+
+@registrar_tratador
+def atualizar_resumo(conexao, linhas, sinal):
+    """Aplica no resumo as somas e contagens das linhas que entraram ou saíram"""
+    deltas = {}
+    for linha in linhas:
+        chave = _chave(linha)
+        valor, quantidade = deltas.get(chave, (0, 0))
+        deltas[chave] = (valor + linha['valor'], quantidade + linha['quantidade'])
+
+    # INSERT ... ON CONFLICT na chave única: duas transações somando na mesma linha
+    # nova não criam linhas repetidas
+    somar_deltas(conexao, tabela, indice_chave, CHAVE, deltas, sinal)
+
+
+def _consulta_agregada():
+    """SELECT que calcula o resumo completo diretamente da tabela de lançamentos"""
+    ano = cast(extract('year', Lancamento.data_vencimento), Integer)
+    mes = cast(extract('month', Lancamento.data_vencimento), Integer)
+    return select(
+        ano.label('ano'),
+        mes.label('mes'),
+        Lancamento.conta_id,
+        Lancamento.categoria_id,
+        Lancamento.subcategoria_id,
+        Lancamento.tipo,
+        Lancamento.status,
+        func.sum(Lancamento.valor).label('valor_total'),
+        func.count(Lancamento.id).label('quantidade')
+    ).group_by(
+        ano, mes, Lancamento.conta_id, Lancamento.categoria_id,
+        Lancamento.subcategoria_id, Lancamento.tipo, Lancamento.status
+    )
+
+
+def reconstruir_resumo():
+    """Apaga e recalcula todo o resumo em uma única instrução INSERT ... SELECT"""
+    db.session.execute(delete(tabela))
+    db.session.execute(
+        insert(tabela).from_select(
+            list(CHAVE) + ['valor_total', 'quantidade'],
+            _consulta_agregada()
+        )
+    )
+    db.session.commit()
+
+    total = db.session.query(func.count(ResumoMensal.id)).scalar()
+    logger.info(f"Resumo mensal reconstruído: {total} linhas")
+    return total
+
+
+def verificar_resumo():
+    """Compara o resumo gravado com o recalculado e retorna as diferenças"""
+    esperado = {
+        tuple(l[:7]): (l.valor_total, l.quantidade)
+        for l in db.session.execute(_consulta_agregada())
+    }
+    gravado = {
+        tuple(getattr(r, c) for c in CHAVE): (r.valor_total, r.quantidade)
+        for r in ResumoMensal.query.all()
+    }
+
+    divergencias = []
+    for chave in set(esperado) | set(gravado):
+        if esperado.get(chave, (0, 0)) != gravado.get(chave, (0, 0)):
+            divergencias.append({
+                'chave': dict(zip(CHAVE, chave)),
+                'esperado': esperado.get(chave, (0, 0)),
+                'gravado': gravado.get(chave, (0, 0))
+            })
+    return divergencias
+
+
+def filtro_periodo(ano, mes=None):
+    """Filtro do resumo para um mês (mes > 0), um ano (mes=None) ou todo o período (ano=None)"""
+    if ano is None:
+        return True
+    if mes:
+        return and_(ResumoMensal.ano == ano, ResumoMensal.mes == mes)
+    return ResumoMensal.ano == ano
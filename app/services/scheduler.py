@@ -2,6 +2,7 @@
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from datetime import datetime
 import logging
 import atexit
 import os
@@ -17,6 +18,10 @@ def iniciar_scheduler(app):
     """
     # Importar aqui para evitar importação circular
     from app.services.email_service import enviar_alertas_diarios
+    from app.services.recorrencia_service import estender_horizonte
+    from app.services.cubo_service import atualizar_cubo
+    from app.services.metas_service import fechamento_mensal
+    from app.services.outbox_service import iniciar_envio_emails
     
     # Verificar se estamos em modo debug e se é o processo principal
     # Para evitar que o scheduler rode duas vezes em modo debug
@@ -27,6 +32,35 @@ def iniciar_scheduler(app):
         # Limpar jobs existentes
         scheduler.remove_all_jobs()
         
+        # Gerar as ocorrências das séries recorrentes que entraram no horizonte (antes dos alertas)
+        scheduler.add_job(
+            func=lambda: estender_horizonte(app),
+            trigger=CronTrigger(hour=0, minute=30),
+            id='recorrencias_diarias',
+            name='Gerar ocorrências recorrentes',
+            replace_existing=True
+        )
+        
+        # Fechar as metas do mês anterior (fotos em metas_historico)
+        scheduler.add_job(
+            func=lambda: fechamento_mensal(app),
+            trigger=CronTrigger(day=1, hour=0, minute=45),
+            id='fechamento_metas',
+            name='Fechar metas do mês anterior',
+            replace_existing=True
+        )
+        
+        # Montar o cubo de relatórios se ainda não foi carregado (depois disso ele é
+        # mantido pelos eventos de lançamento); roda também logo ao iniciar
+        scheduler.add_job(
+            func=lambda: atualizar_cubo(app),
+            trigger=CronTrigger(minute='*/15'),
+            next_run_time=datetime.now(),
+            id='cubo_relatorios',
+            name='Atualizar cubo de relatórios',
+            replace_existing=True
+        )
+        
         # Agendar envio de alertas diários às 9h
         scheduler.add_job(
             func=lambda: enviar_alertas_diarios(app),
@@ -44,6 +78,9 @@ def iniciar_scheduler(app):
             # Registrar função para parar o scheduler quando a aplicação encerrar
             atexit.register(lambda: scheduler.shutdown())
         
+        # Threads que enviam os emails da fila (email_outbox)
+        iniciar_envio_emails(app)
+        
         # Listar jobs agendados
         jobs = scheduler.get_jobs()
         logger.info(f"Jobs agendados: {len(jobs)}")
@@ -0,0 +1,103 @@
+# benchmarks/bench_insercao_serie.py
+# Compara a gravação de uma série (ex: 260 lançamentos semanais) pelo ORM, um objeto
+# por linha, com o INSERT em lote (RETURNING do pai + executemany dos filhos).
+#
+# Uso: python benchmarks/bench_insercao_serie.py [quantidade] [repeticoes]
+# Por padrão usa SQLite em memória; defina BENCH_DATABASE_URI para medir em outro banco
+# (cada rodada é desfeita com rollback).
+
+import os
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ['DATABASE_URI'] = os.getenv('BENCH_DATABASE_URI', 'sqlite:///:memory:')
+
+from app import create_app
+from app.models import db, Conta, Categoria, Lancamento
+from app.services.eventos_lancamento import nova_linha, inserir_em_lote
+
+
+def serie(conta_id, categoria_id, quantidade):
+    """Datas e campos da série usados pelos dois caminhos"""
+    inicio = date.today()
+    return [
+        dict(
+            descricao='Benchmark',
+            valor=Decimal('50.00'),
+            tipo='despesa',
+            conta_id=conta_id,
+            categoria_id=categoria_id,
+            data_vencimento=inicio + timedelta(weeks=i),
+            status='pendente',
+            recorrencia='semanal',
+            tag='bench'
+        )
+        for i in range(quantidade)
+    ]
+
+
+def caminho_orm(linhas):
+    """Caminho antigo: pai com flush e um objeto do ORM por filho"""
+    pai = Lancamento(**linhas[0])
+    db.session.add(pai)
+    db.session.flush()
+    for linha in linhas[1:]:
+        db.session.add(Lancamento(lancamento_pai_id=pai.id, **linha))
+    db.session.flush()
+
+
+def caminho_lote(linhas):
+    """Caminho novo: duas instruções por série"""
+    inserir_em_lote([nova_linha(**linha) for linha in linhas])
+    db.session.flush()
+
+
+def medir(funcao, linhas, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(linhas)
+        tempos.append(time.perf_counter() - inicio)
+        db.session.rollback()
+    tempos.sort()
+    return tempos[len(tempos) // 2]
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 260
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    app = create_app()
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            db.create_all()
+
+        conta = Conta(nome='Conta Benchmark', tipo_conta='Corrente', saldo_inicial=0, saldo_atual=0)
+        categoria = Categoria(nome='Categoria Benchmark', tipo='Despesa')
+        db.session.add_all([conta, categoria])
+        db.session.commit()
+
+        try:
+            linhas = serie(conta.id, categoria.id, quantidade)
+            # Aquecimento (compilação das instruções e cache do SQLAlchemy)
+            medir(caminho_orm, linhas, 1)
+            medir(caminho_lote, linhas, 1)
+
+            orm = medir(caminho_orm, linhas, repeticoes)
+            lote = medir(caminho_lote, linhas, repeticoes)
+
+            print(f"Banco: {db.engine.dialect.name} | série de {quantidade} lançamentos | mediana de {repeticoes} rodadas")
+            print(f"ORM (um objeto por linha): {orm * 1000:8.1f} ms")
+            print(f"INSERT em lote:            {lote * 1000:8.1f} ms")
+            print(f"Ganho:                     {orm / lote:8.1f}x")
+        finally:
+            db.session.delete(db.session.get(Conta, conta.id))
+            db.session.delete(db.session.get(Categoria, categoria.id))
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+# benchmarks/explain_indices.py
+# Confere com EXPLAIN que as consultas mais frequentes de lançamentos usam os índices
+# compostos/parciais definidos em Lancamento.__table_args__.
+#
+# Uso: python benchmarks/explain_indices.py [quantidade]
+# Gera uma massa sintética (200 mil lançamentos por padrão), roda ANALYZE e imprime o
+# plano de cada consulta com OK/FALHOU. Por padrão usa um arquivo SQLite temporário;
+# defina BENCH_DATABASE_URI para conferir no PostgreSQL (use um banco descartável e vazio:
+# as tabelas são criadas e os dados ficam gravados).
+
+import os
+import sys
+import random
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+ARQUIVO_SQLITE = os.path.join(tempfile.gettempdir(), 'explain_indices.db')
+os.environ['DATABASE_URI'] = os.getenv('BENCH_DATABASE_URI', f'sqlite:///{ARQUIVO_SQLITE}')
+
+from sqlalchemy import select, insert, update, func, text, or_, and_
+from app import create_app
+from app.models import db, Conta, Cartao, Categoria, Lancamento, RegraRecorrencia
+
+CONTAS = 10
+CARTOES = 5
+CATEGORIAS = 20
+REGRAS = 500
+TAGS = ['viagem', 'casa', 'saude', 'carro', 'presentes', 'estudos', 'pets', 'obra']
+INICIO = date(2020, 1, 1)
+DIAS = 6 * 365
+LOTE = 5000
+
+
+def criar_cadastros():
+    """Contas (as duas últimas de investimento), cartões, categorias e séries"""
+    contas = [
+        Conta(nome=f'Conta {i}', tipo_conta='Investimento' if i >= CONTAS - 2 else 'Corrente',
+              saldo_inicial=0, saldo_atual=0)
+        for i in range(CONTAS)
+    ]
+    categorias = [Categoria(nome=f'Categoria {i}', tipo='Despesa') for i in range(CATEGORIAS)]
+    db.session.add_all(contas + categorias)
+    db.session.flush()
+
+    cartoes = [
+        Cartao(nome=f'Cartão {i}', conta_id=contas[i].id, dia_vencimento=10, ativo=True)
+        for i in range(CARTOES)
+    ]
+    regras = [
+        RegraRecorrencia(tipo='despesa', frequencia='mensal', data_inicio=INICIO,
+                         data_fim=INICIO + timedelta(days=DIAS), descricao=f'Série {i}',
+                         valor=Decimal('10.00'), conta_id=contas[i % CONTAS].id,
+                         ocorrencias_geradas=0, ativa=False)
+        for i in range(REGRAS)
+    ]
+    db.session.add_all(cartoes + regras)
+    db.session.commit()
+    return ([c.id for c in contas], [c.id for c in cartoes],
+            [c.id for c in categorias], [r.id for r in regras])
+
+
+def gerar_linhas(quantidade, contas, cartoes, categorias, regras):
+    """Distribuição próxima do uso real: metade despesas, um quarto cartão"""
+    aleatorio = random.Random(42)
+    correntes, investimentos = contas[:-2], contas[-2:]
+    # Ocorrências das séries: no máximo uma por regra e mês (índice único em regra_id + vencimento),
+    # sorteadas sem repetição; esgotadas as vagas, os demais lançamentos ficam avulsos
+    meses = DIAS // 365 * 12
+    ocorrencias = [(regra, mes) for regra in regras for mes in range(meses)]
+    aleatorio.shuffle(ocorrencias)
+    for _ in range(quantidade):
+        vencimento = INICIO + timedelta(days=aleatorio.randrange(DIAS))
+        regra_id = None
+        if ocorrencias and aleatorio.random() < 0.2:
+            regra_id, mes = ocorrencias.pop()
+            vencimento = date(INICIO.year + mes // 12, mes % 12 + 1, 1 + regra_id % 28)
+        sorteio = aleatorio.random()
+        linha = dict(
+            descricao='Sintético',
+            valor=Decimal(aleatorio.randrange(100, 50000)) / 100,
+            tipo='despesa',
+            conta_id=aleatorio.choice(correntes),
+            cartao_id=None,
+            conta_destino_id=None,
+            categoria_id=aleatorio.choice(categorias),
+            data_vencimento=vencimento,
+            data_pagamento=None,
+            mes_inicial_cartao=None,
+            status='pendente',
+            recorrencia='unica',
+            tag=aleatorio.choice(TAGS) if aleatorio.random() < 0.1 else None,
+            regra_id=regra_id
+        )
+        if sorteio < 0.15:
+            linha['tipo'] = 'receita'
+        elif sorteio < 0.40:
+            linha['tipo'] = 'cartao_credito'
+            linha['cartao_id'] = aleatorio.choice(cartoes)
+            linha['mes_inicial_cartao'] = vencimento.replace(day=1)
+        elif sorteio < 0.50:
+            linha['tipo'] = 'transferencia'
+            linha['conta_destino_id'] = aleatorio.choice(investimentos)
+        if vencimento < date.today() and linha['tipo'] != 'cartao_credito':
+            linha['status'] = 'pago'
+            linha['data_pagamento'] = vencimento
+        yield linha
+
+
+def popular(quantidade):
+    contas, cartoes, categorias, regras = criar_cadastros()
+    tabela = Lancamento.__table__
+    lote = []
+    for linha in gerar_linhas(quantidade, contas, cartoes, categorias, regras):
+        lote.append(linha)
+        if len(lote) == LOTE:
+            db.session.execute(insert(tabela), lote)
+            lote = []
+    if lote:
+        db.session.execute(insert(tabela), lote)
+
+    # Cada série aponta para a primeira ocorrência, como em inserir_em_lote
+    serie = tabela.alias('serie')
+    primeiro = select(func.min(serie.c.id)).where(
+        serie.c.regra_id == tabela.c.regra_id
+    ).scalar_subquery()
+    db.session.execute(update(tabela).where(tabela.c.regra_id.isnot(None)).values(lancamento_pai_id=primeiro))
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    return contas, cartoes, regras
+
+
+def consultas(contas, cartoes, regras):
+    """(descrição, consulta, índice esperado) no formato usado pelas rotas e serviços"""
+    primeiro_dia, proximo_mes = date(2024, 3, 1), date(2024, 4, 1)
+    serie = select(func.min(Lancamento.id)).where(Lancamento.regra_id == regras[0]).scalar_subquery()
+    return [
+        ('Dashboard: receitas do mês', select(Lancamento).where(
+            Lancamento.tipo == 'receita',
+            Lancamento.conta_id.in_(contas[:-2]),
+            Lancamento.data_vencimento >= primeiro_dia,
+            Lancamento.data_vencimento < proximo_mes
+        ), 'ix_lancamentos_tipo_conta_vencimento'),
+        ('Extrato/fatura do cartão', select(Lancamento).where(
+            Lancamento.tipo == 'cartao_credito',
+            Lancamento.cartao_id == cartoes[0],
+            Lancamento.mes_inicial_cartao >= primeiro_dia,
+            Lancamento.mes_inicial_cartao < proximo_mes
+        ), 'ix_lancamentos_cartao_mes_inicial'),
+        ('Visão por tag', select(Lancamento).where(
+            Lancamento.tag == 'viagem',
+            Lancamento.mes_competencia >= primeiro_dia,
+            Lancamento.mes_competencia < proximo_mes
+        ), 'ix_lancamentos_tag_competencia'),
+        ('Editar futuros da série (regra)', select(Lancamento.id).where(
+            Lancamento.regra_id == regras[0],
+            Lancamento.data_vencimento >= primeiro_dia
+        ), 'ux_lancamentos_regra_vencimento'),
+        ('Editar futuros da série (pai)', select(Lancamento.id).where(
+            Lancamento.lancamento_pai_id == serie,
+            Lancamento.data_vencimento >= primeiro_dia
+        ), 'ix_lancamentos_pai_vencimento'),
+        ('Metas: despesas pagas no período', select(Lancamento).where(
+            Lancamento.tipo == 'despesa',
+            Lancamento.status == 'pago',
+            Lancamento.data_pagamento >= primeiro_dia,
+            Lancamento.data_pagamento <= proximo_mes - timedelta(days=1)
+        ), 'ix_lancamentos_pagos_tipo_pagamento'),
+        ('Dashboard: aportes em investimentos', select(
+            Lancamento.conta_destino_id, func.sum(Lancamento.valor)
+        ).where(
+            Lancamento.tipo == 'transferencia',
+            Lancamento.conta_destino_id.in_(contas[-2:]),
+            Lancamento.data_vencimento >= primeiro_dia,
+            Lancamento.data_vencimento < proximo_mes,
+            Lancamento.status != 'cancelado'
+        ).group_by(Lancamento.conta_destino_id), 'ix_lancamentos_transferencia_destino'),
+        ('Dashboard: gastos do mês por categoria', select(
+            Lancamento.categoria_id, func.sum(Lancamento.valor)
+        ).where(
+            Lancamento.mes_competencia == primeiro_dia,
+            Lancamento.tipo.in_(['despesa', 'cartao_credito']),
+            Lancamento.status != 'cancelado'
+        ).group_by(Lancamento.categoria_id), 'ix_lancamentos_competencia_tipo_categoria'),
+        ('Listagem paginada (cursor)', select(Lancamento.id, Lancamento.data_vencimento).where(
+            Lancamento.data_vencimento <= proximo_mes,
+            or_(Lancamento.data_vencimento < primeiro_dia,
+                and_(Lancamento.data_vencimento == primeiro_dia, Lancamento.id < 1000))
+        ).order_by(Lancamento.data_vencimento.desc(), Lancamento.id.desc()).limit(51),
+         'ix_lancamentos_vencimento_id'),
+    ]
+
+
+def plano(consulta):
+    """Linhas do plano de execução no dialeto em uso"""
+    sql = str(consulta.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    if db.engine.dialect.name == 'sqlite':
+        return [linha[-1] for linha in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+    return [linha[0] for linha in db.session.execute(text('EXPLAIN ' + sql))]
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    if os.path.exists(ARQUIVO_SQLITE):
+        os.remove(ARQUIVO_SQLITE)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        print(f"Banco: {db.engine.dialect.name} | gerando {quantidade} lançamentos...")
+        contas, cartoes, regras = popular(quantidade)
+
+        # Índice renomeado no modelo e esquecido aqui: falha logo, sem precisar ler os planos
+        indices = {indice.name for indice in Lancamento.__table__.indexes}
+        esperados = consultas(contas, cartoes, regras)
+        inexistentes = sorted({indice for _, _, indice in esperados} - indices)
+        if inexistentes:
+            print(f"Índices esperados que não existem em Lancamento: {', '.join(inexistentes)}")
+            return 1
+
+        falhas = 0
+        for descricao, consulta, indice in esperados:
+            linhas = plano(consulta)
+            usou = any(indice in linha for linha in linhas)
+            falhas += not usou
+            print(f"\n[{'OK' if usou else 'FALHOU'}] {descricao} -> {indice}")
+            for linha in linhas:
+                print(f"    {linha}")
+
+        print(f"\n{falhas} consulta(s) sem o índice esperado")
+        return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
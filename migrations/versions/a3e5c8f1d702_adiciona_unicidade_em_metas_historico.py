@@ -0,0 +1,28 @@
+"""Adiciona constraint única meta_id + mes_referencia em metas_historico
+
+Revision ID: a3e5c8f1d702
+Revises: f2d84a6c1b95
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e5c8f1d702'
+down_revision = 'f2d84a6c1b95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # O fechamento mensal grava uma foto por meta e mês; a constraint também serve de índice
+    # para as leituras do histórico (meta_id, mes_referencia)
+    with op.batch_alter_table('metas_historico', schema=None) as batch_op:
+        batch_op.create_unique_constraint('_meta_mes_uc', ['meta_id', 'mes_referencia'])
+
+
+def downgrade():
+    with op.batch_alter_table('metas_historico', schema=None) as batch_op:
+        batch_op.drop_constraint('_meta_mes_uc', type_='unique')
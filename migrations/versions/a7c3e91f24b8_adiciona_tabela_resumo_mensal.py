@@ -0,0 +1,53 @@
+"""Adiciona tabela resumo_mensal com somas pré-agregadas dos lançamentos
+
+Revision ID: a7c3e91f24b8
+Revises: e55e38ba4c79
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e91f24b8'
+down_revision = 'e55e38ba4c79'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resumo_mensal',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ano', sa.Integer(), nullable=False),
+    sa.Column('mes', sa.Integer(), nullable=False),
+    sa.Column('conta_id', sa.Integer(), nullable=False),
+    sa.Column('categoria_id', sa.Integer(), nullable=True),
+    sa.Column('subcategoria_id', sa.Integer(), nullable=True),
+    sa.Column('tipo', sa.String(length=20), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('valor_total', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['categoria_id'], ['categorias.id'], ),
+    sa.ForeignKeyConstraint(['conta_id'], ['contas.id'], ),
+    sa.ForeignKeyConstraint(['subcategoria_id'], ['subcategorias.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_resumo_mensal_chave', 'resumo_mensal',
+                    ['ano', 'mes', 'conta_id', 'categoria_id', 'subcategoria_id', 'tipo', 'status'])
+
+    # Carga inicial a partir dos lançamentos existentes (equivale a "flask resumo reconstruir")
+    op.execute("""
+        INSERT INTO resumo_mensal (ano, mes, conta_id, categoria_id, subcategoria_id, tipo, status, valor_total, quantidade)
+        SELECT CAST(EXTRACT(YEAR FROM data_vencimento) AS INTEGER),
+               CAST(EXTRACT(MONTH FROM data_vencimento) AS INTEGER),
+               conta_id, categoria_id, subcategoria_id, tipo, status,
+               SUM(valor), COUNT(id)
+        FROM lancamentos
+        GROUP BY 1, 2, conta_id, categoria_id, subcategoria_id, tipo, status
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_resumo_mensal_chave', table_name='resumo_mensal')
+    op.drop_table('resumo_mensal')
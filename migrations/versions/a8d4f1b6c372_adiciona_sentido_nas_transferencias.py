@@ -0,0 +1,51 @@
+"""Adiciona campo sentido (saida/entrada) nas transferências
+
+Revision ID: a8d4f1b6c372
+Revises: f7a2c9e4b650
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d4f1b6c372'
+down_revision = 'f7a2c9e4b650'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('lancamentos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sentido', sa.String(length=10), nullable=True))
+
+    # Transferências existentes, uma única vez: pela descrição gravada na criação
+    # ("... - para <destino>" na saída, "... - de <origem>" na entrada)
+    op.execute("""
+        UPDATE lancamentos SET sentido = 'saida'
+        WHERE tipo = 'transferencia' AND descricao LIKE '% - para %'
+    """)
+    op.execute("""
+        UPDATE lancamentos SET sentido = 'entrada'
+        WHERE tipo = 'transferencia' AND sentido IS NULL AND descricao LIKE '% - de %'
+    """)
+
+    # Descrição editada: a saída é gravada antes, então é a linha de menor id do par espelhado
+    op.execute("""
+        UPDATE lancamentos SET sentido = CASE WHEN EXISTS (
+            SELECT 1 FROM lancamentos par
+            WHERE par.tipo = 'transferencia'
+              AND par.conta_id = lancamentos.conta_destino_id
+              AND par.conta_destino_id = lancamentos.conta_id
+              AND par.valor = lancamentos.valor
+              AND par.data_vencimento = lancamentos.data_vencimento
+              AND par.id > lancamentos.id
+        ) THEN 'saida' ELSE 'entrada' END
+        WHERE tipo = 'transferencia' AND sentido IS NULL
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('lancamentos', schema=None) as batch_op:
+        batch_op.drop_column('sentido')
@@ -0,0 +1,72 @@
+"""Adiciona tabela faturas com total, vencimento e pagamento por cartão e mês
+
+Revision ID: b52d8e07c1a9
+Revises: a7c3e91f24b8
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b52d8e07c1a9'
+down_revision = 'a7c3e91f24b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('faturas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cartao_id', sa.Integer(), nullable=False),
+    sa.Column('competencia', sa.Date(), nullable=False),
+    sa.Column('valor_total', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.Column('data_vencimento', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('lancamento_pagamento_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['cartao_id'], ['cartoes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['lancamento_pagamento_id'], ['lancamentos.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cartao_id', 'competencia', name='_cartao_competencia_uc')
+    )
+    op.create_index(op.f('ix_faturas_lancamento_pagamento_id'), 'faturas', ['lancamento_pagamento_id'], unique=False)
+
+    # Carga inicial: uma fatura por cartão e mês com despesas de cartão
+    # (vencimento no dia do cartão ou no último dia do mês, se o dia não existir)
+    op.execute("""
+        INSERT INTO faturas (cartao_id, competencia, valor_total, quantidade, data_vencimento, status)
+        SELECT l.cartao_id,
+               CAST(date_trunc('month', l.mes_inicial_cartao) AS DATE),
+               SUM(l.valor), COUNT(l.id),
+               CAST(date_trunc('month', l.mes_inicial_cartao) AS DATE) + LEAST(
+                   c.dia_vencimento,
+                   EXTRACT(DAY FROM date_trunc('month', l.mes_inicial_cartao) + INTERVAL '1 month - 1 day')
+               )::INTEGER - 1,
+               'pendente'
+        FROM lancamentos l
+        JOIN cartoes c ON c.id = l.cartao_id
+        WHERE l.tipo = 'cartao_credito'
+          AND l.status <> 'cancelado'
+          AND l.mes_inicial_cartao IS NOT NULL
+        GROUP BY l.cartao_id, date_trunc('month', l.mes_inicial_cartao), c.dia_vencimento
+    """)
+
+    # Vínculo com os pagamentos já existentes, identificados uma única vez pela descrição
+    op.execute("""
+        UPDATE faturas f
+        SET lancamento_pagamento_id = p.id,
+            status = CASE WHEN p.status = 'pago' THEN 'pago' ELSE 'pendente' END
+        FROM cartoes c, lancamentos p
+        WHERE c.id = f.cartao_id
+          AND p.tipo = 'despesa'
+          AND p.descricao = 'Pagamento Fatura ' || c.nome
+          AND p.data_vencimento >= f.competencia
+          AND p.data_vencimento < f.competencia + INTERVAL '1 month'
+    """)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_faturas_lancamento_pagamento_id'), table_name='faturas')
+    op.drop_table('faturas')
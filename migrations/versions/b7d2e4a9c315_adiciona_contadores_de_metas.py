@@ -0,0 +1,42 @@
+"""Adiciona contadores de metas (metas_contadores) e metas.contadores_ok
+
+Revision ID: b7d2e4a9c315
+Revises: a3e5c8f1d702
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4a9c315'
+down_revision = 'a3e5c8f1d702'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('metas_contadores',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('meta_id', sa.Integer(), nullable=False),
+    sa.Column('inicio', sa.Date(), nullable=False),
+    sa.Column('valor_pago', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('valor_previsto', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('nivel_alerta', sa.Integer(), nullable=False),
+    sa.Column('alerta_pendente', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['meta_id'], ['metas.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('meta_id', 'inicio', name='_meta_inicio_uc')
+    )
+
+    # Metas existentes têm os contadores montados na primeira leitura
+    with op.batch_alter_table('metas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('contadores_ok', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('metas', schema=None) as batch_op:
+        batch_op.drop_column('contadores_ok')
+
+    op.drop_table('metas_contadores')
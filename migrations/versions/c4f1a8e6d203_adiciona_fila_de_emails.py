@@ -0,0 +1,38 @@
+"""Adiciona a fila de emails (email_outbox)
+
+Revision ID: c4f1a8e6d203
+Revises: b7d2e4a9c315
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f1a8e6d203'
+down_revision = 'b7d2e4a9c315'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('email_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('destinatario', sa.String(length=255), nullable=False),
+    sa.Column('assunto', sa.String(length=255), nullable=False),
+    sa.Column('corpo', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('tentativas', sa.Integer(), nullable=False),
+    sa.Column('proxima_tentativa', sa.DateTime(), nullable=False),
+    sa.Column('ultimo_erro', sa.Text(), nullable=True),
+    sa.Column('data_criacao', sa.DateTime(), nullable=False),
+    sa.Column('data_envio', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_email_outbox_status_proxima', 'email_outbox', ['status', 'proxima_tentativa'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_status_proxima', table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,58 @@
+"""Adiciona tabela regras_recorrencia e campo regra_id em lancamentos
+
+Revision ID: c81f4a2d9e63
+Revises: b52d8e07c1a9
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f4a2d9e63'
+down_revision = 'b52d8e07c1a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('regras_recorrencia',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=20), nullable=False),
+    sa.Column('frequencia', sa.String(length=20), nullable=False),
+    sa.Column('data_inicio', sa.Date(), nullable=False),
+    sa.Column('data_fim', sa.Date(), nullable=False),
+    sa.Column('mes_inicial_cartao', sa.Date(), nullable=True),
+    sa.Column('descricao', sa.String(length=255), nullable=False),
+    sa.Column('valor', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('conta_id', sa.Integer(), nullable=False),
+    sa.Column('cartao_id', sa.Integer(), nullable=True),
+    sa.Column('categoria_id', sa.Integer(), nullable=True),
+    sa.Column('subcategoria_id', sa.Integer(), nullable=True),
+    sa.Column('tag', sa.String(length=50), nullable=True),
+    sa.Column('ocorrencias_geradas', sa.Integer(), nullable=False),
+    sa.Column('materializado_ate', sa.Date(), nullable=True),
+    sa.Column('ativa', sa.Boolean(), nullable=False),
+    sa.Column('data_criacao', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['cartao_id'], ['cartoes.id'], ),
+    sa.ForeignKeyConstraint(['categoria_id'], ['categorias.id'], ),
+    sa.ForeignKeyConstraint(['conta_id'], ['contas.id'], ),
+    sa.ForeignKeyConstraint(['subcategoria_id'], ['subcategorias.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('lancamentos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('regra_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_lancamentos_regra_id'), ['regra_id'], unique=False)
+        batch_op.create_foreign_key('fk_lancamentos_regra_id', 'regras_recorrencia', ['regra_id'], ['id'], ondelete='SET NULL')
+
+    # As séries já existentes continuam como lançamentos gravados; só as novas usam regra
+
+
+def downgrade():
+    with op.batch_alter_table('lancamentos', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_lancamentos_regra_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_lancamentos_regra_id'))
+        batch_op.drop_column('regra_id')
+
+    op.drop_table('regras_recorrencia')
@@ -0,0 +1,50 @@
+"""Adiciona índices compostos e parciais nas consultas frequentes de lancamentos
+
+Revision ID: d4a9b6e2f157
+Revises: c81f4a2d9e63
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9b6e2f157'
+down_revision = 'c81f4a2d9e63'
+branch_labels = None
+depends_on = None
+
+
+# nome -> (colunas, condição do índice parcial ou None)
+INDICES = {
+    'ix_lancamentos_tipo_conta_vencimento': (['tipo', 'conta_id', 'data_vencimento'], None),
+    'ix_lancamentos_vencimento_id': (['data_vencimento', 'id'], None),
+    'ix_lancamentos_cartao_mes_inicial': (['cartao_id', 'mes_inicial_cartao'], "tipo = 'cartao_credito'"),
+    'ix_lancamentos_tag_vencimento': (['tag', 'data_vencimento'], 'tag IS NOT NULL'),
+    'ix_lancamentos_pai_vencimento': (['lancamento_pai_id', 'data_vencimento'], 'lancamento_pai_id IS NOT NULL'),
+    'ix_lancamentos_regra_vencimento': (['regra_id', 'data_vencimento'], 'regra_id IS NOT NULL'),
+    'ix_lancamentos_pagos_tipo_pagamento': (['tipo', 'data_pagamento'], "status = 'pago'"),
+    'ix_lancamentos_transferencia_destino': (['conta_destino_id', 'data_vencimento'],
+                                             "tipo = 'transferencia' AND status <> 'cancelado'"),
+}
+
+
+def upgrade():
+    # O índice simples de regra_id passa a ser composto com data_vencimento
+    op.drop_index('ix_lancamentos_regra_id', table_name='lancamentos')
+
+    for nome, (colunas, condicao) in INDICES.items():
+        op.create_index(
+            nome, 'lancamentos', colunas, unique=False,
+            postgresql_where=sa.text(condicao) if condicao else None
+        )
+
+    op.execute('ANALYZE lancamentos')
+
+
+def downgrade():
+    for nome in INDICES:
+        op.drop_index(nome, table_name='lancamentos')
+
+    op.create_index('ix_lancamentos_regra_id', 'lancamentos', ['regra_id'], unique=False)
@@ -0,0 +1,38 @@
+"""Adiciona chave única no cubo de relatórios (mantido por deltas)
+
+Revision ID: d5b2e7f3a914
+Revises: c4f1a8e6d203
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b2e7f3a914'
+down_revision = 'c4f1a8e6d203'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # O cubo é remontado pela tarefa agendada (logo ao iniciar) ou com "flask cubo reconstruir"
+    op.execute("DELETE FROM cubo_lancamentos")
+    op.execute("UPDATE cubo_estado SET desatualizado = true")
+
+    op.create_index('ux_cubo_lancamentos_chave', 'cubo_lancamentos', [
+        'nivel',
+        sa.text('coalesce(ano, 0)'),
+        sa.text('coalesce(mes, 0)'),
+        sa.text('coalesce(categoria_id, 0)'),
+        sa.text('coalesce(subcategoria_id, 0)'),
+        sa.text("coalesce(tag, '')"),
+        sa.text("coalesce(tipo, '')"),
+        sa.text('coalesce(conta_id, 0)'),
+        sa.text('coalesce(cartao_id, 0)'),
+    ], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_cubo_lancamentos_chave', table_name='cubo_lancamentos')
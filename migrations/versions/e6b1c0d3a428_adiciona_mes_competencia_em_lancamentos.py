@@ -0,0 +1,39 @@
+"""Adiciona coluna gerada mes_competencia em lancamentos
+
+Revision ID: e6b1c0d3a428
+Revises: d4a9b6e2f157
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b1c0d3a428'
+down_revision = 'd4a9b6e2f157'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Mês da fatura para despesas de cartão, mês do vencimento para os demais.
+    # A coluna é calculada e gravada pelo próprio PostgreSQL (inclusive para as linhas existentes)
+    op.add_column('lancamentos', sa.Column(
+        'mes_competencia',
+        sa.Date(),
+        sa.Computed(
+            "CAST(date_trunc('month', CAST(CASE WHEN (tipo = 'cartao_credito') "
+            "THEN coalesce(mes_inicial_cartao, data_vencimento) ELSE data_vencimento END "
+            "AS TIMESTAMP)) AS DATE)",
+            persisted=True
+        ),
+        nullable=True
+    ))
+    op.create_index('ix_lancamentos_competencia_tipo_categoria', 'lancamentos',
+                    ['mes_competencia', 'tipo', 'categoria_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_lancamentos_competencia_tipo_categoria', table_name='lancamentos')
+    op.drop_column('lancamentos', 'mes_competencia')
@@ -0,0 +1,112 @@
+"""Adiciona unicidade de (regra_id, data_vencimento) nas ocorrências das séries recorrentes
+
+Revision ID: e9c3a5d1f486
+Revises: d5b2e7f3a914
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9c3a5d1f486'
+down_revision = 'd5b2e7f3a914'
+branch_labels = None
+depends_on = None
+
+
+lancamentos = sa.table(
+    'lancamentos',
+    sa.column('id', sa.Integer),
+    sa.column('regra_id', sa.Integer),
+    sa.column('data_vencimento', sa.Date),
+    sa.column('conta_id', sa.Integer),
+    sa.column('categoria_id', sa.Integer),
+    sa.column('subcategoria_id', sa.Integer),
+    sa.column('tipo', sa.String),
+    sa.column('status', sa.String),
+    sa.column('valor', sa.Numeric),
+)
+resumo = sa.table(
+    'resumo_mensal',
+    *[sa.column(nome) for nome in ('ano', 'mes', 'conta_id', 'categoria_id', 'subcategoria_id',
+                                   'tipo', 'status', 'valor_total', 'quantidade')]
+)
+contas = sa.table('contas', sa.column('id', sa.Integer), sa.column('saldo_atual', sa.Numeric))
+
+CONDICAO = 'regra_id IS NOT NULL'
+
+
+def _remover_duplicadas():
+    """Apaga as ocorrências repetidas (fica a de menor id) e corrige o que foi somado a partir delas"""
+    conexao = op.get_bind()
+    anterior = lancamentos.alias('anterior')
+    duplicadas = conexao.execute(
+        sa.select(lancamentos.c.id, lancamentos.c.conta_id, lancamentos.c.tipo,
+                  lancamentos.c.status, lancamentos.c.valor).where(
+            lancamentos.c.regra_id.isnot(None),
+            sa.exists().where(
+                anterior.c.regra_id == lancamentos.c.regra_id,
+                anterior.c.data_vencimento == lancamentos.c.data_vencimento,
+                anterior.c.id < lancamentos.c.id
+            )
+        )
+    ).all()
+    if not duplicadas:
+        return
+
+    # Ocorrências pagas já tinham movimentado o saldo da conta
+    for _, conta_id, tipo, status, valor in duplicadas:
+        if status == 'pago':
+            ajuste = -valor if tipo == 'receita' else valor
+            conexao.execute(sa.update(contas).where(contas.c.id == conta_id).values(
+                saldo_atual=contas.c.saldo_atual + ajuste
+            ))
+
+    conexao.execute(sa.delete(lancamentos).where(lancamentos.c.id.in_([d.id for d in duplicadas])))
+
+    # Resumo mensal recalculado dos lançamentos restantes
+    ano = sa.cast(sa.extract('year', lancamentos.c.data_vencimento), sa.Integer)
+    mes = sa.cast(sa.extract('month', lancamentos.c.data_vencimento), sa.Integer)
+    chave = (ano, mes, lancamentos.c.conta_id, lancamentos.c.categoria_id,
+             lancamentos.c.subcategoria_id, lancamentos.c.tipo, lancamentos.c.status)
+    conexao.execute(sa.delete(resumo))
+    conexao.execute(resumo.insert().from_select(
+        [c.name for c in resumo.columns],
+        sa.select(*chave, sa.func.sum(lancamentos.c.valor), sa.func.count(lancamentos.c.id)).group_by(*chave)
+    ))
+
+    # Faturas: totais das despesas de cartão de cada competência
+    for coluna, agregado in (('valor_total', 'coalesce(sum(l.valor), 0)'), ('quantidade', 'count(l.id)')):
+        op.execute(f"""
+            UPDATE faturas SET {coluna} = (
+                SELECT {agregado} FROM lancamentos l
+                WHERE l.tipo = 'cartao_credito' AND l.status <> 'cancelado'
+                  AND l.cartao_id = faturas.cartao_id
+                  AND l.mes_inicial_cartao IS NOT NULL
+                  AND l.mes_competencia = faturas.competencia
+            )
+        """)
+
+    # Contadores das metas remontados na primeira leitura; cubo pela tarefa agendada
+    op.execute('UPDATE metas SET contadores_ok = false')
+    op.execute('UPDATE cubo_estado SET desatualizado = true')
+
+
+def upgrade():
+    _remover_duplicadas()
+
+    op.drop_index('ix_lancamentos_regra_vencimento', table_name='lancamentos')
+    op.create_index(
+        'ux_lancamentos_regra_vencimento', 'lancamentos', ['regra_id', 'data_vencimento'], unique=True,
+        postgresql_where=sa.text(CONDICAO), sqlite_where=sa.text(CONDICAO)
+    )
+
+
+def downgrade():
+    op.drop_index('ux_lancamentos_regra_vencimento', table_name='lancamentos')
+    op.create_index(
+        'ix_lancamentos_regra_vencimento', 'lancamentos', ['regra_id', 'data_vencimento'], unique=False,
+        postgresql_where=sa.text(CONDICAO)
+    )
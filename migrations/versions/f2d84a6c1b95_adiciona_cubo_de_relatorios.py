@@ -0,0 +1,59 @@
+"""Adiciona cubo de relatórios (cubo_lancamentos e cubo_estado)
+
+Revision ID: f2d84a6c1b95
+Revises: e6b1c0d3a428
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2d84a6c1b95'
+down_revision = 'e6b1c0d3a428'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cubo_lancamentos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nivel', sa.Integer(), nullable=False),
+    sa.Column('ano', sa.Integer(), nullable=True),
+    sa.Column('mes', sa.Integer(), nullable=True),
+    sa.Column('categoria_id', sa.Integer(), nullable=True),
+    sa.Column('subcategoria_id', sa.Integer(), nullable=True),
+    sa.Column('tag', sa.String(length=50), nullable=True),
+    sa.Column('tipo', sa.String(length=20), nullable=True),
+    sa.Column('conta_id', sa.Integer(), nullable=True),
+    sa.Column('cartao_id', sa.Integer(), nullable=True),
+    sa.Column('valor_total', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_cubo_lancamentos_nivel_periodo', 'cubo_lancamentos', ['nivel', 'ano', 'mes'], unique=False)
+
+    op.create_table('cubo_estado',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('desatualizado', sa.Boolean(), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # O cubo começa desatualizado: é montado na primeira leitura (ou com "flask cubo reconstruir")
+    op.execute("INSERT INTO cubo_estado (id, desatualizado) VALUES (1, true)")
+
+    # A visão por tag passa a filtrar pelo mês de competência
+    op.drop_index('ix_lancamentos_tag_vencimento', table_name='lancamentos')
+    op.create_index('ix_lancamentos_tag_competencia', 'lancamentos', ['tag', 'mes_competencia'], unique=False,
+                    postgresql_where=sa.text('tag IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_lancamentos_tag_competencia', table_name='lancamentos')
+    op.create_index('ix_lancamentos_tag_vencimento', 'lancamentos', ['tag', 'data_vencimento'], unique=False,
+                    postgresql_where=sa.text('tag IS NOT NULL'))
+
+    op.drop_table('cubo_estado')
+    op.drop_index('ix_cubo_lancamentos_nivel_periodo', table_name='cubo_lancamentos')
+    op.drop_table('cubo_lancamentos')
@@ -0,0 +1,55 @@
+"""Adiciona chave única no resumo_mensal (somas gravadas com INSERT ... ON CONFLICT)
+
+Revision ID: f7a2c9e4b650
+Revises: e9c3a5d1f486
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7a2c9e4b650'
+down_revision = 'e9c3a5d1f486'
+branch_labels = None
+depends_on = None
+
+
+lancamentos = sa.table(
+    'lancamentos',
+    *[sa.column(nome) for nome in ('id', 'conta_id', 'categoria_id', 'subcategoria_id', 'tipo', 'status', 'valor')],
+    sa.column('data_vencimento', sa.Date)
+)
+resumo = sa.table(
+    'resumo_mensal',
+    *[sa.column(nome) for nome in ('ano', 'mes', 'conta_id', 'categoria_id', 'subcategoria_id',
+                                   'tipo', 'status', 'valor_total', 'quantidade')]
+)
+
+
+def upgrade():
+    # Linhas repetidas (e somas em dobro) de escritas concorrentes: recalcular dos lançamentos
+    ano = sa.cast(sa.extract('year', lancamentos.c.data_vencimento), sa.Integer)
+    mes = sa.cast(sa.extract('month', lancamentos.c.data_vencimento), sa.Integer)
+    chave = (ano, mes, lancamentos.c.conta_id, lancamentos.c.categoria_id,
+             lancamentos.c.subcategoria_id, lancamentos.c.tipo, lancamentos.c.status)
+    op.execute(sa.delete(resumo))
+    op.execute(resumo.insert().from_select(
+        [c.name for c in resumo.columns],
+        sa.select(*chave, sa.func.sum(lancamentos.c.valor), sa.func.count(lancamentos.c.id)).group_by(*chave)
+    ))
+
+    op.drop_index('ix_resumo_mensal_chave', table_name='resumo_mensal')
+    op.create_index('ux_resumo_mensal_chave', 'resumo_mensal', [
+        'ano', 'mes', 'conta_id',
+        sa.text('coalesce(categoria_id, 0)'),
+        sa.text('coalesce(subcategoria_id, 0)'),
+        'tipo', 'status',
+    ], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_resumo_mensal_chave', table_name='resumo_mensal')
+    op.create_index('ix_resumo_mensal_chave', 'resumo_mensal',
+                    ['ano', 'mes', 'conta_id', 'categoria_id', 'subcategoria_id', 'tipo', 'status'])
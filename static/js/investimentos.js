@@ -14,7 +14,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Criar gráfico consolidado
     const canvasConsolidado = document.getElementById('graficoConsolidado');
-    if (canvasConsolidado && window.dadosConsolidado) {
+    if (canvasConsolidado) carregarSerie(canvasConsolidado).then(dadosConsolidado => {
         console.log('Criando gráfico consolidado com dados:', dadosConsolidado);
         
         try {
@@ -74,69 +74,61 @@ document.addEventListener('DOMContentLoaded', function() {
         } catch (error) {
             console.error('Erro ao criar gráfico consolidado:', error);
         }
-    }
+    });
     
     // Criar gráficos das contas
-    if (window.dadosContas) {
-        console.log('Criando gráficos das contas:', dadosContas);
-        
-        Object.keys(dadosContas).forEach(contaId => {
-            const canvas = document.getElementById(`grafico_${contaId}`);
-            if (canvas) {
-                const dados = dadosContas[contaId];
-                
-                if (!dados.labels || dados.labels.length === 0) {
-                    canvas.parentElement.innerHTML = '<p style="text-align: center; padding: 20px; color: #6c757d;">Sem dados para exibir</p>';
-                    return;
-                }
-                
-                try {
-                    const ctx = canvas.getContext('2d');
-                    new Chart(ctx, {
-                        type: 'line',
-                        data: {
-                            labels: dados.labels,
-                            datasets: [{
-                                label: 'Saldo',
-                                data: dados.valores,
-                                borderColor: '#28a745',
-                                backgroundColor: 'rgba(40, 167, 69, 0.1)',
-                                borderWidth: 2,
-                                tension: 0.4,
-                                fill: true
-                            }]
+    document.querySelectorAll('canvas.grafico-conta').forEach(canvas => {
+        const contaId = canvas.id.replace('grafico_', '');
+        carregarSerie(canvas).then(dados => {
+            if (!dados.labels || dados.labels.length === 0) {
+                canvas.parentElement.innerHTML = '<p style="text-align: center; padding: 20px; color: #6c757d;">Sem dados para exibir</p>';
+                return;
+            }
+            
+            try {
+                const ctx = canvas.getContext('2d');
+                new Chart(ctx, {
+                    type: 'line',
+                    data: {
+                        labels: dados.labels,
+                        datasets: [{
+                            label: 'Saldo',
+                            data: dados.valores,
+                            borderColor: '#28a745',
+                            backgroundColor: 'rgba(40, 167, 69, 0.1)',
+                            borderWidth: 2,
+                            tension: 0.4,
+                            fill: true
+                        }]
+                    },
+                    options: {
+                        responsive: true,
+                        maintainAspectRatio: false,
+                        plugins: {
+                            legend: {
+                                display: false
+                            }
                         },
-                        options: {
-                            responsive: true,
-                            maintainAspectRatio: false,
-                            plugins: {
-                                legend: {
-                                    display: false
-                                }
+                        scales: {
+                            x: {
+                                display: false
                             },
-                            scales: {
-                                x: {
-                                    display: false
-                                },
-                                y: {
-                                    display: false
-                                }
+                            y: {
+                                display: false
                             }
                         }
-                    });
-                    console.log(`Gráfico da conta ${contaId} criado!`);
-                } catch (error) {
-                    console.error(`Erro ao criar gráfico da conta ${contaId}:`, error);
-                }
+                    }
+                });
+                console.log(`Gráfico da conta ${contaId} criado!`);
+            } catch (error) {
+                console.error(`Erro ao criar gráfico da conta ${contaId}:`, error);
             }
         });
-    }
+    });
     
     // Criar gráfico de evolução (página de histórico)
     const canvasEvolucao = document.getElementById('graficoEvolucao');
-    if (canvasEvolucao) {
-        const dados = window.dadosEvolucao || window.dados_grafico;
-        
+    if (canvasEvolucao) carregarSerie(canvasEvolucao).then(dados => {
         if (dados && dados.labels && dados.labels.length > 0) {
             console.log('Criando gráfico evolução com dados:', dados);
             
@@ -183,12 +175,26 @@ document.addEventListener('DOMContentLoaded', function() {
         } else {
             canvasEvolucao.parentElement.innerHTML = '<p style="text-align: center; padding: 40px; color: #6c757d;">Nenhum dado disponível para exibir o gráfico.</p>';
         }
-    }
+    });
     
     console.log('=== Finalizado Investimentos.js ===');
 });
 
 // Funções auxiliares
+
+// Buscar a série (já reduzida no servidor) indicada em data-url do canvas
+function carregarSerie(canvas) {
+    return fetch(canvas.dataset.url)
+        .then(resposta => {
+            if (!resposta.ok) throw new Error(`HTTP ${resposta.status}`);
+            return resposta.json();
+        })
+        .catch(error => {
+            console.error('Erro ao carregar série:', error);
+            return { labels: [], valores: [] };
+        });
+}
+
 function editarRegistro(id, data, saldo, observacoes) {
     alert('Função de edição em desenvolvimento');
 }
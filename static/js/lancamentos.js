@@ -573,4 +573,146 @@ function formatarMoedaBR(valor) {
         minimumFractionDigits: 2, 
         maximumFractionDigits: 2 
     });
-}
\ No newline at end of file
+}
+// ===== Rolagem infinita da tabela de lançamentos =====
+
+// Campos pedidos à API (só o que a tabela exibe)
+const CAMPOS_TABELA = 'id,data_vencimento,descricao,valor,tipo,status,recorrencia,tag,categoria,subcategoria,conta,conta_destino,cartao';
+
+const ICONES_TIPO = {
+    receita: 'trending_up',
+    despesa: 'trending_down',
+    transferencia: 'swap_horiz',
+    cartao_credito: 'credit_card'
+};
+
+// Cria um elemento com classe e texto (texto sempre via textContent)
+function criarElemento(tag, classe, texto) {
+    const el = document.createElement(tag);
+    if (classe) el.className = classe;
+    if (texto !== undefined && texto !== null) el.textContent = texto;
+    return el;
+}
+
+function criarIcone(nome) {
+    return criarElemento('span', 'material-symbols-outlined', nome);
+}
+
+// Monta uma linha igual à renderizada pelo template
+function criarLinhaLancamento(l) {
+    const tr = criarElemento('tr', l.tipo === 'receita' ? 'row-receita' : 'row-despesa');
+
+    // Vencimento
+    const tdData = criarElemento('td', 'col-data', l.data_vencimento.split('-').reverse().join('/') + ' ');
+    if (l.data_vencimento < hoje && l.status !== 'pago') {
+        tdData.appendChild(criarElemento('span', 'badge-vencido', 'Vencido'));
+    }
+    tr.appendChild(tdData);
+
+    // Descrição
+    const tdDescricao = criarElemento('td', 'col-descricao');
+    const indicador = criarElemento('span', `tipo-indicator tipo-${l.tipo}`);
+    indicador.appendChild(criarIcone(ICONES_TIPO[l.tipo] || ''));
+    tdDescricao.appendChild(indicador);
+    tdDescricao.appendChild(document.createTextNode(' ' + l.descricao + ' '));
+    if (l.recorrencia !== 'unica') {
+        tdDescricao.appendChild(criarElemento('span', 'badge-recorrencia', l.recorrencia));
+    }
+    tr.appendChild(tdDescricao);
+
+    // Categoria
+    const tdCategoria = criarElemento('td', 'col-categoria');
+    if (l.categoria) {
+        const categoria = criarElemento('span', 'categoria-tag');
+        categoria.style.backgroundColor = `${l.categoria.cor}20`;
+        categoria.style.color = l.categoria.cor;
+        categoria.appendChild(criarIcone(l.categoria.icone));
+        categoria.appendChild(document.createTextNode(' ' + l.categoria.nome));
+        tdCategoria.appendChild(categoria);
+    }
+    if (l.subcategoria) {
+        tdCategoria.appendChild(criarElemento('span', 'subcategoria-info', l.subcategoria));
+    }
+    tr.appendChild(tdCategoria);
+
+    // Conta/Cartão
+    const tdConta = criarElemento('td', 'col-conta');
+    if (l.tipo === 'transferencia') {
+        tdConta.textContent = l.conta_destino ? `→ ${l.conta_destino}` : `${l.conta} →`;
+    } else if (l.tipo === 'cartao_credito') {
+        const cartao = criarElemento('span');
+        cartao.style.color = '#6f42c1';
+        const icone = criarIcone('credit_card');
+        icone.style.fontSize = '14px';
+        icone.style.verticalAlign = 'middle';
+        cartao.appendChild(icone);
+        cartao.appendChild(document.createTextNode(' ' + l.cartao));
+        tdConta.appendChild(cartao);
+    } else {
+        tdConta.textContent = l.conta;
+    }
+    tr.appendChild(tdConta);
+
+    // Tag
+    const tdTag = criarElemento('td', 'col-tag');
+    tdTag.appendChild(l.tag ? criarElemento('span', 'tag-badge', l.tag) : criarElemento('span', 'tag-empty', '-'));
+    tr.appendChild(tdTag);
+
+    // Valor
+    tr.appendChild(criarElemento('td', 'col-valor', `R$ ${formatarMoedaBR(parseFloat(l.valor))}`));
+
+    // Ações
+    const tdAcoes = criarElemento('td', 'col-acoes');
+    const botaoExcluir = criarElemento('button', 'btn-icon btn-delete');
+    botaoExcluir.title = 'Excluir';
+    botaoExcluir.appendChild(criarIcone('delete'));
+    botaoExcluir.addEventListener('click', () => confirmarExclusao(l.id, l.descricao, l.recorrencia));
+    tdAcoes.appendChild(botaoExcluir);
+    tr.appendChild(tdAcoes);
+
+    return tr;
+}
+
+// Busca a próxima página a partir do cursor guardado no sentinela
+async function carregarMaisLancamentos(sentinela, observador) {
+    if (sentinela.dataset.carregando === 'true' || !sentinela.dataset.proximo) return;
+    sentinela.dataset.carregando = 'true';
+
+    try {
+        const params = new URLSearchParams({
+            apos: sentinela.dataset.proximo,
+            data_fim: sentinela.dataset.fim,
+            campos: CAMPOS_TABELA
+        });
+        const response = await fetch(`/api/lancamentos?${params}`);
+        const dados = await response.json();
+        if (!dados.success) throw new Error(dados.error);
+
+        const tbody = document.getElementById('lancamentosTbody');
+        dados.lancamentos.forEach(l => tbody.appendChild(criarLinhaLancamento(l)));
+
+        sentinela.dataset.proximo = dados.proximo || '';
+        if (!dados.proximo) {
+            sentinela.style.display = 'none';
+            observador.disconnect();
+        }
+    } catch (error) {
+        console.error('Erro ao carregar lançamentos:', error);
+        sentinela.querySelector('p').textContent = 'Erro ao carregar mais lançamentos.';
+        observador.disconnect();
+    } finally {
+        sentinela.dataset.carregando = 'false';
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const sentinela = document.getElementById('carregarMais');
+    if (!sentinela || !sentinela.dataset.proximo) return;
+
+    const observador = new IntersectionObserver(entradas => {
+        if (entradas.some(e => e.isIntersecting)) {
+            carregarMaisLancamentos(sentinela, observador);
+        }
+    }, { rootMargin: '200px' });
+    observador.observe(sentinela);
+});
@@ -0,0 +1,250 @@
+# tests/test_outbox.py
+# Fila de emails contra um servidor SMTP local (socketserver): envio, novas tentativas com espera,
+# desistência após OUTBOX_MAX_TENTATIVAS e reserva expirada ou renovada durante o envio.
+# Executar da raiz do projeto: python -m pytest tests  (ou python -m unittest discover tests)
+
+import os
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+_banco = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+_banco.close()
+os.environ['DATABASE_URI'] = 'sqlite:///' + _banco.name
+
+from app import create_app, mail
+from app.models import db, EmailOutbox
+from app.services import outbox_service
+from app.services.outbox_service import enfileirar_email, reservar_lote, enviar_lote, processar_fila
+
+
+class SessaoSMTP(socketserver.StreamRequestHandler):
+    """Uma conexão SMTP com só os comandos que o smtplib usa para enviar"""
+
+    def responder(self, linha):
+        self.wfile.write(linha.encode() + b'\r\n')
+
+    def handle(self):
+        servidor = self.server
+        servidor.conexoes += 1
+        self.responder('220 teste.local SMTP')
+        destinatarios = []
+        for linha in self.rfile:
+            comando = linha.decode(errors='replace').strip().split(' ', 1)[0].upper()
+            if comando == 'EHLO':
+                self.responder('250-teste.local')
+                self.responder('250 8BITMIME')
+            elif comando in ('HELO', 'MAIL', 'NOOP'):
+                self.responder('250 OK')
+            elif comando == 'RSET':
+                destinatarios = []
+                self.responder('250 OK')
+            elif comando == 'RCPT':
+                destinatarios.append(linha.decode().split(':', 1)[1].strip().strip('<>'))
+                self.responder('250 OK')
+            elif comando == 'DATA':
+                self.responder('354 Envie a mensagem; termine com <CRLF>.<CRLF>')
+                dados = self.ler_mensagem()
+                self.responder(servidor.receber(destinatarios, dados))
+                destinatarios = []
+            elif comando == 'QUIT':
+                self.responder('221 Tchau')
+                return
+            else:
+                self.responder('502 Comando não implementado')
+
+    def ler_mensagem(self):
+        linhas = []
+        for linha in self.rfile:
+            if linha == b'.\r\n':
+                break
+            # Desfaz o "dot-stuffing" das linhas que começam com ponto
+            linhas.append(linha[1:] if linha.startswith(b'..') else linha)
+        return b''.join(linhas)
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    """Servidor de teste: guarda as mensagens e recusa as que contêm RECUSAR"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, endereco):
+        super().__init__(endereco, SessaoSMTP)
+        self.recebidos = []
+        self.ao_receber = None
+        self.conexoes = 0
+
+    def receber(self, destinatarios, dados):
+        if self.ao_receber:
+            self.ao_receber()
+        if b'RECUSAR' in dados:
+            return '550 Mensagem recusada'
+        self.recebidos.append((destinatarios, dados))
+        return '250 OK'
+
+
+class OutboxTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.servidor = ServidorSMTP(('127.0.0.1', 0))
+        porta = cls.servidor.server_address[1]
+        cls.laco = threading.Thread(target=cls.servidor.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        cls.laco.start()
+
+        cls.app = create_app()
+        cls.app.config.update(
+            TESTING=True,
+            MAIL_SERVER='127.0.0.1',
+            MAIL_PORT=porta,
+            MAIL_USE_TLS=False,
+            MAIL_USE_SSL=False,
+            MAIL_USERNAME=None,
+            MAIL_PASSWORD=None,
+            MAIL_DEFAULT_SENDER='financas@teste.local',
+            MAIL_SUPPRESS_SEND=False,
+            OUTBOX_LOTE=20,
+            OUTBOX_MAX_TENTATIVAS=3,
+            OUTBOX_BACKOFF=60
+        )
+        mail.init_app(cls.app)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        os.unlink(_banco.name)
+
+    def setUp(self):
+        self.servidor.recebidos.clear()
+        self.servidor.ao_receber = None
+        self.servidor.conexoes = 0
+        self.contexto = self.app.app_context()
+        self.contexto.push()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        self.contexto.pop()
+
+    def enfileirar(self, *corpos):
+        ids = [enfileirar_email(f'Assunto {i}', corpo, 'eu@teste.local') for i, corpo in enumerate(corpos)]
+        db.session.commit()
+        return [email.id for email in ids]
+
+    def email(self, email_id):
+        db.session.expire_all()
+        return db.session.get(EmailOutbox, email_id)
+
+    def vencer(self, email_id):
+        """Antecipa a próxima tentativa para agora (sem esperar o backoff)"""
+        self.email(email_id).proxima_tentativa = datetime.now() - timedelta(seconds=1)
+        db.session.commit()
+
+    def test_envia_fila_em_uma_conexao(self):
+        ids = self.enfileirar('um', 'dois', 'tres')
+
+        self.assertEqual(processar_fila(self.app), 3)
+
+        self.assertEqual(len(self.servidor.recebidos), 3)
+        self.assertEqual(self.servidor.conexoes, 1)
+        for email_id in ids:
+            email = self.email(email_id)
+            self.assertEqual(email.status, 'enviado')
+            self.assertEqual(email.tentativas, 1)
+            self.assertIsNotNone(email.data_envio)
+        self.assertEqual(processar_fila(self.app), 0)
+
+    def test_recusa_agenda_nova_tentativa_com_backoff(self):
+        email_id, = self.enfileirar('RECUSAR')
+
+        inicio = datetime.now()
+        processar_fila(self.app)
+        email = self.email(email_id)
+        self.assertEqual((email.status, email.tentativas), ('pendente', 1))
+        self.assertIn('550', email.ultimo_erro)
+        self.assertGreaterEqual(email.proxima_tentativa, inicio + timedelta(seconds=60))
+
+        # Antes do vencimento nada é reenviado
+        self.assertEqual(processar_fila(self.app), 0)
+
+        # Segunda falha: a espera dobra
+        self.vencer(email_id)
+        inicio = datetime.now()
+        processar_fila(self.app)
+        email = self.email(email_id)
+        self.assertEqual((email.status, email.tentativas), ('pendente', 2))
+        self.assertGreaterEqual(email.proxima_tentativa, inicio + timedelta(seconds=120))
+        self.assertLess(email.proxima_tentativa, inicio + timedelta(seconds=180))
+
+    def test_desiste_apos_max_tentativas(self):
+        email_id, outro_id = self.enfileirar('RECUSAR', 'ok')
+
+        for _ in range(self.app.config['OUTBOX_MAX_TENTATIVAS']):
+            self.vencer(email_id)
+            processar_fila(self.app)
+
+        email = self.email(email_id)
+        self.assertEqual((email.status, email.tentativas), ('falhou', 3))
+        self.assertEqual(self.email(outro_id).status, 'enviado')
+
+        # Desistido não volta para a fila
+        self.vencer(email_id)
+        self.assertEqual(processar_fila(self.app), 0)
+
+    def test_servidor_fora_do_ar_devolve_lote_para_fila(self):
+        ids = self.enfileirar('um', 'dois')
+        self.app.config['MAIL_PORT'], porta = 1, self.app.config['MAIL_PORT']
+        mail.init_app(self.app)
+        try:
+            processar_fila(self.app)
+        finally:
+            self.app.config['MAIL_PORT'] = porta
+            mail.init_app(self.app)
+
+        for email_id in ids:
+            email = self.email(email_id)
+            self.assertEqual((email.status, email.tentativas), ('pendente', 1))
+        self.assertEqual(self.servidor.recebidos, [])
+
+    def test_reserva_expirada_volta_para_fila(self):
+        email_id, = self.enfileirar('perdido')
+
+        # Worker que caiu no meio do envio: o email ficou 'enviando'
+        self.assertEqual([email.id for email in reservar_lote(10)], [email_id])
+        self.assertEqual(reservar_lote(10), [])
+
+        self.vencer(email_id)
+        self.assertEqual(processar_fila(self.app), 1)
+        self.assertEqual(self.email(email_id).status, 'enviado')
+        self.assertEqual(len(self.servidor.recebidos), 1)
+
+    def test_reserva_renovada_durante_envio_lento(self):
+        ids = self.enfileirar('um', 'dois', 'tres')
+        reserva, outbox_service.RESERVA = outbox_service.RESERVA, timedelta(seconds=1)
+        roubados = []
+
+        def outro_worker():
+            # Cada mensagem leva mais que meia reserva; outro worker tenta pegar o lote
+            time.sleep(0.7)
+            with self.app.app_context():
+                roubados.extend(email.id for email in reservar_lote(10))
+                db.session.remove()
+
+        self.servidor.ao_receber = outro_worker
+        try:
+            enviar_lote(reservar_lote(10))
+        finally:
+            outbox_service.RESERVA = reserva
+
+        self.assertEqual(roubados, [])
+        self.assertEqual(len(self.servidor.recebidos), 3)
+        self.assertTrue(all(self.email(email_id).status == 'enviado' for email_id in ids))
+
+
+if __name__ == '__main__':
+    unittest.main()